@@ -0,0 +1,140 @@
+"""
+Confidence-driven two-pass recognition.
+
+Pass 1 reads the image at OCR_ADAPTIVE_SCALE (detection and recognition cost scale with the pixel count).
+Pass 2 goes back to the full-resolution image only where pass 1 is not trusted:
+  - boxes with confidence below OCR_ADAPTIVE_MIN_CONFIDENCE are re-recognized from a full-resolution crop
+    (recognizer only, no detection; the better of the two reads is kept);
+  - label boxes with no number beside or below them (e.g. "LVIDd" whose value was not detected at low
+    resolution) get the strip to their right re-read with detection at full resolution.
+Boxes that went through pass 2 carry a fourth item, True ("escalated"), after [box, text, confidence].
+"""
+import os
+from typing import Callable
+
+from ocr_result import OcrResult
+
+ADAPTIVE_ENABLED = os.environ.get("OCR_ADAPTIVE", "0") in ("1", "true", "yes")
+ADAPTIVE_SCALE = float(os.environ.get("OCR_ADAPTIVE_SCALE", "0.5"))
+ADAPTIVE_MIN_SIDE = int(os.environ.get("OCR_ADAPTIVE_MIN_SIDE", "800"))  # smaller images are read once at full size
+ADAPTIVE_MIN_CONFIDENCE = float(os.environ.get("OCR_ADAPTIVE_MIN_CONFIDENCE", "0.5"))
+_PAD = 3  # pixels added around a box before re-reading it
+
+
+def cache_variant() -> str:
+    """Tag for OCR cache keys (two-pass results differ from single-pass ones)."""
+    if not ADAPTIVE_ENABLED:
+        return ""
+    return f"adaptive{ADAPTIVE_SCALE:g}-{ADAPTIVE_MIN_SIDE}-{ADAPTIVE_MIN_CONFIDENCE:g}"
+
+
+def escalated_count(results: list) -> int:
+    return sum(1 for r in results if len(r) > 3 and r[3])
+
+
+def _applies(img_array) -> bool:
+    return ADAPTIVE_ENABLED and 0 < ADAPTIVE_SCALE < 1 and max(img_array.shape[:2]) >= ADAPTIVE_MIN_SIDE
+
+
+def _downscale(img_array):
+    import numpy as np
+    from PIL import Image
+    height, width = img_array.shape[:2]
+    size = (max(1, round(width * ADAPTIVE_SCALE)), max(1, round(height * ADAPTIVE_SCALE)))
+    return np.asarray(Image.fromarray(img_array).resize(size, Image.BILINEAR))
+
+
+def _upscale_results(results: list, sx: float, sy: float) -> list:
+    return [([[x * sx, y * sy] for x, y in box], text, confidence) for box, text, confidence in results]
+
+
+def _gray(img_array):
+    import numpy as np
+    if img_array.ndim == 2:
+        return img_array
+    from PIL import Image
+    return np.asarray(Image.fromarray(img_array).convert("L"))
+
+
+def _offset(results: list, dx: int, dy: int) -> list:
+    return [([[x + dx, y + dy] for x, y in box], text, confidence) for box, text, confidence in results]
+
+
+def readtext(reader, img_array, is_label: Callable[[str], bool], **kwargs) -> list:
+    """reader.readtext(img_array), in two passes when OCR_ADAPTIVE is on and the image is large enough."""
+    if not _applies(img_array):
+        return reader.readtext(img_array, **kwargs)
+    small = _downscale(img_array)
+    first = reader.readtext(small, **kwargs)
+    return escalate(reader, img_array, small.shape, first, is_label)
+
+
+def readtext_batched(reader, arrays: list, is_label: Callable[[str], bool], **kwargs) -> list:
+    """reader.readtext_batched(arrays) (same-size arrays), with the same two passes per array."""
+    if not arrays or not _applies(arrays[0]):
+        return reader.readtext_batched(arrays, **kwargs)
+    smalls = [_downscale(a) for a in arrays]
+    firsts = reader.readtext_batched(smalls, **kwargs)
+    return [escalate(reader, a, s.shape, first, is_label) for a, s, first in zip(arrays, smalls, firsts)]
+
+
+def escalate(reader, img_array, small_shape: tuple, first: list, is_label: Callable[[str], bool]) -> list:
+    """Map pass-1 results (read on an image of small_shape) to img_array and re-read the weak parts there."""
+    import numpy as np
+    height, width = img_array.shape[:2]
+    results = [list(r) for r in _upscale_results(first, width / small_shape[1], height / small_shape[0])]
+    if not results:
+        return results
+    ocr = OcrResult(results)
+
+    # Labels left without a value: re-read the strip from the label to the right edge, with detection.
+    # The strip's results take the place of every pass-1 box centred in it (the label included).
+    replaced: dict[int, int] = {}  # result index -> strip number
+    strips: list[list] = []
+    for index, box in enumerate(ocr.boxes):
+        if index in replaced or not is_label(box.text) or any(ch.isdigit() for ch in box.text):
+            continue
+        if ocr.value_for(box) is not None:
+            continue
+        x0, y0, y1 = max(0, int(box.x0) - _PAD), max(0, int(box.y0) - _PAD), min(height, int(box.y1) + _PAD)
+        for i, other in enumerate(ocr.boxes):
+            if x0 <= (other.x0 + other.x1) / 2 <= width and y0 <= other.cy <= y1:
+                replaced.setdefault(i, len(strips))
+        crop = np.ascontiguousarray(img_array[y0:y1, x0:width])
+        strips.append([[*r, True] for r in _offset(reader.readtext(crop), x0, y0)])
+
+    # A strip that read nothing, or fewer labels than the boxes it would replace, keeps the pass-1 boxes
+    for number, strip in enumerate(strips):
+        kept = [i for i, n in replaced.items() if n == number]
+        if not strip or sum(map(is_label, (r[1] for r in strip))) < sum(is_label(ocr.boxes[i].text) for i in kept):
+            for i in kept:
+                del replaced[i]
+
+    # Low-confidence boxes: recognizer only, on full-resolution crops of the same boxes
+    weak = [i for i, r in enumerate(results) if i not in replaced and r[2] < ADAPTIVE_MIN_CONFIDENCE]
+    if weak:
+        horizontal = {}
+        for i in weak:
+            b = ocr.boxes[i]
+            rect = (max(0, int(b.x0) - _PAD), min(width, int(b.x1) + _PAD), max(0, int(b.y0) - _PAD), min(height, int(b.y1) + _PAD))
+            horizontal[(rect[0], rect[2])] = (i, rect)
+        reread = reader.recognize(_gray(img_array), horizontal_list=[list(r) for _, r in horizontal.values()], free_list=[])
+        for box, text, confidence in reread:
+            i, _ = horizontal.get((int(box[0][0]), int(box[0][1])), (None, None))
+            if i is None:
+                continue
+            if confidence > results[i][2]:
+                results[i][1], results[i][2] = text, confidence
+            results[i].append(True)
+
+    # Keep reading order: a strip's results go where its first replaced box was
+    out: list = []
+    emitted = set()
+    for i, r in enumerate(results):
+        strip = replaced.get(i)
+        if strip is None:
+            out.append(r)
+        elif strip not in emitted:
+            emitted.add(strip)
+            out.extend(strips[strip])
+    return out
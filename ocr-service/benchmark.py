@@ -0,0 +1,286 @@
+"""
+Benchmarks of the OCR and parsing hot paths on the synthetic corpus (synthetic.py). Offline, CPU only.
+
+    python benchmark.py run                               # parsers + OCR, report in bench-results/<revision>.json
+    python benchmark.py run --skip-ocr --texts 20000      # parser microbenchmarks only
+    python benchmark.py run --engines easyocr,onnx --count 3
+    python benchmark.py compare bench-results/1a2b3c4.json bench-results/5d6e7f8.json
+
+parsers  parse_patient_data, parse_echo_measurements, parse_exam_info and build_exam_response_from_results
+         (box pairing) over --texts synthetic OCR texts: per-call latency percentiles and field accuracy.
+ocr      every corpus image through run_ocr_results (OCR cache off) and its endpoint's parsers, per engine, kind and
+         resolution: latency p50/p95/p99, mean time per stage (the /metrics stages) and field accuracy; model load
+         time, peak RSS and RSS growth per engine.
+compare  metric-by-metric change between two reports; exits 1 when a latency or memory figure grew by more than
+         --threshold (relative) or an accuracy fell by more than --accuracy-threshold (absolute).
+
+The corpus is generated from --seed into --corpus on first use and reused afterwards, so runs on two revisions
+read the same images. Field accuracy uses compare_engines.agrees (numbers within --tolerance).
+"""
+import os
+
+# Measure the work, not the caches: set before main is imported
+os.environ.setdefault("OCR_CACHE_MAX_ENTRIES", "0")
+os.environ["OCR_CACHE_DIR"] = ""
+os.environ.setdefault("OCR_LAYOUT_LEARN", "0")
+
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+import time
+
+import main as service
+import metrics
+import synthetic
+from compare_engines import agrees, flatten
+from metrics import percentiles
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+_LOWER_IS_BETTER = ("Ms", "Seconds", "Mb")
+
+
+def field_score(expected: dict, actual: dict, tolerance: float) -> tuple[int, int]:
+    """(fields in expected, fields actual agrees on); both are responses or response sections."""
+    expected, actual = flatten(expected), flatten(actual)
+    return len(expected), sum(1 for field, value in expected.items() if agrees(value, actual.get(field, ""), tolerance))
+
+
+def revision() -> str:
+    """Short git commit of the tree being measured, with -dirty for uncommitted changes ("" outside git)."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no", "."], cwd=HERE, capture_output=True, text=True)
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+    return commit.stdout.strip() + ("-dirty" if dirty.stdout.strip() else "")
+
+
+def _unwrapped(fn):
+    return getattr(fn, "__wrapped__", fn)  # the parser itself, without its metrics.timed stage
+
+
+def bench_parsers(corpus: list[dict], repeat: int, tolerance: float) -> dict:
+    """Per-call latency and field accuracy of each parser over its part of the text corpus."""
+    exams = [s for s in corpus if s["kind"] == "exam"]
+    forms = [s for s in corpus if s["kind"] == "form"]
+    cases = {
+        "parse_patient_data": (
+            forms, lambda s: _unwrapped(service.parse_patient_data)(s["text"]), lambda s: s["truth"]["patientData"]
+        ),
+        "parse_echo_measurements": (
+            exams, lambda s: _unwrapped(service.parse_echo_measurements)(s["text"]), lambda s: {"measurementsData": s["truth"]["measurementsData"]}
+        ),
+        "parse_exam_info": (
+            exams, lambda s: _unwrapped(service.parse_exam_info)(s["text"]), lambda s: s["truth"]["examInfo"]
+        ),
+        "build_exam_response_from_results": (
+            exams, lambda s: service.build_exam_response_from_results(s["items"]), lambda s: s["truth"]
+        ),
+    }
+    report = {}
+    for name, (samples, parse, truth) in cases.items():
+        timings, fields, agreeing = [], 0, 0
+        for round_ in range(repeat):
+            for sample in samples:
+                start = time.perf_counter()
+                parsed = parse(sample)
+                timings.append(time.perf_counter() - start)
+                if round_ == 0:
+                    n, ok = field_score(truth(sample), parsed, tolerance)
+                    fields += n
+                    agreeing += ok
+        report[name] = {
+            "calls": len(timings),
+            **percentiles(timings),
+            "fields": fields,
+            "accuracy": round(agreeing / fields, 4) if fields else 0.0,
+        }
+    return report
+
+
+def load_corpus(directory: str, seed: int, count: int) -> list[dict]:
+    """Corpus images with their truth; generated into directory first when it holds no manifest for this seed/count."""
+    manifest_path = os.path.join(directory, "manifest.json")
+    config = {"seed": seed, "count": count, "font": synthetic.font_name()}
+    manifest = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    if manifest is None or manifest.get("config") != config:
+        corpus = synthetic.samples(seed, count)
+        synthetic.write(directory, corpus)
+        manifest = {"config": config, "samples": [{k: s[k] for k in ("kind", "name", "size", "truth")} for s in corpus]}
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+    for sample in manifest["samples"]:
+        with open(os.path.join(directory, sample["name"] + ".png"), "rb") as f:
+            sample["image"] = f.read()
+    return manifest["samples"]
+
+
+def _read(sample: dict, engine: str) -> dict:
+    """OCR plus the parsers of the sample's endpoint (/ocr/extract-exam or /ocr/extract)."""
+    if sample["kind"] == "exam":
+        return service.build_exam_response_from_results(service.run_ocr_results(sample["image"], service.PREPROCESS_EXAM, engine))
+    text = service.results_to_text(service.run_ocr_results(sample["image"], service.PREPROCESS_PATIENT, engine, layouts=False))
+    return {"patientData": service.parse_patient_data(text)}
+
+
+def bench_ocr(corpus: list[dict], engine: str, repeat: int, tolerance: float) -> dict:
+    """End-to-end latency, stage breakdown, accuracy and memory of one engine over the corpus images."""
+    start = time.perf_counter()
+    service.get_reader(engine)
+    load_seconds = time.perf_counter() - start
+    _read(corpus[0], engine)  # warmup inference, not measured
+    rss_before, _ = metrics.process_memory()
+    groups: dict[str, dict] = {}
+    for sample in corpus:
+        group = groups.setdefault(f"{sample['kind']}-{sample['size'][0]}x{sample['size'][1]}", {"timings": [], "stages": [], "fields": 0, "agreeing": 0})
+        for round_ in range(repeat):
+            stages: dict = {}
+            token = metrics.request_timings.set(stages)
+            try:
+                begin = time.perf_counter()
+                response = _read(sample, engine)
+                group["timings"].append(time.perf_counter() - begin)
+            finally:
+                metrics.request_timings.reset(token)
+            group["stages"].append(stages)
+            if round_ == 0:
+                n, ok = field_score(sample["truth"], response, tolerance)
+                group["fields"] += n
+                group["agreeing"] += ok
+    rss_after, peak = metrics.process_memory()
+    report = {}
+    for name, group in sorted(groups.items()):
+        stage_names = sorted({s for stages in group["stages"] for s in stages})
+        report[name] = {
+            "images": len(group["timings"]),
+            **percentiles(group["timings"]),
+            "stagesMs": {s: round(sum(st.get(s, 0.0) for st in group["stages"]) / len(group["stages"]) * 1000, 3) for s in stage_names},
+            "fields": group["fields"],
+            "accuracy": round(group["agreeing"] / group["fields"], 4) if group["fields"] else 0.0,
+        }
+    return {
+        "modelLoadSeconds": round(load_seconds, 3),
+        "peakRssMb": round(peak / 2**20, 1),
+        "rssGrowthMb": round((rss_after - rss_before) / 2**20, 1),
+        "groups": report,
+    }
+
+
+def run(args) -> dict:
+    report = {
+        "revision": revision(),
+        "createdAt": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {
+            "seed": args.seed,
+            "texts": args.texts,
+            "count": args.count,
+            "repeat": args.repeat,
+            "tolerance": args.tolerance,
+            "font": synthetic.font_name(),
+            "preprocessExam": service.PREPROCESS_EXAM.variant(),
+            "preprocessPatient": service.PREPROCESS_PATIENT.variant(),
+        },
+    }
+    print(f"parsers: {args.texts} texts", file=sys.stderr)
+    report["parsers"] = bench_parsers(synthetic.texts(args.seed, args.texts), args.repeat, args.tolerance)
+    if not args.skip_ocr:
+        corpus = load_corpus(args.corpus, args.seed, args.count)
+        report["ocr"] = {}
+        for engine in [service.ocr_engines.resolve(e) for e in args.engines.split(",") if e.strip()]:
+            print(f"ocr: {engine}, {len(corpus)} images x {args.repeat}", file=sys.stderr)
+            report["ocr"][engine] = bench_ocr(corpus, engine, args.repeat, args.tolerance)
+    return report
+
+
+def _leaves(node, path: str = "") -> dict:
+    """{"a.b.c": number} for the numeric leaves of a report."""
+    if isinstance(node, dict):
+        out = {}
+        for key, value in node.items():
+            out.update(_leaves(value, f"{path}.{key}" if path else key))
+        return out
+    if isinstance(node, (int, float)) and not isinstance(node, bool):
+        return {path: node}
+    return {}
+
+
+def compare(before: dict, after: dict, threshold: float, accuracy_threshold: float, min_delta_ms: float = 0.05) -> list[dict]:
+    """
+    Changes of the latency, memory and accuracy figures present in both reports, with regression flags.
+    Latencies that moved by less than min_delta_ms are never flagged (microsecond parser timings are noisy).
+    """
+    old, new = _leaves({k: before.get(k, {}) for k in ("parsers", "ocr")}), _leaves({k: after.get(k, {}) for k in ("parsers", "ocr")})
+    rows = []
+    for path in sorted(old.keys() & new.keys()):
+        *_, parent, key = ["", *path.split(".")]
+        a, b = old[path], new[path]
+        if key == "accuracy":
+            regressed = a - b > accuracy_threshold
+        elif parent == "stagesMs":
+            regressed = False  # stage means explain a latency change; the latency figures carry the verdict
+        elif key.endswith(_LOWER_IS_BETTER):
+            regressed = a > 0 and (b - a) / a > threshold and not (key.endswith("Ms") and b - a < min_delta_ms)
+        else:
+            continue
+        rows.append({"metric": path, "before": a, "after": b, "change": (b - a) / a if a else 0.0, "regressed": regressed})
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the benchmarks and write a JSON report")
+    run_parser.add_argument("--corpus", default=os.path.join(HERE, "bench-corpus"), help="corpus directory (generated when missing)")
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--count", type=int, default=5, help="images per kind and resolution")
+    run_parser.add_argument("--texts", type=int, default=5000, help="parser corpus size")
+    run_parser.add_argument("--repeat", type=int, default=3, help="timed runs per text / image")
+    run_parser.add_argument("--engines", default=service.ocr_engines.OCR_ENGINE)
+    run_parser.add_argument("--tolerance", type=float, default=0.02, help="relative tolerance for numeric fields")
+    run_parser.add_argument("--skip-ocr", action="store_true", help="parser microbenchmarks only")
+    run_parser.add_argument("--out", help="report path (default: bench-results/<revision>.json)")
+    compare_parser = commands.add_parser("compare", help="compare two reports")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="allowed relative growth of latency / memory")
+    compare_parser.add_argument("--accuracy-threshold", type=float, default=0.01, help="allowed absolute accuracy drop")
+    compare_parser.add_argument("--min-delta-ms", type=float, default=0.05, help="ignore latency changes smaller than this")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = run(args)
+        out = args.out or os.path.join(HERE, "bench-results", f"{report['revision'] or 'report'}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        for name, stats in report["parsers"].items():
+            print(f"{name:34} p50 {stats['p50Ms']:8.3f} ms  p99 {stats['p99Ms']:8.3f} ms  accuracy {stats['accuracy']:6.1%}")
+        for engine, stats in report.get("ocr", {}).items():
+            print(f"{engine}: model load {stats['modelLoadSeconds']:.1f}s, peak RSS {stats['peakRssMb']:.0f} MB")
+            for name, group in stats["groups"].items():
+                print(f"  {name:18} p50 {group['p50Ms']:9.1f} ms  p95 {group['p95Ms']:9.1f} ms  p99 {group['p99Ms']:9.1f} ms  accuracy {group['accuracy']:6.1%}")
+        print(f"report written to {out}")
+        sys.exit(0)
+
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+    print(f"{before.get('revision') or args.before} -> {after.get('revision') or args.after}")
+    for key in ("config", "platform", "cpus"):
+        if before.get(key) != after.get(key):
+            print(f"warning: {key} differs ({before.get(key)} vs {after.get(key)}); figures may not be comparable")
+    rows = compare(before, after, args.threshold, args.accuracy_threshold, args.min_delta_ms)
+    for row in rows:
+        flag = "  REGRESSION" if row["regressed"] else ""
+        print(f"{row['metric']:70} {row['before']:>10} -> {row['after']:>10}  {row['change']:+7.1%}{flag}")
+    sys.exit(1 if any(row["regressed"] for row in rows) else 0)
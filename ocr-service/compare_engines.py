@@ -0,0 +1,115 @@
+"""
+Check that OCR engines agree on a directory of golden images (PNG/JPEG exam screens or DICOM files).
+
+    python compare_engines.py golden/ --engines easyocr,onnx
+    python compare_engines.py golden/ --engines easyocr,onnx,tesseract --tolerance 0.02 --min-agreement 0.9
+
+Every image is read by each engine and parsed into the /ocr/extract-exam response. The expected response is
+<image>.json next to the image when present, else the first engine's response. A numeric field agrees when it
+is within --tolerance (relative) of the expected value, any other field when it is equal ignoring case and
+spaces. Prints each engine's agreement and read time, and exits 1 when an engine is below --min-agreement.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import main as service
+from dicom_input import is_dicom
+
+_SKIP = ("frameStats", "ocrStats")
+
+
+def exam_response(image_bytes: bytes, engine: str) -> dict:
+    if is_dicom(image_bytes):
+        return service.build_dicom_exam_response(*service.read_dicom(image_bytes, engine=engine))
+    return service.build_exam_response_from_results(service._readtext(image_bytes, service.PREPROCESS_EXAM, engine))
+
+
+def flatten(response: dict) -> dict:
+    """{"section.field": value} of the non-empty fields of an exam response."""
+    out = {}
+    for section, value in response.items():
+        if section in _SKIP:
+            continue
+        if isinstance(value, dict):
+            out.update({f"{section}.{field}": v for field, v in value.items() if v})
+        elif value:
+            out[section] = value
+    return out
+
+
+def _number(value):
+    try:
+        return float(str(value).replace(",", "."))
+    except ValueError:
+        return None
+
+
+def agrees(expected, actual, tolerance: float) -> bool:
+    a, b = _number(expected), _number(actual)
+    if a is not None and b is not None:
+        return abs(a - b) <= tolerance * max(abs(a), 1e-9)
+    return "".join(str(expected).lower().split()) == "".join(str(actual).lower().split())
+
+
+def compare(directory: str, engines: list[str], tolerance: float) -> dict:
+    """{engine: {"fields", "agreeing", "seconds", "mismatches": [...]}} over the images in directory."""
+    report = {e: {"fields": 0, "agreeing": 0, "seconds": 0.0, "mismatches": []} for e in engines}
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if name.endswith(".json") or not os.path.isfile(path):
+            continue
+        with open(path, "rb") as f:
+            image_bytes = f.read()
+        responses = {}
+        for engine in engines:
+            start = time.perf_counter()
+            responses[engine] = flatten(exam_response(image_bytes, engine))
+            report[engine]["seconds"] += time.perf_counter() - start
+        golden = os.path.splitext(path)[0] + ".json"
+        if os.path.exists(golden):
+            with open(golden, encoding="utf-8") as f:
+                expected = flatten(json.load(f))
+        else:
+            expected = responses[engines[0]]
+        for engine in engines:
+            if engine == engines[0] and not os.path.exists(golden):
+                continue
+            stats = report[engine]
+            for field, value in expected.items():
+                stats["fields"] += 1
+                actual = responses[engine].get(field, "")
+                if agrees(value, actual, tolerance):
+                    stats["agreeing"] += 1
+                else:
+                    stats["mismatches"].append({"image": name, "field": field, "expected": value, "actual": actual})
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory")
+    parser.add_argument("--engines", default="easyocr,onnx", help="comma-separated; the first is the reference")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="relative tolerance for numeric fields")
+    parser.add_argument("--min-agreement", type=float, default=0.95)
+    parser.add_argument("--json", help="write the full report (with mismatches) to this file")
+    args = parser.parse_args()
+
+    engines = [service.ocr_engines.resolve(e) for e in args.engines.split(",") if e.strip()]
+    report = compare(args.directory, engines, args.tolerance)
+    failed = False
+    for engine, stats in report.items():
+        if not stats["fields"]:
+            print(f"{engine:10} reference  {stats['seconds']:.1f}s")
+            continue
+        agreement = stats["agreeing"] / stats["fields"]
+        failed |= agreement < args.min_agreement
+        print(f"{engine:10} {agreement:6.1%} of {stats['fields']} fields  {stats['seconds']:.1f}s")
+        for m in stats["mismatches"][:10]:
+            print(f"    {m['image']}: {m['field']} expected {m['expected']!r}, got {m['actual']!r}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,246 @@
+"""
+DICOM input for the OCR service: header tags -> patient/exam fields, and frame-by-frame pixel access
+so only frames with burned-in text are OCR'd (a cine loop is never decoded into one big array).
+
+Tag mapping mirrors the frontend (src/lib/dicomUtils.ts) so DICOM read here or in the browser fills
+the form the same way. Requires pydicom>=3.0 (imported lazily; images keep working without it).
+"""
+import os
+from datetime import date
+from typing import Iterable, Iterator, Optional
+
+from frame_dedup import block_signature, select_frames
+from preprocess import open_buffer
+
+# OCR_DICOM_FRAMES: "all" = OCR every frame that carries text and whose overlay changed (see frame_dedup);
+# "first" = OCR only the first frame that carries text.
+DICOM_FRAMES = os.environ.get("OCR_DICOM_FRAMES", "all")
+# Fraction of bright pixels outside the ultrasound regions for a frame to count as carrying text
+DICOM_TEXT_MIN_INK = float(os.environ.get("OCR_DICOM_TEXT_MIN_INK", "0.001"))
+
+# Patient fields a DICOM header can carry; when all are present, patient-only requests skip OCR.
+DICOM_PATIENT_FIELDS = ("nome", "responsavel", "especie", "raca", "sexo", "idade", "peso")
+
+
+class DicomUnavailable(Exception):
+    """pydicom is not installed."""
+
+
+def is_dicom(data: bytes) -> bool:
+    """DICOM Part 10 files have a 128-byte preamble followed by 'DICM'."""
+    return len(data) >= 132 and data[128:132] == b"DICM"
+
+
+def _clean(value) -> str:
+    # Remove trailing null chars and whitespace, replace ^ with space (same as cleanDicomString)
+    if value is None:
+        return ""
+    return str(value).replace("\0", "").replace("^", " ").strip()
+
+
+def _parse_sex(value) -> str:
+    v = _clean(value).upper()
+    if v == "M":
+        return "macho"
+    if v == "F":
+        return "femea"
+    return ""
+
+
+def _parse_da(value) -> Optional[date]:
+    v = _clean(value)
+    if len(v) != 8 or not v.isdigit():
+        return None
+    try:
+        return date(int(v[:4]), int(v[4:6]), int(v[6:8]))
+    except ValueError:
+        return None
+
+
+def _age_from_dates(birth: Optional[date], on: Optional[date]) -> str:
+    """Age in the wording parse_patient_data produces ("10 anos", "5 meses")."""
+    if not birth or not on or on < birth:
+        return ""
+    months = (on.year - birth.year) * 12 + on.month - birth.month - (1 if on.day < birth.day else 0)
+    if months >= 12:
+        years = months // 12
+        return f"{years} ano" if years == 1 else f"{years} anos"
+    return f"{months} mês" if months == 1 else f"{months} meses"
+
+
+class DicomFile:
+    """Header of a DICOM file held in memory, plus lazy per-frame pixel access."""
+
+    def __init__(self, data: bytes):
+        try:
+            import pydicom
+        except ImportError as e:
+            raise DicomUnavailable("DICOM support requires pydicom (pip install pydicom)") from e
+        self.data = data
+        try:
+            self.ds = pydicom.dcmread(open_buffer(data), stop_before_pixels=True)
+        except Exception as e:
+            raise ValueError(f"Invalid DICOM file: {e}") from e
+        self.number_of_frames = int(self.ds.get("NumberOfFrames") or 1)
+        self.photometric = _clean(self.ds.get("PhotometricInterpretation"))
+        self.manufacturer = _clean(self.ds.get("Manufacturer"))
+        self.model = _clean(self.ds.get("ManufacturerModelName"))
+        # Set by text_frames(): frames in the file, frames OCR'd, frames skipped (no text or duplicate overlay)
+        self.frame_stats = {"frames": self.number_of_frames, "ocrFrames": 0, "skippedFrames": 0, "duplicateFrames": 0}
+        self.regions = [
+            (int(r.RegionLocationMinX0), int(r.RegionLocationMinY0), int(r.RegionLocationMaxX1), int(r.RegionLocationMaxY1))
+            for r in self.ds.get("SequenceOfUltrasoundRegions", [])
+            if "RegionLocationMinX0" in r and "RegionLocationMaxY1" in r
+        ]
+
+    @property
+    def burned_in_annotation(self) -> Optional[bool]:
+        """(0028,0301) Burned In Annotation: True/False, or None when the tag is absent."""
+        v = _clean(self.ds.get("BurnedInAnnotation")).upper()
+        return {"YES": True, "NO": False}.get(v)
+
+    def patient_data(self) -> dict:
+        """Patient fields from header tags (only non-empty values)."""
+        ds = self.ds
+        result = {
+            "nome": _clean(ds.get("PatientName")),
+            "responsavel": _clean(ds.get("ResponsiblePerson"))
+            or _clean(ds.get("ReferringPhysicianName"))
+            or _clean(ds.get("InstitutionName")),
+            "especie": _clean(ds.get("PatientSpeciesDescription")),
+            "raca": _clean(ds.get("PatientBreedDescription")),
+            "sexo": _parse_sex(ds.get("PatientSex")),
+            "idade": _clean(ds.get("PatientAge"))
+            or _age_from_dates(_parse_da(ds.get("PatientBirthDate")), _parse_da(ds.get("StudyDate"))),
+        }
+        try:
+            weight = float(_clean(ds.get("PatientWeight")))
+            result["peso"] = f"{weight:g}" if weight > 0 else ""
+        except ValueError:
+            result["peso"] = ""
+        return {k: v for k, v in result.items() if v}
+
+    def exam_info(self) -> dict:
+        """Exam fields in parse_exam_info's shape: data (ISO date) and frequenciaCardiaca."""
+        info = {}
+        study_date = _parse_da(self.ds.get("StudyDate")) or _parse_da(self.ds.get("ContentDate"))
+        if study_date:
+            info["data"] = study_date.isoformat()
+        heart_rate = _clean(self.ds.get("HeartRate"))
+        if heart_rate.isdigit() and int(heart_rate) > 0:
+            info["frequenciaCardiaca"] = heart_rate
+        return info
+
+    def frame_nbytes(self) -> tuple[int, int]:
+        """
+        From the header, before anything is decoded: (bytes to decode and convert one frame at peak, bytes of the
+        uint8 frame that is yielded). Wider than 8 bits, the decoded frame, a float32 copy and the result coexist;
+        MONOCHROME1 adds the inverted copy.
+        """
+        ds = self.ds
+        samples = int(ds.get("Rows") or 0) * int(ds.get("Columns") or 0) * int(ds.get("SamplesPerPixel") or 1)
+        stored = max(1, int(ds.get("BitsAllocated") or 8) // 8)
+        peak = samples * (stored + 4 + 1) if stored > 1 else samples
+        if self.photometric == "MONOCHROME1":
+            peak += samples
+        return peak, samples
+
+    def iter_frames(self, indices: Optional[Iterable[int]] = None, hold=None) -> Iterator[tuple[int, object]]:
+        """
+        Yield (index, uint8 array) one frame at a time (grayscale HxW or RGB HxWx3), optionally only some frames.
+        With hold (image_budget.Hold), each frame's frame_nbytes() is reserved before it is decoded; the yielded
+        frame stays reserved until the next one is requested (drop it by then) or the iterator is closed.
+        """
+        from pydicom.pixels import iter_pixels
+        if "Rows" not in self.ds or "Columns" not in self.ds:
+            raise ValueError("DICOM file has no image pixel data")
+        if indices is None:
+            frames = enumerate(iter_pixels(open_buffer(self.data)))
+        else:
+            indices = sorted(indices)
+            frames = zip(indices, iter_pixels(open_buffer(self.data), indices=indices))
+        decode_bytes, frame_bytes = self.frame_nbytes() if hold is not None else (0, 0)
+        reserved = 0
+        try:
+            while True:
+                if hold is not None:
+                    hold.acquire(decode_bytes)
+                    reserved = decode_bytes
+                try:
+                    index, frame = next(frames)
+                except StopIteration:
+                    return
+                except Exception as e:
+                    raise ValueError(f"Cannot decode DICOM pixel data: {e}") from e
+                frame = self._to_uint8(frame)
+                if hold is not None:
+                    hold.release(decode_bytes - frame_bytes)
+                    reserved = frame_bytes
+                yield index, frame
+                del frame
+                if hold is not None:
+                    hold.release(frame_bytes)
+                    reserved = 0
+        finally:
+            if reserved:
+                hold.release(reserved)
+
+    def _to_uint8(self, frame):
+        import numpy as np
+        if frame.dtype != np.uint8:
+            frame = frame.astype(np.float32)
+            lo, hi = float(frame.min()), float(frame.max())
+            frame -= lo
+            frame *= 255.0 / (hi - lo) if hi > lo else 0.0
+            frame = frame.astype(np.uint8)
+        if self.photometric == "MONOCHROME1":
+            frame = 255 - frame
+        return frame
+
+    def frame_has_text(self, frame) -> bool:
+        """
+        Cheap check for burned-in text: bright pixels outside the ultrasound regions
+        (patient header band, side bars). Without region tags the whole frame is checked.
+        """
+        import numpy as np
+        gray = frame.max(axis=2) if frame.ndim == 3 else frame
+        mask = np.ones(gray.shape, dtype=bool)
+        for x0, y0, x1, y1 in self.regions:
+            mask[y0:y1 + 1, x0:x1 + 1] = False
+        if not mask.any():
+            mask[:] = True
+        ink = np.count_nonzero(gray[mask] >= 160)
+        return ink >= DICOM_TEXT_MIN_INK * np.count_nonzero(mask)
+
+    def text_frames(self, mode: str = DICOM_FRAMES, hold=None) -> Iterator[tuple[int, object]]:
+        """
+        Frames to OCR: none if the header says there is no burned-in annotation, else per OCR_DICOM_FRAMES.
+        In "all" mode text frames are fingerprinted first and only frames whose overlay changed are decoded
+        again and yielded. frame_stats is up to date once the iterator is exhausted.
+        hold is passed on to iter_frames, so both passes reserve each frame before decoding it.
+        """
+        stats = self.frame_stats
+        stats.update(ocrFrames=0, skippedFrames=self.number_of_frames, duplicateFrames=0)
+        if self.burned_in_annotation is False:
+            return
+        if mode == "first":
+            for index, frame in self.iter_frames(hold=hold):
+                if self.frame_has_text(frame):
+                    stats.update(ocrFrames=1, skippedFrames=self.number_of_frames - 1)
+                    yield index, frame
+                    return
+            return
+        indices, signatures = [], []
+        for index, frame in self.iter_frames(hold=hold):
+            if self.frame_has_text(frame):
+                indices.append(index)
+                signatures.append(block_signature(frame))
+        refs = select_frames(signatures)
+        keep = [indices[i] for i, ref in enumerate(refs) if ref == i]
+        stats.update(
+            ocrFrames=len(keep),
+            skippedFrames=self.number_of_frames - len(keep),
+            duplicateFrames=len(indices) - len(keep),
+        )
+        frame = None  # the last fingerprinted frame is no longer reserved
+        yield from self.iter_frames(keep, hold)
@@ -0,0 +1,199 @@
+"""
+Local stand-in for the Supabase Edge Functions in supabase/functions (extract-ocr, extract-exam), for load tests
+and local development without the Supabase CLI. It answers the same paths and mirrors the TypeScript proxies:
+
+  POST /functions/v1/extract-ocr   JSON {image_base64} -> /ocr/extract-json   binary bodies -> /ocr/extract-raw
+  POST /functions/v1/extract-exam  JSON {image_base64} -> /ocr/extract-exam   binary bodies -> /ocr/extract-exam-raw
+
+Binary means an explicit image/*, application/dicom or application/octet-stream Content-Type; any other body,
+including one without a Content-Type, is parsed as JSON.
+
+JSON bodies are parsed and re-serialized before forwarding (as req.json() / JSON.stringify do), bodies over
+~10MB get 413, a missing image_base64 400, an unreachable service 503, a non-JSON answer 502, and the service's
+own errors are relayed with their status. Each forward gets EDGE_TIMEOUT seconds (the Edge Function wall-clock
+limit) before the stand-in answers 504, as the Supabase gateway does. Unlike the real functions it passes the
+service's Server-Timing and X-OCR-Peak-RSS-MB headers through (loadtest.py reads them), and it leaves out their
+localhost check: this proxy runs next to the service.
+
+    python edge_proxy.py --port 54321 --service http://127.0.0.1:8000
+    curl -X POST localhost:54321/functions/v1/extract-exam -H 'Content-Type: application/json' \\
+         -d '{"image_base64": "..."}'
+
+http_request is a small asyncio HTTP/1.1 client (one connection per request, like fetch() from an Edge Function),
+so neither the proxy nor loadtest.py needs an HTTP client package.
+"""
+import argparse
+import asyncio
+import json
+import os
+import ssl
+import urllib.parse
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+
+# Configuration (environment variables)
+OCR_SERVICE_URL = os.environ.get("OCR_SERVICE_URL", "http://127.0.0.1:8000").rstrip("/")
+EDGE_TIMEOUT = float(os.environ.get("EDGE_TIMEOUT", "150"))  # seconds per forwarded request
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+
+PASSED_HEADERS = ("server-timing", "x-ocr-peak-rss-mb")
+
+# Function name -> (JSON endpoint, raw-body endpoint) on the OCR service
+FUNCTIONS = {
+    "extract-ocr": ("/ocr/extract-json", "/ocr/extract-raw"),
+    "extract-exam": ("/ocr/extract-exam", "/ocr/extract-exam-raw"),
+}
+
+
+def is_binary_upload(content_type: str) -> bool:
+    media_type = content_type.split(";")[0].strip().lower()
+    return media_type.startswith("image/") or media_type in ("application/dicom", "application/octet-stream")
+
+
+class HttpError(Exception):
+    """Connection failure or malformed HTTP response (the stand-in turns it into 503, like a failed fetch())."""
+
+
+async def _read_body(reader: asyncio.StreamReader, headers: dict) -> bytes:
+    if "content-length" in headers:
+        return await reader.readexactly(int(headers["content-length"]))
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                await reader.readline()
+                return b"".join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+    return await reader.read()
+
+
+async def http_request(
+    url: str, method: str = "POST", body: bytes = b"", headers: Optional[dict] = None, timeout: Optional[float] = None
+) -> tuple[int, dict, bytes]:
+    """
+    (status, lower-cased headers, body) of one HTTP/1.1 request on a fresh connection.
+    Connection and protocol failures -> HttpError; no answer within timeout seconds -> asyncio.TimeoutError.
+    """
+    parts = urllib.parse.urlsplit(url)
+    https = parts.scheme == "https"
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    lines = [f"{method} {path} HTTP/1.1", f"Host: {parts.netloc}", f"Content-Length: {len(body)}", "Connection: close"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def exchange() -> tuple[int, dict, bytes]:
+        try:
+            reader, writer = await asyncio.open_connection(
+                parts.hostname, parts.port or (443 if https else 80), ssl=ssl.create_default_context() if https else None
+            )
+        except OSError as e:
+            raise HttpError(f"connect to {parts.netloc} failed: {e}") from e
+        try:
+            writer.write(head + body)
+            await writer.drain()
+            status_line = await reader.readline()
+            try:
+                status = int(status_line.split()[1])
+            except (IndexError, ValueError):
+                raise HttpError(f"bad status line {status_line[:80]!r}")
+            response_headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                response_headers[name.strip().lower()] = value.strip()
+            return status, response_headers, await _read_body(reader, response_headers)
+        except (OSError, asyncio.IncompleteReadError) as e:
+            raise HttpError(f"{parts.netloc}: {e}") from e
+        finally:
+            writer.close()
+
+    return await asyncio.wait_for(exchange(), timeout)
+
+
+def create_app(service_url: str = OCR_SERVICE_URL, timeout: float = EDGE_TIMEOUT) -> FastAPI:
+    app = FastAPI(title="Edge Function stand-in")
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_methods=["*"],
+        allow_headers=["authorization", "x-client-info", "apikey", "content-type"],
+    )
+    service_url = service_url.rstrip("/")
+
+    async def forward(path: str, body: bytes, content_type: str) -> JSONResponse:
+        try:
+            status, response_headers, data = await http_request(
+                service_url + path, body=body, headers={"Content-Type": content_type}, timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            return JSONResponse(
+                status_code=504, content={"error": "Edge Function timed out", "detail": f"No answer within {timeout:g}s"}
+            )
+        except HttpError as e:
+            return JSONResponse(status_code=503, content={"error": "OCR service unreachable", "detail": str(e)})
+        try:
+            payload = json.loads(data) if data else {}
+        except ValueError:
+            return JSONResponse(
+                status_code=502,
+                content={"error": "OCR service returned invalid response", "detail": "The OCR service did not return valid JSON."},
+            )
+        headers = {name: response_headers[name] for name in PASSED_HEADERS if name in response_headers}
+        if status >= 400:
+            if not (isinstance(payload, dict) and "error" in payload):
+                payload = {"error": "OCR service error", "detail": payload}
+            return JSONResponse(status_code=status, content=payload, headers=headers)
+        return JSONResponse(content=payload, headers=headers)
+
+    @app.post("/functions/v1/{function}")
+    async def edge_function(function: str, request: Request):
+        if function not in FUNCTIONS:
+            return JSONResponse(status_code=404, content={"error": f"Function {function!r} not found"})
+        json_path, raw_path = FUNCTIONS[function]
+        content_type = request.headers.get("content-type", "")
+        too_large = {"error": "Image too large", "detail": "Use an image under ~10MB for OCR."}
+        if is_binary_upload(content_type):
+            if int(request.headers.get("content-length") or 0) > MAX_IMAGE_BYTES:
+                return JSONResponse(status_code=413, content=too_large)
+            return await forward(raw_path, await request.body(), content_type)
+        try:
+            body = json.loads(await request.body())
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"error": "Invalid request body", "detail": str(e)})
+        image_base64 = body.get("image_base64") if isinstance(body, dict) else None
+        if not image_base64 or not isinstance(image_base64, str):
+            return JSONResponse(status_code=400, content={"error": "Missing image_base64 in request body"})
+        if len(image_base64) * 3 / 4 > MAX_IMAGE_BYTES:
+            return JSONResponse(status_code=413, content=too_large)
+        return await forward(json_path, json.dumps({"image_base64": image_base64}).encode(), "application/json")
+
+    @app.api_route("/functions/v1/{function}", methods=["GET", "PUT", "PATCH", "DELETE"])
+    async def method_not_allowed(function: str):
+        return JSONResponse(status_code=405, content={"error": "Method not allowed"})
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321, help="Default: 54321 (the Supabase CLI's API port)")
+    parser.add_argument("--service", default=OCR_SERVICE_URL, help="OCR service base URL (default: OCR_SERVICE_URL)")
+    parser.add_argument("--timeout", type=float, default=EDGE_TIMEOUT, help="Seconds per forward before 504 (default: EDGE_TIMEOUT)")
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(create_app(args.service, args.timeout), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
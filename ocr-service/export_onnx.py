@@ -0,0 +1,95 @@
+"""
+Export EasyOCR's pt/en detector and recognizer to ONNX for OCR_ENGINE=onnx (see onnx_engine.py).
+Runs once on a machine with easyocr, torch and onnx installed; the service host only needs onnxruntime.
+
+    python export_onnx.py                  # models/detector.onnx, models/recognizer.onnx, models/recognizer.json
+    python export_onnx.py --int8           # also models/recognizer.int8.onnx (dynamic int8 quantization)
+    python export_onnx.py --int8-detector  # also models/detector.int8.onnx (check accuracy with compare_engines.py)
+
+Dynamic int8 quantization suits the recognizer (LSTM and linear layers, which EasyOCR itself quantizes on CPU);
+the detector is convolutional and loses more, so it is only quantized on request.
+"""
+import argparse
+import json
+import os
+
+from onnx_engine import ONNX_DIR
+
+OPSET = 13
+
+
+def _reader():
+    import easyocr
+    # quantize=False: torch's dynamically quantized LSTM/Linear layers cannot be exported
+    return easyocr.Reader(["pt", "en"], gpu=False, quantize=False)
+
+
+def export(out_dir: str, int8: bool, int8_detector: bool) -> None:
+    import torch
+
+    reader = _reader()
+    os.makedirs(out_dir, exist_ok=True)
+
+    detector = reader.detector.eval()
+    torch.onnx.export(
+        detector,
+        torch.randn(1, 3, 640, 640),
+        os.path.join(out_dir, "detector.onnx"),
+        input_names=["image"],
+        output_names=["y", "feature"],
+        dynamic_axes={"image": {0: "batch", 2: "height", 3: "width"}, "y": {0: "batch", 1: "map_height", 2: "map_width"}},
+        opset_version=OPSET,
+    )
+
+    class MeanPool(torch.nn.Module):
+        # AdaptiveAvgPool2d((None, 1)) does not export with a dynamic width; it is a mean over the last axis
+        def forward(self, x):
+            return x.mean(dim=3, keepdim=True)
+
+    class Recognizer(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, image):
+            return self.model(image, None)  # the text argument is only used by attention decoders
+
+    model = reader.recognizer.eval()
+    model.AdaptiveAvgPool = MeanPool()
+    torch.onnx.export(
+        Recognizer(model),
+        torch.randn(1, 1, 64, 256),
+        os.path.join(out_dir, "recognizer.onnx"),
+        input_names=["image"],
+        output_names=["preds"],
+        dynamic_axes={"image": {0: "batch", 3: "width"}, "preds": {0: "batch", 1: "steps"}},
+        opset_version=OPSET,
+    )
+
+    charset = {
+        "characters": reader.character,
+        "ignore": "".join(sorted(set(reader.character) - set(reader.lang_char))),
+        "imgH": 64,
+    }
+    with open(os.path.join(out_dir, "recognizer.json"), "w", encoding="utf-8") as f:
+        json.dump(charset, f, ensure_ascii=False)
+
+    if int8 or int8_detector:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        names = ["recognizer"] * int8 + ["detector"] * int8_detector
+        for name in names:
+            quantize_dynamic(
+                os.path.join(out_dir, f"{name}.onnx"),
+                os.path.join(out_dir, f"{name}.int8.onnx"),
+                weight_type=QuantType.QUInt8,
+            )
+    print(f"ONNX models written to {out_dir}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default=ONNX_DIR, help="output directory (default: OCR_ONNX_DIR)")
+    parser.add_argument("--int8", action="store_true", help="also write an int8 recognizer")
+    parser.add_argument("--int8-detector", action="store_true", help="also write an int8 detector")
+    args = parser.parse_args()
+    export(args.out, args.int8, args.int8_detector)
@@ -0,0 +1,78 @@
+"""
+Frame deduplication for cine loops and image series.
+
+Consecutive echo frames usually carry the same patient header and measurement overlay; only the
+ultrasound sector changes. Each frame gets a cheap block signature (mean of small pixel blocks);
+blocks that change in most consecutive frame pairs are treated as the moving sector and ignored,
+and a frame is OCR'd only when one of the remaining (overlay) blocks differs from the last OCR'd frame.
+"""
+import os
+
+DEDUP_ENABLED = os.environ.get("OCR_DEDUP", "1") not in ("0", "false", "no")
+DEDUP_BLOCK = int(os.environ.get("OCR_DEDUP_BLOCK", "4"))  # block size in pixels (about half a glyph stroke run)
+DEDUP_TOLERANCE = int(os.environ.get("OCR_DEDUP_TOLERANCE", "12"))  # block mean change (0-255) that counts as an overlay change
+DEDUP_DYNAMIC_RATIO = float(os.environ.get("OCR_DEDUP_DYNAMIC_RATIO", "0.3"))  # share of frame pairs a sector block changes in
+
+
+def block_signature(frame, block: int = DEDUP_BLOCK):
+    """Mean brightness of each block x block tile (uses the brightest channel so coloured overlay text counts)."""
+    import numpy as np
+    gray = frame.max(axis=2) if frame.ndim == 3 else frame
+    h, w = gray.shape[0] // block * block, gray.shape[1] // block * block
+    tiles = gray[:h, :w].reshape(h // block, block, w // block, block)
+    return tiles.mean(axis=(1, 3), dtype=np.float32).astype(np.uint8)
+
+
+def _neighbour_votes(mask):
+    """Number of set blocks in each 3x3 neighbourhood."""
+    import numpy as np
+    padded = np.pad(mask.astype(np.uint8), 1)
+    h, w = mask.shape
+    return sum(padded[dy:dy + h, dx:dx + w] for dy in range(3) for dx in range(3))
+
+
+def _sector_mask(candidate):
+    """
+    Clean up the per-block "keeps changing" mask: a 3x3 majority vote fills speckle holes inside the sector
+    without keeping isolated blocks, then a one-block dilation covers the sector edge (partially covered blocks).
+    """
+    return _neighbour_votes(_neighbour_votes(candidate) >= 5) > 0
+
+
+def select_frames(signatures: list, tolerance: int = DEDUP_TOLERANCE, dynamic_ratio: float = DEDUP_DYNAMIC_RATIO) -> list[int]:
+    """
+    For each frame (in order), the index of the frame whose OCR result it can reuse; refs[i] == i means OCR frame i.
+    Frames with a different signature shape are never merged.
+    """
+    import numpy as np
+    refs = list(range(len(signatures)))
+    if not DEDUP_ENABLED or len(signatures) < 2:
+        return refs
+
+    # Blocks that change in many consecutive pairs are the moving sector, not overlay
+    shape = signatures[0].shape
+    changes = np.zeros(shape, dtype=np.int32)
+    pairs = 0
+    for prev, cur in zip(signatures, signatures[1:]):
+        if prev.shape == shape and cur.shape == shape:
+            # Lower threshold than for overlay changes: any real movement marks a sector block
+            changes += np.abs(cur.astype(np.int16) - prev.astype(np.int16)) > tolerance // 2
+            pairs += 1
+    # A block that changed once is an overlay change (e.g. a measurement appearing), not the sector.
+    # With only two frames there is no way to tell sector from overlay: compare every block.
+    if pairs >= 2:
+        dynamic = _sector_mask((changes >= 2) & (changes > dynamic_ratio * pairs))
+        static = ~dynamic
+    else:
+        static = np.ones(shape, dtype=bool)
+
+    last_ocr = 0
+    for i in range(1, len(signatures)):
+        ref_sig, sig = signatures[last_ocr], signatures[i]
+        if sig.shape == ref_sig.shape == shape:
+            diff = np.abs(sig.astype(np.int16) - ref_sig.astype(np.int16)) > tolerance
+            if not np.any(diff & static):
+                refs[i] = last_ocr
+                continue
+        last_ocr = i
+    return refs
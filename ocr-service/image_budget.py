@@ -0,0 +1,148 @@
+"""
+Memory budget for decoded images, shared by every request of the service.
+
+OCR_MAX_PIXELS bounds one image; this bounds them together. Before an image is decoded, the worker reserves
+the bytes its decoded pixels and the array handed to the engine will take (decode_image estimates them from
+the header, after JPEG draft scaling) and gives them back once the engine has read it. While the reservations
+of other requests leave no room, the worker waits up to OCR_IMAGE_MEMORY_WAIT_SECONDS, then gives up with
+ImageMemoryBusy (503 + Retry-After). An image larger than the whole budget still goes through, alone.
+
+The reservations live in shared memory guarded by a multiprocessing condition, so OCR_IMAGE_MEMORY_MB bounds
+the whole service: worker processes (OCR_POOL_MODE=process) attach to the parent's budget in their initializer
+(shared() / attach()), and launcher.py's server workers inherit it through fork.
+OCR_IMAGE_MEMORY_MB=0 turns the budget off.
+"""
+import multiprocessing
+import os
+import time
+from contextlib import contextmanager
+
+import metrics
+from ocr_pool import RETRY_AFTER_SECONDS
+
+# Configuration (environment variables)
+IMAGE_MEMORY_MB = float(os.environ.get("OCR_IMAGE_MEMORY_MB", "1024"))
+IMAGE_MEMORY_WAIT_SECONDS = float(os.environ.get("OCR_IMAGE_MEMORY_WAIT_SECONDS", "30"))
+
+_BYTES_PER_PIXEL = {"1": 1, "L": 1, "P": 1, "LA": 2, "PA": 2, "I;16": 2, "I;16B": 2, "I;16L": 2}  # others: 4
+
+
+def image_nbytes(mode: str, width: int, height: int) -> int:
+    """Bytes Pillow holds for a decoded image (RGB is stored with 4 bytes per pixel)."""
+    return _BYTES_PER_PIXEL.get(mode, 4) * width * height
+
+
+class ImageMemoryBusy(Exception):
+    """Raised when the budget did not free up within OCR_IMAGE_MEMORY_WAIT_SECONDS."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(retry_after)  # picklable for process workers
+        self.retry_after = retry_after
+
+    def __str__(self) -> str:
+        return "Image memory budget in use, retry later"
+
+
+class Hold:
+    """One request's reservations; acquire() more as images are decoded, release() what is no longer held."""
+
+    def __init__(self, budget: "ImageBudget"):
+        self.budget = budget
+        self.held = 0
+
+    def acquire(self, nbytes: int) -> None:
+        self.budget._acquire(self, nbytes)
+        metrics.note_image_memory(self.held)
+
+    def release(self, nbytes: int) -> None:
+        self.budget._release(self, min(nbytes, self.held))
+
+
+# Slots of ImageBudget._counters
+_IN_USE, _RESERVATIONS, _WAITS, _REJECTED, _PEAK = range(5)
+
+
+class ImageBudget:
+    def __init__(self, limit_mb: float = IMAGE_MEMORY_MB, wait: float = IMAGE_MEMORY_WAIT_SECONDS):
+        self.limit = int(limit_mb * 1024 * 1024)
+        self.wait = wait
+        context = multiprocessing.get_context()
+        self._cond = context.Condition()
+        self._counters = context.RawArray("q", 5)  # guarded by _cond
+
+    def shared(self) -> tuple:
+        """State to hand to a worker process (through its initializer's arguments) so it draws on this budget."""
+        return self.limit, self._cond, self._counters
+
+    def attach(self, shared: tuple) -> None:
+        self.limit, self._cond, self._counters = shared
+
+    @property
+    def in_use(self) -> int:
+        return self._counters[_IN_USE]
+
+    def _fits(self, hold: Hold, nbytes: int) -> bool:
+        # A hold that is alone in the budget always gets more, so one oversized image (or batch) cannot deadlock
+        in_use = self._counters[_IN_USE]
+        return self.limit <= 0 or in_use + nbytes <= self.limit or in_use == hold.held
+
+    def _acquire(self, hold: Hold, nbytes: int) -> None:
+        if nbytes <= 0:
+            return
+        counters = self._counters
+        with self._cond:
+            if not self._fits(hold, nbytes):
+                counters[_WAITS] += 1
+                start = time.monotonic()
+                if not self._cond.wait_for(lambda: self._fits(hold, nbytes), self.wait):
+                    counters[_REJECTED] += 1
+                    raise ImageMemoryBusy(RETRY_AFTER_SECONDS)
+                metrics.record_stage("memory_wait", time.monotonic() - start)
+            counters[_IN_USE] += nbytes
+            hold.held += nbytes
+            counters[_RESERVATIONS] += 1
+            counters[_PEAK] = max(counters[_PEAK], counters[_IN_USE])
+
+    def _release(self, hold: Hold, nbytes: int) -> None:
+        if nbytes <= 0:
+            return
+        with self._cond:
+            self._counters[_IN_USE] -= nbytes
+            hold.held -= nbytes
+            self._cond.notify_all()
+
+    @contextmanager
+    def hold(self):
+        """Reservations of one request (or batch); whatever is still held is released when the block ends."""
+        hold = Hold(self)
+        try:
+            yield hold
+        finally:
+            hold.release(hold.held)
+
+    def totals(self) -> dict:
+        """Limit, bytes in use and the counters, in bytes (for /metrics)."""
+        with self._cond:
+            counters = list(self._counters)
+        return {
+            "limitBytes": self.limit,
+            "inUseBytes": counters[_IN_USE],
+            "reservations": counters[_RESERVATIONS],
+            "waits": counters[_WAITS],
+            "rejected": counters[_REJECTED],
+            "peakBytes": counters[_PEAK],
+        }
+
+    def snapshot(self) -> dict:
+        """totals() with sizes in MB (for /health)."""
+        totals = self.totals()
+        mb = lambda n: round(n / 1024 / 1024, 1)
+        return {
+            "limitMb": mb(totals.pop("limitBytes")),
+            "inUseMb": mb(totals.pop("inUseBytes")),
+            "peakMb": mb(totals.pop("peakBytes")),
+            **totals,
+        }
+
+
+image_budget = ImageBudget()
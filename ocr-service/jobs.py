@@ -0,0 +1,408 @@
+"""
+Asynchronous OCR jobs for studies too long for one HTTP request (POST /jobs, GET /jobs/{id}).
+
+Jobs and their inputs are stored in SQLite (OCR_JOB_DB), so a job survives a worker restart: each item's
+result is written as soon as its chunk is read, and a restarted (or other) worker resumes the job with the
+items that have no result yet. OCR_JOB_WORKERS jobs run at a time per process, one chunk at a time on the
+shared OCR pool, so interactive requests still get through in between.
+
+A worker holds a job through a lease it keeps renewing while it works on it; a job whose lease expired
+(its worker died or was restarted) is claimed again. Several processes (launcher.py) can share one database file.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Optional
+
+import metrics
+
+JOB_DB = os.environ.get("OCR_JOB_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs.sqlite3"))
+JOB_WORKERS = int(os.environ.get("OCR_JOB_WORKERS", "1"))  # 0 = accept jobs but do not run them here
+JOB_CHUNK = int(os.environ.get("OCR_JOB_CHUNK", os.environ.get("OCR_BATCH_CHUNK", "8")))  # items per pool job
+JOB_MAX_ITEMS = int(os.environ.get("OCR_JOB_MAX_ITEMS", "1000"))
+JOB_LEASE_SECONDS = float(os.environ.get("OCR_JOB_LEASE_SECONDS", "60"))
+JOB_POLL_SECONDS = float(os.environ.get("OCR_JOB_POLL_SECONDS", "2"))
+JOB_TTL_HOURS = float(os.environ.get("OCR_JOB_TTL_HOURS", "24"))  # finished jobs are deleted after this
+JOB_PURGE_SECONDS = float(os.environ.get("OCR_JOB_PURGE_SECONDS", "3600"))  # at most one purge per interval
+
+logger = logging.getLogger("ocr.jobs")
+store_errors = metrics.registry.add(
+    "ocr_job_store_errors_total", "counter", "Job store operations of the job workers that failed.", ("operation",)
+)
+
+FINISHED = ("done", "failed", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    engine TEXT NOT NULL DEFAULT '',
+    total INTEGER NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    frame_stats TEXT NOT NULL DEFAULT '{}',
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    lease_until REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    data BLOB,
+    result TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+"""
+
+# Reads one chunk: [(index, bytes)] -> ([(index, response dict)], frame counters). Raise JobRetry to retry later.
+ChunkRunner = Callable[[str, list[tuple[int, bytes]]], Awaitable[tuple[list[tuple[int, dict]], dict]]]
+
+
+class JobRetry(Exception):
+    """Raised by the chunk runner when the chunk should be tried again after retry_after seconds (pool full)."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("retry later")
+        self.retry_after = retry_after
+
+
+class JobStore:
+    """SQLite job queue: thread-safe; blocking, so call it from a thread when on the event loop."""
+
+    def __init__(self, path: str = JOB_DB, lease_seconds: float = JOB_LEASE_SECONDS, ttl_hours: float = JOB_TTL_HOURS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.ttl_seconds = ttl_hours * 3600
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        # Opened on first use, so importing the app (or forking workers) does not hold the file
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _transaction(self, fn):
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                out = fn(db)
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+            return out
+
+    def submit(self, items: list, engine: str = "") -> dict:
+        """
+        Queue a job; items are bytes, or exceptions for inputs already known to be unreadable
+        (stored straight away as that item's error result). Returns the job summary.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+
+        def insert(db):
+            db.execute(
+                "INSERT INTO jobs (id, status, engine, total, created, updated) VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, engine, len(items), now, now),
+            )
+            db.executemany(
+                "INSERT INTO job_items (job_id, idx, data, result) VALUES (?, ?, ?, ?)",
+                [
+                    (job_id, i, None, json.dumps(error_result(item), ensure_ascii=False))
+                    if isinstance(item, Exception) else (job_id, i, bytes(item), None)
+                    for i, item in enumerate(items)
+                ],
+            )
+            failed = sum(1 for item in items if isinstance(item, Exception))
+            if failed:
+                db.execute("UPDATE jobs SET completed = ? WHERE id = ?", (failed, job_id))
+            if failed == len(items):
+                db.execute("UPDATE jobs SET status = 'done' WHERE id = ?", (job_id,))
+
+        self._transaction(insert)
+        return self.get(job_id, with_results=False)
+
+    def get(self, job_id: str, with_results: bool = True) -> Optional[dict]:
+        """Job summary, plus results (one entry per item, None while pending) when with_results."""
+        with self._lock:
+            db = self._db()
+            row = db.execute(
+                "SELECT status, engine, total, completed, frame_stats, error, cancel_requested, created, updated"
+                " FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            job = {
+                "id": job_id,
+                "status": row[0],
+                "engine": row[1],
+                "total": row[2],
+                "completed": row[3],
+                "frameStats": json.loads(row[4]),
+                "cancelRequested": bool(row[6]),
+                "createdAt": row[7],
+                "updatedAt": row[8],
+            }
+            if row[5]:
+                job["error"] = row[5]
+            if with_results:
+                results: list = [None] * row[2]
+                for idx, result in db.execute(
+                    "SELECT idx, result FROM job_items WHERE job_id = ? AND result IS NOT NULL", (job_id,)
+                ):
+                    results[idx] = json.loads(result)
+                job["results"] = results
+        return job
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """Cancel a job: a queued job stops at once, a running one after its current chunk. None if unknown."""
+        now = time.time()
+
+        def update(db):
+            row = db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return False
+            if row[0] == "queued":
+                db.execute("UPDATE jobs SET status = 'cancelled', updated = ? WHERE id = ?", (now, job_id))
+                db.execute("UPDATE job_items SET data = NULL WHERE job_id = ?", (job_id,))
+            elif row[0] == "running":
+                db.execute("UPDATE jobs SET cancel_requested = 1, updated = ? WHERE id = ?", (now, job_id))
+            return True
+
+        if not self._transaction(update):
+            return None
+        return self.get(job_id, with_results=False)
+
+    def claim(self) -> Optional[tuple[str, str]]:
+        """Take the oldest queued job, or a running one whose lease expired: (job_id, engine) or None."""
+        now = time.time()
+
+        def take(db):
+            # A job whose worker died after it was asked to cancel is just marked cancelled (unless every item
+            # was read: it is claimed and finished as done)
+            db.execute(
+                "UPDATE jobs SET status = 'cancelled', updated = ? WHERE status = 'running' AND lease_until < ?"
+                " AND cancel_requested = 1"
+                " AND EXISTS (SELECT 1 FROM job_items WHERE job_id = jobs.id AND result IS NULL)",
+                (now, now),
+            )
+            row = db.execute(
+                "SELECT id, engine FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease_until < ?)"
+                " ORDER BY created LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is not None:
+                db.execute(
+                    "UPDATE jobs SET status = 'running', lease_until = ?, updated = ? WHERE id = ?",
+                    (now + self.lease_seconds, now, row[0]),
+                )
+            return row
+
+        row = self._transaction(take)
+        return (row[0], row[1]) if row else None
+
+    def pending(self, job_id: str, limit: int) -> list[tuple[int, bytes]]:
+        """Next items of a job without a result, in order."""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT idx, data FROM job_items WHERE job_id = ? AND result IS NULL ORDER BY idx LIMIT ?",
+                (job_id, limit),
+            ).fetchall()
+        return [(idx, data) for idx, data in rows]
+
+    def save(self, job_id: str, results: list[tuple[int, dict]], frame_stats: dict) -> bool:
+        """
+        Store a chunk's results, add its frame counters and renew the lease. False once the job is cancelled,
+        unless this chunk was its last: a cancel that arrives while the last chunk runs leaves the job done.
+        """
+        now = time.time()
+
+        def update(db):
+            row = db.execute("SELECT frame_stats, cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return False
+            db.executemany(
+                "UPDATE job_items SET result = ?, data = NULL WHERE job_id = ? AND idx = ?",
+                [(json.dumps(result, ensure_ascii=False), job_id, idx) for idx, result in results],
+            )
+            stats = json.loads(row[0])
+            for k, v in frame_stats.items():
+                stats[k] = stats.get(k, 0) + v
+            db.execute(
+                "UPDATE jobs SET completed = completed + ?, frame_stats = ?, lease_until = ?, updated = ? WHERE id = ?",
+                (len(results), json.dumps(stats), now + self.lease_seconds, now, job_id),
+            )
+            if not row[1]:
+                return True
+            return db.execute("SELECT 1 FROM job_items WHERE job_id = ? AND result IS NULL LIMIT 1", (job_id,)).fetchone() is None
+
+        return self._transaction(update)
+
+    def renew(self, job_id: str, seconds: Optional[float] = None) -> None:
+        """Extend the lease by seconds (default lease_seconds); 0 releases the job for any worker to resume."""
+        seconds = self.lease_seconds if seconds is None else seconds
+        until = time.time() + seconds if seconds > 0 else 0
+        with self._lock:
+            self._db().execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running'", (until, job_id))
+
+    def finish(self, job_id: str, status: str, error: str = "") -> None:
+        now = time.time()
+
+        def update(db):
+            db.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_until = 0, updated = ? WHERE id = ?",
+                (status, error or None, now, job_id),
+            )
+            db.execute("UPDATE job_items SET data = NULL WHERE job_id = ?", (job_id,))
+
+        self._transaction(update)
+
+    def purge(self) -> int:
+        """Delete finished jobs older than OCR_JOB_TTL_HOURS; returns how many were deleted."""
+        cutoff = time.time() - self.ttl_seconds
+
+        def delete(db):
+            placeholders = ",".join("?" * len(FINISHED))
+            ids = [r[0] for r in db.execute(
+                f"SELECT id FROM jobs WHERE status IN ({placeholders}) AND updated < ?", (*FINISHED, cutoff)
+            )]
+            for job_id in ids:
+                db.execute("DELETE FROM job_items WHERE job_id = ?", (job_id,))
+                db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            return len(ids)
+
+        return self._transaction(delete)
+
+    def counts(self) -> dict:
+        """Number of jobs per status (for /health)."""
+        with self._lock:
+            return dict(self._db().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def error_result(e: Exception) -> dict:
+    """Result entry of an item that could not be read (same shape as in /ocr/extract-exam-batch)."""
+    return {"error": "OCR failed", "detail": str(e)}
+
+
+class JobRunner:
+    """OCR_JOB_WORKERS asyncio tasks that claim jobs from the store and read them chunk by chunk."""
+
+    def __init__(self, store: JobStore, run_chunk: ChunkRunner, workers: int = JOB_WORKERS, chunk: int = JOB_CHUNK):
+        self.store = store
+        self.run_chunk = run_chunk
+        self.workers = workers
+        self.chunk = max(1, chunk)
+        self._tasks: list[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._next_purge = 0.0  # time.monotonic() of the next purge
+
+    def start(self) -> None:
+        if self._tasks or self.workers <= 0:
+            return
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work(), name=f"ocr-job-{i}") for i in range(self.workers)]
+
+    def notify(self) -> None:
+        """A job was submitted: wake an idle worker instead of waiting for the next poll."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _store_call(self, operation: str, fn: Callable, *args):
+        """fn(*args) in a thread; a failure (e.g. "database is locked") is logged and counted, and returns None."""
+        try:
+            return await asyncio.to_thread(fn, *args)
+        except Exception as e:
+            store_errors.inc(operation=operation)
+            logger.warning("OCR jobs: %s failed: %s", operation, e)
+            return None
+
+    async def _purge(self) -> None:
+        """Delete expired jobs, at most once per OCR_JOB_PURGE_SECONDS (capped at the TTL) across this runner's workers."""
+        now = time.monotonic()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + min(JOB_PURGE_SECONDS, self.store.ttl_seconds)
+        await self._store_call("purge", self.store.purge)
+
+    async def _work(self) -> None:
+        while True:
+            claimed = await self._store_call("claim", self.store.claim)
+            if claimed is None:
+                await self._purge()
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            job_id, engine = claimed
+            lease = asyncio.create_task(self._keep_lease(job_id))
+            try:
+                status = await self._run(job_id, engine)
+            except asyncio.CancelledError:
+                # Shutting down: release the lease so the next worker resumes the job right away
+                # (if this fails the job is resumed once the lease expires)
+                await self._store_call("release", self.store.renew, job_id, 0)
+                raise
+            except sqlite3.Error as e:
+                # The store, not the job, failed (e.g. "database is locked"): leave it to be resumed
+                store_errors.inc(operation="chunk")
+                logger.warning("OCR jobs: job %s interrupted by the job store: %s", job_id, e)
+                await self._store_call("release", self.store.renew, job_id, 0)
+                await asyncio.sleep(JOB_POLL_SECONDS)
+                continue
+            except Exception as e:
+                status, error = "failed", str(e)
+            else:
+                error = ""
+            finally:
+                lease.cancel()
+            # If this fails the lease runs out and the job is claimed again: resumed from its first unread item,
+            # or finished at once when none is left
+            await self._store_call("finish", self.store.finish, job_id, status, error)
+
+    async def _keep_lease(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.store.lease_seconds / 3)
+            await self._store_call("renew", self.store.renew, job_id)
+
+    async def _run(self, job_id: str, engine: str) -> str:
+        while True:
+            items = await asyncio.to_thread(self.store.pending, job_id, self.chunk)
+            if not items:
+                return "done"
+            try:
+                results, frame_stats = await self.run_chunk(engine, items)
+            except JobRetry as e:
+                await asyncio.sleep(e.retry_after)
+                continue
+            if not await asyncio.to_thread(self.store.save, job_id, results, frame_stats):
+                return "cancelled"
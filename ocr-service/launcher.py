@@ -0,0 +1,101 @@
+"""
+Multi-process launcher: loads the OCR engine's models (OCR_ENGINE) once, then forks OCR_SERVER_WORKERS
+uvicorn workers sharing one listening socket. Weights loaded before the fork are shared copy-on-write between
+the workers, so scaling out on one machine does not multiply the model's resident memory.
+
+    OCR_SERVER_WORKERS=4 python launcher.py
+
+Each worker runs its own warmup inference at startup (GET /ready turns 200 once it has): the parent only
+loads the weights, because torch's inference thread pool does not survive fork. Workers that exit are
+restarted; SIGTERM / SIGINT stop all of them. Needs os.fork (Linux, macOS) and OCR_POOL_MODE=thread.
+"""
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+SERVER_WORKERS = int(os.environ.get("OCR_SERVER_WORKERS", "2"))
+HOST = os.environ.get("OCR_HOST", "0.0.0.0")
+PORT = int(os.environ.get("OCR_PORT", "8000"))
+RESTART_DELAY_SECONDS = 1.0  # pause before replacing a worker that exited, so a crash loop does not spin
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _spawn(sock: socket.socket, app) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+    code = 0
+    try:
+        import uvicorn
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        uvicorn.Server(uvicorn.Config(app)).run(sockets=[sock])
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        os._exit(code)
+
+
+def run() -> None:
+    if not hasattr(os, "fork"):
+        sys.exit("launcher.py needs os.fork; on Windows run python main.py")
+    import main as service
+    if service.ocr_pool.mode != "thread":
+        sys.exit("launcher.py forks the workers itself: use OCR_POOL_MODE=thread")
+
+    service.get_reader()  # load the weights once, before forking
+    service.OCR_PRELOAD = True  # each worker warms up at startup
+    # Move everything allocated so far out of the collector's reach: a collection in a worker would
+    # otherwise write to (and so copy) every page holding a pre-fork object.
+    gc.collect()
+    gc.freeze()
+
+    sock = _bind(HOST, PORT)
+    print(f"OCR launcher: {SERVER_WORKERS} workers on http://{HOST}:{PORT}", flush=True)
+    workers: set[int] = set()
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while True:
+        while not stopping and len(workers) < SERVER_WORKERS:
+            workers.add(_spawn(sock, service.app))
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        workers.discard(pid)
+        if stopping:
+            if not workers:
+                break
+            continue
+        print(f"OCR launcher: worker {pid} exited ({os.waitstatus_to_exitcode(status)}), restarting", flush=True)
+        time.sleep(RESTART_DELAY_SECONDS)
+    sock.close()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,247 @@
+"""
+Per-machine overlay layout profiles: the screen rectangles where a scanner draws its patient header and
+measurement table, so only those crops go through the reader instead of the whole ultrasound frame.
+
+A profile is a JSON file in OCR_LAYOUT_DIR:
+    {"name": "samsung-medison-hm70a", "manufacturer": "SAMSUNG MEDISON CO., LTD.", "model": "HM70A",
+     "size": [640, 576], "regions": [[x0, y0, x1, y1], ...], "header_tokens": ["HM70A"]}
+
+Profiles are chosen by machine: from DICOM Manufacturer / ManufacturerModelName, else (plain images of the
+same size) from a quick read of the top band for the profile's header_tokens. Size alone never picks a
+machine's profile; only a hand-written profile without model and header_tokens applies to every image of its
+size. The service uses them on the exam and DICOM paths only (patient forms have their own layout).
+
+With OCR_LAYOUT_LEARN=1 every frame is read in full and the text boxes are merged into the machine's profile:
+created from DICOM tags, and extended from plain images whose top band carries a known profile's header_tokens
+(other plain images are not learned). Several processes may learn at once: each update re-reads the profile
+under a file lock and replaces the file atomically.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: the thread lock still serializes a single process
+    fcntl = None
+
+LAYOUT_DIR = os.environ.get("OCR_LAYOUT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "layouts"))
+LAYOUTS_ENABLED = os.environ.get("OCR_LAYOUTS", "1") not in ("0", "false", "no")
+LAYOUT_LEARN = os.environ.get("OCR_LAYOUT_LEARN", "0") in ("1", "true", "yes")
+LAYOUT_PADDING = int(os.environ.get("OCR_LAYOUT_PADDING", "12"))  # pixels added around learned boxes
+HEADER_BAND = 0.12  # top share of the frame read to identify the machine when the size is ambiguous
+
+
+def _slug(*parts: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", " ".join(p for p in parts if p).lower()).strip("-") or "unknown"
+
+
+def _box_rect(box) -> list[int]:
+    xs = [p[0] for p in box]
+    ys = [p[1] for p in box]
+    return [int(min(xs)), int(min(ys)), int(max(xs)), int(max(ys))]
+
+
+def merge_rects(rects: list[list[int]], padding: int, width: int, height: int) -> list[list[int]]:
+    """Pad rectangles, then union every overlapping pair until none overlap (text lines -> text areas)."""
+    merged = [
+        [max(0, x0 - padding), max(0, y0 - padding), min(width, x1 + padding), min(height, y1 + padding)]
+        for x0, y0, x1, y1 in rects
+    ]
+    changed = True
+    while changed:
+        changed = False
+        out: list[list[int]] = []
+        for r in merged:
+            for o in out:
+                if r[0] <= o[2] and o[0] <= r[2] and r[1] <= o[3] and o[1] <= r[3]:
+                    o[:] = [min(o[0], r[0]), min(o[1], r[1]), max(o[2], r[2]), max(o[3], r[3])]
+                    changed = True
+                    break
+            else:
+                out.append(list(r))
+        merged = out
+    return sorted(merged, key=lambda r: (r[1], r[0]))
+
+
+class LayoutProfile:
+    def __init__(self, data: dict):
+        self.name = data["name"]
+        self.manufacturer = data.get("manufacturer", "")
+        self.model = data.get("model", "")
+        self.size = tuple(data["size"]) if data.get("size") else None
+        self.regions = [list(map(int, r)) for r in data.get("regions", [])]
+        self.header_tokens = [t.upper() for t in data.get("header_tokens", [])]
+        self.learned_frames = int(data.get("learned_frames", 0))
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "manufacturer": self.manufacturer,
+            "model": self.model,
+            "size": list(self.size) if self.size else None,
+            "regions": self.regions,
+            "header_tokens": self.header_tokens,
+            "learned_frames": self.learned_frames,
+        }
+
+    def matches_machine(self, manufacturer: str, model: str) -> bool:
+        if not self.model or not model:
+            return False
+        return self.model.lower() == model.lower() and (
+            not self.manufacturer or not manufacturer or self.manufacturer.lower() in manufacturer.lower()
+            or manufacturer.lower() in self.manufacturer.lower()
+        )
+
+    def fits(self, width: int, height: int) -> bool:
+        """Same size, or same aspect ratio (regions are then scaled)."""
+        if not self.size:
+            return True
+        pw, ph = self.size
+        return abs(pw * height - ph * width) <= max(pw, ph)
+
+    def crops(self, width: int, height: int) -> list[tuple[int, int, int, int]]:
+        """Regions scaled to a width x height frame and clipped to it."""
+        sx, sy = (width / self.size[0], height / self.size[1]) if self.size else (1.0, 1.0)
+        out = []
+        for x0, y0, x1, y1 in self.regions:
+            r = (max(0, int(x0 * sx)), max(0, int(y0 * sy)), min(width, int(round(x1 * sx))), min(height, int(round(y1 * sy))))
+            if r[2] > r[0] and r[3] > r[1]:
+                out.append(r)
+        return out
+
+
+class LayoutStore:
+    def __init__(self, directory: str = LAYOUT_DIR, enabled: bool = LAYOUTS_ENABLED, learn: bool = LAYOUT_LEARN):
+        self.directory = directory
+        self.enabled = enabled
+        self.learn = learn
+        self._lock = threading.Lock()
+        self.profiles: dict[str, LayoutProfile] = {}
+        self.reload()
+
+    def reload(self) -> None:
+        profiles = {}
+        if self.enabled and os.path.isdir(self.directory):
+            for name in sorted(os.listdir(self.directory)):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                        profile = LayoutProfile(json.load(f))
+                except (OSError, ValueError, KeyError, TypeError):
+                    continue
+                profiles[profile.name] = profile
+        with self._lock:
+            self.profiles = profiles
+
+    def cache_variant(self) -> str:
+        """Tag for OCR cache keys: results depend on which crops were read."""
+        if not self.enabled or self.learn or not self.profiles:
+            return ""
+        data = json.dumps([p.to_dict() for p in self.profiles.values()], sort_keys=True)
+        return "layout-" + hashlib.sha1(data.encode("utf-8")).hexdigest()[:12]
+
+    def select(
+        self,
+        width: int,
+        height: int,
+        manufacturer: str = "",
+        model: str = "",
+        read_header: Optional[Callable[[], str]] = None,
+    ) -> Optional[LayoutProfile]:
+        """Profile for a frame: by DICOM machine tags, else a same-size profile whose header_tokens are in the top band."""
+        if not self.enabled or self.learn:
+            return None
+        with self._lock:
+            profiles = [p for p in self.profiles.values() if p.regions and p.fits(width, height)]
+        by_machine = [p for p in profiles if p.matches_machine(manufacturer, model)]
+        if by_machine:
+            return by_machine[0]
+        if model:
+            return None  # a known machine without a profile: read the full frame
+        candidates = [p for p in profiles if p.size and tuple(p.size) == (width, height)]
+        tagged = [p for p in candidates if p.header_tokens]
+        if tagged and read_header is not None:
+            header = read_header().upper()
+            for p in tagged:
+                if all(t in header for t in p.header_tokens):
+                    return p
+        untagged = [p for p in candidates if not p.model and not p.header_tokens]
+        return untagged[0] if len(untagged) == 1 else None
+
+    def record(self, manufacturer: str, model: str, width: int, height: int, results: list) -> Optional[LayoutProfile]:
+        """
+        Learning mode: merge the text boxes of a full-frame read into the machine's profile and save it.
+        Frames without machine tags (plain images) extend the profile whose header_tokens their top band shows.
+        """
+        if not self.learn or not results:
+            return None
+        header_limit = HEADER_BAND * height
+        header = [r[1] for r in results if _box_rect(r[0])[3] <= header_limit]
+        if model:
+            name = _slug(manufacturer, model)
+        else:
+            known = self._by_header(width, height, " ".join(header).upper())
+            if known is None:
+                return None  # size alone does not tell which machine drew it
+            name, manufacturer, model = known.name, known.manufacturer, known.model
+        with self._lock, self._file_lock():
+            profile = self._load(name) or self.profiles.get(name) or LayoutProfile(
+                {"name": name, "manufacturer": manufacturer, "model": model, "size": [width, height]}
+            )
+            sx, sy = (profile.size[0] / width, profile.size[1] / height) if profile.size else (1.0, 1.0)
+            rects = [[int(x0 * sx), int(y0 * sy), int(x1 * sx), int(y1 * sy)] for x0, y0, x1, y1 in (_box_rect(r[0]) for r in results)]
+            pw, ph = profile.size or (width, height)
+            profile.regions = merge_rects(profile.regions + rects, LAYOUT_PADDING, pw, ph)
+            tokens = {t.upper() for text in header for t in re.findall(r"[A-Za-z0-9]{3,}", text)}
+            machine = f"{manufacturer} {model}".upper()
+            profile.header_tokens = sorted(set(profile.header_tokens) | {t for t in tokens if t in machine})
+            profile.learned_frames += 1
+            self.profiles[name] = profile
+            self._save(profile)
+        return profile
+
+    def _by_header(self, width: int, height: int, header: str) -> Optional[LayoutProfile]:
+        with self._lock:
+            for p in self.profiles.values():
+                if p.model and p.header_tokens and p.fits(width, height) and all(t in header for t in p.header_tokens):
+                    return p
+        return None
+
+    @contextmanager
+    def _file_lock(self):
+        """Serializes profile updates across processes (fork workers, process pool) learning into one directory."""
+        os.makedirs(self.directory, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, ".lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load(self, name: str) -> Optional[LayoutProfile]:
+        """The profile as saved on disk (another process may have extended it since reload)."""
+        try:
+            with open(os.path.join(self.directory, name + ".json"), "r", encoding="utf-8") as f:
+                return LayoutProfile(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _save(self, profile: LayoutProfile) -> None:
+        # Temp file + rename: a reader (or a crash) never sees a half-written profile
+        path = os.path.join(self.directory, profile.name + ".json")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(profile.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
+
+
+layout_store = LayoutStore()
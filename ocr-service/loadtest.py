@@ -0,0 +1,434 @@
+"""
+HTTP load test of the OCR service through a local stand-in for the Supabase Edge Functions (edge_proxy.py), to size
+OCR_WORKERS / OCR_MAX_PENDING and find memory growth before it reaches production.
+
+    python loadtest.py --concurrency 4 --duration 60                       # closed loop: 4 clients back to back
+    python loadtest.py --rate 2 --concurrency 32 --duration 3600           # soak: Poisson arrivals at 2 req/s
+    python loadtest.py --mix extract-ocr=1,extract-exam=3,extract-exam-raw=1 --direct
+
+The OCR service must already be running (--service). Unless --direct or --proxy is given, the stand-in proxy is
+started on a free port and every request goes through it, as the app's uploads do. --mix weights the routes:
+
+  extract-ocr       extract-ocr function, JSON {image_base64}  -> /ocr/extract-json     (patient forms)
+  extract-exam      extract-exam function, JSON {image_base64} -> /ocr/extract-exam     (ultrasound frames)
+  extract-ocr-raw   extract-ocr function, raw image body       -> /ocr/extract-raw
+  extract-exam-raw  extract-exam function, raw image body      -> /ocr/extract-exam-raw
+
+Images are synthetic forms and exam frames at every synthetic.py resolution (or the files in --images). Each
+request gets a unique trailer after the image data, so every upload misses the OCR cache as a fresh photo would;
+--reuse-images sends the bytes unchanged to measure the cached path.
+
+Without --rate the test is closed loop: --concurrency clients each send their next request when the last one is
+answered (peak throughput). With --rate requests arrive as a Poisson process whatever the latency (an arrival
+finding --concurrency requests in flight is counted as "shed" and not sent), which shows queueing and 503s.
+Requests finishing in the first --warmup seconds are left out. The service must answer GET /ready first.
+
+The report (printed, and written to --out as JSON) has throughput, latency p50/p90/p95/p99/max of the 2xx
+answers, status counts, error and 503 rates per route and in total, the peak RSS the service reported for each
+request (X-OCR-Peak-RSS-MB), a timeline every --interval seconds, and the service's resident memory from
+GET /metrics: start, end, peak and the growth rate fitted over the run.
+"""
+import argparse
+import asyncio
+import base64
+import datetime
+import json
+import os
+import platform
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+from typing import Optional
+
+import synthetic
+from edge_proxy import EDGE_TIMEOUT, OCR_SERVICE_URL, HttpError, http_request
+from metrics import percentiles
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp", ".dcm")
+PERCENTILES = (50, 90, 95, 99)
+
+# Route -> (Edge Function, service endpoint when --direct, image kind, body style)
+ROUTES = {
+    "extract-ocr": ("extract-ocr", "/ocr/extract-json", "form", "json"),
+    "extract-exam": ("extract-exam", "/ocr/extract-exam", "exam", "json"),
+    "extract-ocr-raw": ("extract-ocr", "/ocr/extract-raw", "form", "raw"),
+    "extract-exam-raw": ("extract-exam", "/ocr/extract-exam-raw", "exam", "raw"),
+}
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    """"extract-ocr=3,extract-exam=1" -> {route: weight}; a route without =weight counts 1."""
+    mix = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ROUTES:
+            raise SystemExit(f"Unknown route {name!r} in --mix (routes: {', '.join(ROUTES)})")
+        mix[name] = float(weight) if weight.strip() else 1.0
+    if not mix or sum(mix.values()) <= 0:
+        raise SystemExit("--mix needs at least one route with a positive weight")
+    return mix
+
+
+def load_images(directory: Optional[str], seed: int, count: int, fmt: str) -> dict[str, list[bytes]]:
+    """Images per kind ("exam", "form"): every file in directory for both, else synthetic samples."""
+    if directory:
+        files = sorted(f for f in os.listdir(directory) if f.lower().endswith(IMAGE_EXTENSIONS))
+        if not files:
+            raise SystemExit(f"No images in {directory}")
+        images = []
+        for name in files:
+            with open(os.path.join(directory, name), "rb") as f:
+                images.append(f.read())
+        return {"exam": images, "form": images}
+    images: dict[str, list[bytes]] = {"exam": [], "form": []}
+    for sample in synthetic.samples(seed, count):
+        images[sample["kind"]].append(synthetic.render(sample, fmt))
+    return images
+
+
+def _is_dicom(data: bytes) -> bool:
+    return data[128:132] == b"DICM"
+
+
+def unique(image: bytes, n: int) -> bytes:
+    """image with a trailer decoders ignore, so its OCR cache key is new (DICOM files are sent unchanged)."""
+    return image if _is_dicom(image) else image + b"\0loadtest-" + str(n).encode()
+
+
+class Run:
+    """
+    Requests of one test: [(finished at, route, status, seconds, peak RSS MB or None)],
+    status an HTTP code, "timeout", "error" or "shed".
+    """
+
+    def __init__(self, args, target: str, direct: bool, images: dict[str, list[bytes]]):
+        self.args = args
+        self.target = target.rstrip("/")
+        self.direct = direct
+        self.images = images
+        self.rng = random.Random(args.seed)
+        self.mix = parse_mix(args.mix)
+        self.records: list[tuple[float, str, object, float, Optional[float]]] = []
+        self.memory: list[tuple[float, int]] = []
+        self.peak_memory = 0
+        self.inflight = 0
+        self.sent = 0
+        self.start = time.monotonic()
+
+    def now(self) -> float:
+        return time.monotonic() - self.start
+
+    def pick(self) -> tuple[str, bytes]:
+        route = self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        image = self.rng.choice(self.images[ROUTES[route][2]])
+        self.sent += 1
+        return route, image if self.args.reuse_images else unique(image, self.sent)
+
+    async def send(self, route: str, image: bytes) -> None:
+        function, endpoint, _, style = ROUTES[route]
+        url = self.target + (endpoint if self.direct else f"/functions/v1/{function}")
+        if style == "json":
+            body = json.dumps({"image_base64": base64.b64encode(image).decode("ascii")}).encode()
+            content_type = "application/json"
+        else:
+            body, content_type = image, "application/octet-stream"
+        self.inflight += 1
+        started = time.perf_counter()
+        peak_rss = None
+        try:
+            status, headers, _ = await http_request(url, body=body, headers={"Content-Type": content_type}, timeout=self.args.timeout)
+            peak_rss = float(headers["x-ocr-peak-rss-mb"]) if "x-ocr-peak-rss-mb" in headers else None
+        except asyncio.TimeoutError:
+            status = "timeout"
+        except HttpError:
+            status = "error"
+        finally:
+            self.inflight -= 1
+        self.records.append((self.now(), route, status, time.perf_counter() - started, peak_rss))
+
+    async def closed_loop(self, deadline: float) -> None:
+        async def client():
+            while self.now() < deadline:
+                await self.send(*self.pick())
+
+        await asyncio.gather(*(client() for _ in range(self.args.concurrency)))
+
+    async def open_loop(self, deadline: float) -> None:
+        tasks = set()
+        arrival = self.now()
+        while True:
+            arrival += self.rng.expovariate(self.args.rate)
+            if arrival >= deadline:
+                break
+            await asyncio.sleep(max(0.0, arrival - self.now()))
+            route, image = self.pick()
+            if self.inflight >= self.args.concurrency:
+                self.records.append((self.now(), route, "shed", 0.0, None))
+                continue
+            task = asyncio.ensure_future(self.send(route, image))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+
+    async def sample_memory(self) -> None:
+        """Service RSS from GET /metrics (the process_*resident_memory_bytes gauges)."""
+        try:
+            status, _, data = await http_request(self.args.service.rstrip("/") + "/metrics", method="GET", timeout=10)
+        except (asyncio.TimeoutError, HttpError):
+            return
+        if status != 200:
+            return
+        text = data.decode("utf-8", "replace")
+        current = re.search(r"^process_resident_memory_bytes (\S+)$", text, re.M)
+        peak = re.search(r"^process_peak_resident_memory_bytes (\S+)$", text, re.M)
+        if current:
+            self.memory.append((self.now(), int(float(current.group(1)))))
+        if peak:
+            self.peak_memory = max(self.peak_memory, int(float(peak.group(1))))
+
+    async def monitor(self, done: asyncio.Event) -> None:
+        while not done.is_set():
+            await self.sample_memory()
+            try:
+                await asyncio.wait_for(done.wait(), self.args.interval)
+            except asyncio.TimeoutError:
+                pass
+        await self.sample_memory()
+
+
+def summarize(records: list, seconds: float) -> dict:
+    """Throughput, latency of the 2xx answers, status counts and error rates of records spread over seconds."""
+    statuses: dict[str, int] = {}
+    for _, _, status, _, _ in records:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    ok = [elapsed for _, _, status, elapsed, _ in records if isinstance(status, int) and 200 <= status < 300]
+    peaks = sorted(rss for *_, rss in records if rss is not None)
+    sent = len(records) - statuses.get("shed", 0)
+    return {
+        "requests": len(records),
+        "ok": len(ok),
+        "throughputRps": round(len(ok) / seconds, 3) if seconds > 0 else 0.0,
+        **percentiles(ok, PERCENTILES),
+        "maxMs": round(max(ok) * 1000, 3) if ok else 0.0,
+        "status": dict(sorted(statuses.items())),
+        "errorRate": round((sent - len(ok)) / sent, 4) if sent else 0.0,
+        "rate503": round(statuses.get("503", 0) / sent, 4) if sent else 0.0,
+        "shedRate": round(statuses.get("shed", 0) / len(records), 4) if records else 0.0,
+        "peakRssMb": {
+            "p50": peaks[len(peaks) // 2], "p95": peaks[int(len(peaks) * 0.95)], "max": peaks[-1]
+        } if peaks else {},
+    }
+
+
+def memory_report(samples: list[tuple[float, int]], peak: int, warmup: float) -> dict:
+    """Start / end / peak RSS in MB and the least-squares growth rate after warmup, in MB per hour."""
+    if not samples:
+        return {}
+    mb = lambda value: round(value / 1024 / 1024, 1)
+    fitted = [(t, rss) for t, rss in samples if t >= warmup] or samples
+    slope = 0.0
+    if len(fitted) >= 2:
+        mean_t = sum(t for t, _ in fitted) / len(fitted)
+        mean_rss = sum(rss for _, rss in fitted) / len(fitted)
+        spread = sum((t - mean_t) ** 2 for t, _ in fitted)
+        if spread > 0:
+            slope = sum((t - mean_t) * (rss - mean_rss) for t, rss in fitted) / spread
+    return {
+        "startMb": mb(fitted[0][1]),
+        "endMb": mb(samples[-1][1]),
+        "peakMb": mb(max(peak, *(rss for _, rss in samples))),
+        "growthMb": mb(samples[-1][1] - fitted[0][1]),
+        "growthMbPerHour": round(slope * 3600 / 1024 / 1024, 1),
+    }
+
+
+def timeline(run: Run, interval: float, end: float) -> list[dict]:
+    points = []
+    t = 0.0
+    while t < end:
+        window = [r for r in run.records if t <= r[0] < t + interval]
+        rss = [value for at, value in run.memory if t <= at < t + interval]
+        summary = summarize(window, min(interval, end - t))
+        points.append({
+            "t": round(t, 1),
+            "requests": summary["requests"],
+            "throughputRps": summary["throughputRps"],
+            "p95Ms": summary["p95Ms"],
+            "errors": summary["requests"] - summary["ok"] - summary["status"].get("shed", 0),
+            "status503": summary["status"].get("503", 0),
+            "shed": summary["status"].get("shed", 0),
+            "rssMb": round(rss[-1] / 1024 / 1024, 1) if rss else None,
+        })
+        t += interval
+    return points
+
+
+async def wait_ready(service: str, timeout: float) -> dict:
+    """Poll GET /ready until the service has loaded its models; then its /health (pool settings)."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            status, _, _ = await http_request(service + "/ready", method="GET", timeout=10)
+        except (asyncio.TimeoutError, HttpError) as e:
+            status, detail = 0, str(e)
+        else:
+            detail = f"status {status}"
+        if status == 200:
+            break
+        if time.monotonic() > deadline:
+            raise SystemExit(f"OCR service at {service} not ready after {timeout:g}s ({detail})")
+        await asyncio.sleep(1)
+    return await health(service)
+
+
+async def health(service: str) -> dict:
+    try:
+        status, _, data = await http_request(service + "/health", method="GET", timeout=10)
+        return json.loads(data) if status == 200 else {}
+    except (asyncio.TimeoutError, HttpError, ValueError):
+        return {}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def start_proxy(service: str, timeout: float) -> tuple[subprocess.Popen, str]:
+    """edge_proxy.py in its own process (so it does not share this process's CPU) on a free port."""
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "edge_proxy.py"), "--port", str(port), "--service", service, "--timeout", str(timeout)]
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        if process.poll() is not None:
+            raise SystemExit("edge_proxy.py exited on startup")
+        try:
+            await http_request(url + "/docs", method="GET", timeout=1)
+            return process, url
+        except (asyncio.TimeoutError, HttpError):
+            await asyncio.sleep(0.1)
+    process.terminate()
+    raise SystemExit("edge_proxy.py did not start")
+
+
+async def run(args) -> dict:
+    service = args.service.rstrip("/")
+    images = load_images(args.images, args.seed, args.count, args.format)
+    service_health = await wait_ready(service, args.ready_timeout)
+    proxy = None
+    if args.direct:
+        target = service
+    elif args.proxy:
+        target = args.proxy
+    else:
+        proxy, target = await start_proxy(service, args.edge_timeout)
+    try:
+        test = Run(args, target, args.direct, images)
+        done = asyncio.Event()
+        monitor = asyncio.ensure_future(test.monitor(done))
+        deadline = args.warmup + args.duration
+        await (test.open_loop(deadline) if args.rate else test.closed_loop(deadline))
+        elapsed = test.now()
+        done.set()
+        await monitor
+    finally:
+        if proxy is not None:
+            proxy.terminate()
+            proxy.wait()
+
+    measured = [r for r in test.records if r[0] >= args.warmup]
+    seconds = max(elapsed - args.warmup, 1e-9)
+    routes = {route: summarize([r for r in measured if r[1] == route], seconds) for route in test.mix}
+    end_health = await health(service)
+    return {
+        "started": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "config": {
+            "mix": test.mix,
+            "mode": "open" if args.rate else "closed",
+            "rate": args.rate,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "via": "direct" if args.direct else ("proxy" if args.proxy else "edge_proxy.py"),
+            "images": args.images or f"synthetic seed={args.seed} count={args.count} {args.format}",
+            "reuseImages": args.reuse_images,
+            "timeout": args.timeout,
+        },
+        "client": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "service": {"url": service, "engine": service_health.get("engine"), "pool": end_health.get("pool")},
+        "seconds": round(seconds, 1),
+        "total": summarize(measured, seconds),
+        "routes": routes,
+        "memory": memory_report(test.memory, test.peak_memory, args.warmup),
+        "timeline": timeline(test, args.interval, elapsed),
+    }
+
+
+def print_report(report: dict) -> None:
+    config = report["config"]
+    load = f"{config['rate']:g} req/s, at most {config['concurrency']} in flight" if config["mode"] == "open" else f"{config['concurrency']} clients"
+    print(f"{config['mode']} loop, {load}, {report['seconds']:g}s measured via {config['via']}")
+    columns = ("requests", "throughputRps", "p50Ms", "p95Ms", "p99Ms", "maxMs", "errorRate", "rate503", "shedRate")
+    print(f"{'route':18}" + "".join(f"{c:>14}" for c in columns))
+    for name, summary in [*report["routes"].items(), ("total", report["total"])]:
+        print(f"{name:18}" + "".join(f"{summary[c]:>14}" for c in columns))
+    print("status: " + ", ".join(f"{k}={v}" for k, v in report["total"]["status"].items()))
+    peaks = report["total"]["peakRssMb"]
+    if peaks:
+        print(f"per-request peak RSS: p50 {peaks['p50']} MB, p95 {peaks['p95']} MB, max {peaks['max']} MB")
+    memory = report["memory"]
+    if memory:
+        print(
+            f"service RSS: {memory['startMb']} -> {memory['endMb']} MB (peak {memory['peakMb']} MB, "
+            f"{memory['growthMbPerHour']:+} MB/h)"
+        )
+    pool = report["service"]["pool"]
+    if pool:
+        print(f"pool: {pool['mode']} x{pool['workers']}, max pending {pool['maxPending']}, rejected {pool['rejected']}, timeouts {pool['timeouts']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--service", default=OCR_SERVICE_URL, help="OCR service base URL (default: OCR_SERVICE_URL)")
+    parser.add_argument("--proxy", help="base URL of a running Edge Function proxy (e.g. supabase functions serve)")
+    parser.add_argument("--direct", action="store_true", help="call the service endpoints without a proxy")
+    parser.add_argument("--edge-timeout", type=float, default=EDGE_TIMEOUT, help="stand-in proxy timeout before 504 (seconds)")
+    parser.add_argument("--mix", default="extract-ocr=1,extract-exam=1", help="route weights, e.g. extract-ocr=3,extract-exam=1")
+    parser.add_argument("--concurrency", type=int, default=4, help="clients (closed loop) or the in-flight cap (with --rate)")
+    parser.add_argument("--rate", type=float, default=0.0, help="Poisson arrivals per second (open loop)")
+    parser.add_argument("--duration", type=float, default=60.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds run before measuring")
+    parser.add_argument("--interval", type=float, default=10.0, help="timeline and memory sample interval (seconds)")
+    parser.add_argument("--timeout", type=float, help="client timeout per request (default: edge timeout + 30s)")
+    parser.add_argument("--images", help="directory of images to send instead of the synthetic corpus")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--count", type=int, default=2, help="synthetic images per kind and resolution")
+    parser.add_argument("--format", choices=("PNG", "JPEG"), default="JPEG", help="synthetic image format")
+    parser.add_argument("--reuse-images", action="store_true", help="send identical bytes (OCR cache hits after the first)")
+    parser.add_argument("--ready-timeout", type=float, default=300.0, help="seconds to wait for GET /ready")
+    parser.add_argument("--out", help="report path (default: bench-results/loadtest-<time>.json)")
+    args = parser.parse_args()
+    if args.timeout is None:
+        args.timeout = args.edge_timeout + 30
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    parse_mix(args.mix)
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    out = args.out or os.path.join(HERE, "bench-results", f"loadtest-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+    print(f"report: {out}")
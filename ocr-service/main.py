@@ -3,30 +3,141 @@ OCR service for Laudo Echo - extracts patient data from images (scanned forms, e
 Returns the same shape as DICOM metadata for auto-filling the patient form.
 """
 import re
+import asyncio
 import base64
-import io
-from typing import Optional
+import os
+import json
+import threading
+import time
+from typing import AsyncIterator, Callable, Optional
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Request
+from fastapi import Depends, FastAPI, File, UploadFile, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
+from starlette.routing import Match
 
-# Lazy load EasyOCR on first request to speed up startup
-_reader = None
+from dicom_input import DICOM_FRAMES, DICOM_PATIENT_FIELDS, DicomFile, DicomUnavailable, is_dicom
+from frame_dedup import block_signature, select_frames
+import adaptive_ocr
+from image_budget import ImageMemoryBusy, image_budget
+from jobs import FINISHED, JOB_MAX_ITEMS, JobRetry, JobRunner, JobStore, error_result
+from layouts import HEADER_BAND, layout_store
+import metrics
+from metrics import TimingMiddleware, stage, timed
+from ocr_cache import image_key, ocr_cache, to_plain_results
+import ocr_engines
+from ocr_engines import EngineUnavailable, UnknownEngine
+from ocr_pool import ClientDisconnected, DeadlineExceeded, OcrPool, PoolBusy, Schedule, current_schedule
+from ocr_result import OcrResult, TextBox
+from preprocess import ImageTooLarge, PreprocessOptions, decode_image, preprocess_array, preprocess_stats
 
-def get_reader():
-    global _reader
-    if _reader is None:
-        # Monkey patch PIL.Image.ANTIALIAS for Pillow 10+ compatibility (ANTIALIAS was removed)
-        from PIL import Image
-        if not hasattr(Image, "ANTIALIAS"):
-            Image.ANTIALIAS = Image.LANCZOS  # LANCZOS is the modern replacement
-        
-        import easyocr
-        _reader = easyocr.Reader(["pt", "en"], gpu=False)
-    return _reader
+# Batch extraction: recognizer batch size, images per pool job, and images per request
+OCR_RECOGNITION_BATCH_SIZE = int(os.environ.get("OCR_RECOGNITION_BATCH_SIZE", "16"))
+OCR_BATCH_CHUNK = int(os.environ.get("OCR_BATCH_CHUNK", "8"))
+OCR_BATCH_MAX_IMAGES = int(os.environ.get("OCR_BATCH_MAX_IMAGES", "64"))
+# Largest raw (octet-stream / chunked) upload accepted by the *-raw endpoints
+OCR_MAX_UPLOAD_MB = float(os.environ.get("OCR_MAX_UPLOAD_MB", "50"))
+# Text-only parsing: items per /parse/batch request, and items parsed per worker-thread hop
+OCR_PARSE_BATCH_MAX_ITEMS = int(os.environ.get("OCR_PARSE_BATCH_MAX_ITEMS", "5000"))
+OCR_PARSE_CHUNK = max(1, int(os.environ.get("OCR_PARSE_CHUNK", "250")))
 
+# Image preprocessing per endpoint (OCR_<OPTION>, overridden by OCR_PATIENT_<OPTION> / OCR_EXAM_<OPTION>)
+PREPROCESS_PATIENT = PreprocessOptions.from_env("PATIENT")  # /ocr/extract, /ocr/extract-json
+PREPROCESS_EXAM = PreprocessOptions.from_env("EXAM")  # /ocr/extract-exam, /ocr/extract-exam-batch
+
+# Pool lane of each endpoint (highest priority first in OCR_LANES); a request can pick another with X-OCR-Priority.
+# Lanes missing from OCR_LANES fall back to the lowest one.
+ENDPOINT_LANES = {
+    "/ocr/extract": "interactive",
+    "/ocr/extract-json": "interactive",
+    "/ocr/extract-raw": "interactive",
+    "/ocr/extract-exam": "exam",
+    "/ocr/extract-exam-raw": "exam",
+    "/ocr/extract-exam-batch": "batch",
+    "/ocr/extract-exam-stream": "batch",
+}
+
+# Load the OCR engine and run a warmup inference at startup (otherwise on the first request or GET /ready)
+OCR_PRELOAD = os.environ.get("OCR_PRELOAD", "0") in ("1", "true", "yes")
+
+
+def get_reader(engine: str = ""):
+    """OCR engine (ocr_engines; OCR_ENGINE when engine is empty), loaded lazily on first use to speed up startup."""
+    return ocr_engines.get_engine(engine)
+
+
+ocr_engines.resolve()  # fail at startup, not on the first request, when OCR_ENGINE names an unknown engine
+
+
+def warm_up() -> None:
+    """Load the reader and run one small inference so the first real request does not pay for either."""
+    import numpy as np
+    from PIL import Image, ImageDraw
+    img = Image.new("L", (320, 48), 0)
+    ImageDraw.Draw(img).text((8, 16), "LVIDd 3.21 cm 12/03/2024", fill=255)
+    get_reader().readtext(np.asarray(img))
+
+
+def _init_worker_process(budget_state: tuple) -> None:
+    """Process-mode worker initializer: draw on the service's image budget, then build and warm the reader."""
+    image_budget.attach(budget_state)
+    warm_up()
+
+
+# OCR runs on this pool, never on the event loop (in process mode each worker builds and warms its own reader)
+ocr_pool = OcrPool(initializer=_init_worker_process, initargs=(image_budget.shared(),))
+
+
+# Readiness for GET /ready: idle -> loading -> ready (or error)
+_readiness = {"state": "idle", "detail": ""}
+_readiness_lock = threading.Lock()
+
+
+def start_warmup() -> None:
+    """
+    Run warm_up on every pool worker in a background thread (no-op once started). A failed warmup is not retried:
+    /ready stays 503 with the error until the service is restarted.
+    """
+    with _readiness_lock:
+        if _readiness["state"] != "idle":
+            return
+        _readiness["state"] = "loading"
+
+    def run():
+        try:
+            ocr_pool.warm_up(warm_up)
+        except Exception as e:
+            with _readiness_lock:
+                _readiness.update(state="error", detail=str(e))
+            return
+        with _readiness_lock:
+            _readiness["state"] = "ready"
+
+    threading.Thread(target=run, name="ocr-warmup", daemon=True).start()
+
+async def schedule_request(request: Request) -> None:
+    """
+    Queue this request's OCR work (current_schedule): lane from the endpoint or the X-OCR-Priority header,
+    deadline from X-OCR-Deadline-Ms, and a disconnect check so queued work is dropped when the client leaves.
+    """
+    priority = request.headers.get("x-ocr-priority", "").strip().lower()
+    if priority and priority not in ocr_pool.lanes:
+        raise HTTPException(status_code=400, detail=f"Unknown priority {priority!r} (lanes: {', '.join(ocr_pool.lanes)})")
+    lane = priority or ENDPOINT_LANES.get(request.url.path, "")
+    deadline = None
+    budget = request.headers.get("x-ocr-deadline-ms", "")
+    if budget:
+        if not budget.isdigit() or int(budget) <= 0:
+            raise HTTPException(status_code=400, detail="X-OCR-Deadline-Ms must be a positive number of milliseconds")
+        deadline = time.monotonic() + int(budget) / 1000
+    # The streamed endpoint is cancelled by Starlette itself when its client disconnects
+    disconnected = None if request.url.path == "/ocr/extract-exam-stream" else request.is_disconnected
+    current_schedule.set(Schedule(lane, deadline, disconnected))
+
+
+# Only the OCR routes queue work on the pool: /health, /ready, /metrics and /parse ignore the scheduling headers
+OCR_ROUTE_DEPENDENCIES = [Depends(schedule_request)]
 
 app = FastAPI(title="Laudo Echo OCR", version="1.0.0")
 
@@ -36,9 +147,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-OCR-Peak-RSS-MB"],
 )
 
 
+def _endpoint_label(scope: dict) -> str:
+    """Route template of a request for the request metrics ("other" for unknown paths, to bound the series)."""
+    for route in app.router.routes:
+        if route.matches(scope)[0] == Match.FULL:
+            return route.path
+    return "other"
+
+
+# Request counts, durations and the Server-Timing header (metrics.py); outermost so it sees the CORS headers too
+app.add_middleware(TimingMiddleware, endpoint=_endpoint_label)
+
+
 @app.exception_handler(Exception)
 async def unhandled_exception_handler(request: Request, exc: Exception):
     """Ensure all unhandled errors return JSON (no HTML traceback) for the Edge Function."""
@@ -62,11 +186,37 @@ class OcrResponse(BaseModel):
     peso: str = ""
 
 
+PATIENT_FIELDS = tuple(OcrResponse.__annotations__)
+
+
 class OcrJsonRequest(BaseModel):
     image_base64: Optional[str] = None
     image: Optional[str] = None  # alias for image_base64
+    engine: Optional[str] = None  # OCR engine (easyocr, onnx, tesseract); OCR_ENGINE when omitted
 
 
+class OcrBatchRequest(BaseModel):
+    images: list[str]  # base64 images, in frame order
+    engine: Optional[str] = None
+
+
+class JobRequest(BaseModel):
+    images: list[str]  # base64 images or DICOM files, in frame order
+    engine: Optional[str] = None
+
+
+class ParseRequest(BaseModel):
+    text: Optional[str] = None  # OCR text, as run_ocr returns it
+    results: Optional[list] = None  # or stored OCR results [[box, text, confidence], ...] (lets parsers use the boxes)
+    id: Optional[str] = None  # echoed back by /parse/batch
+
+
+class ParseBatchRequest(BaseModel):
+    items: list[ParseRequest]
+    kind: str = "exam"  # exam (/parse/exam responses) or patient (/parse/patient responses)
+
+
+@timed("parse_patient_data")
 def parse_patient_data(text: str) -> dict:
     """Extract patient information from OCR text (Portuguese forms or ultrasound header)."""
     if not text or not text.strip():
@@ -207,139 +357,314 @@ def _normalize_number(s: str) -> str:
     return s.replace(",", ".").replace(" ", ".").strip()
 
 
+# Label lists for parse_echo_measurements (machine labels from Philips/GE etc. and Portuguese report labels).
+# Order matters: earlier labels win, and each label tries the number patterns in _NUMBER_AFTER_LABEL_PATTERNS order.
+_LABELS_DVED_D = [
+    "LVIDd", "LVID d", "VED", "VEd", "DVED", "ventrículo esquerdo diástole", "LVEDd", "VEDd",
+    "Left Ventricular Internal Dimension in diastole",
+]
+_LABELS_DVED_S = [
+    "LVIDs", "LVID s", "VES", "VEs", "DVES", "ventrículo esquerdo sístole", "LVEDs", "VEDs",
+    "Left Ventricular Internal Dimension in systole",
+]
+_LABELS_SIVD = ["IVSd", "IVS d", "IVS d", "SIVd", "septo interventricular diástole", "I VSd"]
+_LABELS_SIVS = ["IVSs", "IVS s", "SIVs", "septo interventricular sístole", "I VSs"]
+_LABELS_PLVD = [
+    "LVPWd", "PLVEd", "PLVED", "parede livre diástole", "LVFWd", "PWVd",
+    "Left Ventricular Posterior Wall thickness in diastole",
+]
+_LABELS_PLVS = [
+    "LVPWs", "PLVEs", "PLVES", "parede livre sístole", "LVFWs", "PWVs",
+    "Left Ventricular Posterior Wall thickness in systole",
+]
+_LABELS_AE = [
+    "Atrial Area", "Atrial Length", "Atrial Volume", "atrio esquerdo", "AE",
+    "átrio esquerdo", "LA", "left atrium", "LA A4Cs",
+]
+_LABELS_AO = ["Ao", "aorta", "aortic", "AO"]
+_LABELS_FS = [
+    "FS (MM-Teich)", "FS(MM-Teich)", "FS", "fração encurtamento",
+    "fração de encurtamento", "shortening fraction", "Fractional Shortening",
+]
+_LABELS_FE = [
+    "EF (MM-Teich)", "EF(MM-Teich)", "FE", "fração de ejeção", "fração ejection",
+    "ejection fraction", "FE Teicholz", "FET", "Ejection Fraction",
+]
+
+# Função diastólica: E, A, E/A, TRIV, etc.
+_LABELS_E = ["onda E", "E wave", "E:", "E =", "velocidade E"]
+_LABELS_A = ["onda A", "A wave", "A:", "A =", "velocidade A"]
+_LABELS_TRIV = ["TRIV", "TRI V", "tempo relaxamento"]
+_LABELS_DT = ["DT", "tempo desaceleração", "deceleration time"]
+
+# Função sistólica: EPSS, MAPSE, Simpson
+_LABELS_EPSS = ["EPSS", "epss", "E-point septal separation"]
+_LABELS_MAPSE = ["MAPSE", "mapse", "mitral annular plane"]
+_LABELS_SIMPSON = ["EF (Simpson)", "EF(Simpson)", "Simpson", "FE Simpson", "fração de ejeção Simpson"]
+
+# Ventrículo direito: TAPSE, FAC, TDI S', RAP (atrio direito)
+_LABELS_TAPSE = ["TAPSE", "tapse"]
+_LABELS_FAC = ["FAC", "fractional area change"]
+_LABELS_TDIS = ["TDI S'", "TDI S", "S'", "s prime"]
+_LABELS_RAP_MAX = ["RAP M max", "Dist. RAP M max", "RAP max", "Dist RAP M max"]
+_LABELS_RAP_MIN = ["RAP M min", "Dist. RAP M min", "RAP min"]
+_LABELS_AD = ["atrio direito", "atrium right", "AD"]
+
+# TDI septal/livre: e', a', S
+_LABELS_EPRIME = ["e'", "e prime", "e’", "Em"]
+_LABELS_APRIME = ["a'", "a prime", "a’", "Am"]
+_LABELS_TDI_SEPTAL_E = ["septal " + l for l in _LABELS_EPRIME] + ["septal e'"]
+_LABELS_TDI_SEPTAL_A = ["septal " + l for l in _LABELS_APRIME]
+_LABELS_TDI_SEPTAL_S = ["septal S'", "septal S"]
+_LABELS_TDI_LIVRE_E = ["livre " + l for l in _LABELS_EPRIME] + ["free wall e'", "parede livre e'"]
+_LABELS_TDI_LIVRE_A = ["livre " + l for l in _LABELS_APRIME]
+_LABELS_TDI_LIVRE_S = ["livre S'", "free wall S'"]
+
+# Doppler valvas: velocidades (cm/s) e gradientes (mmHg) - machine labels
+_LABELS_MITRAL_VEL = ["* Vel", "MV Vmax", "mitral Vmax", "mitral", "MV", "valva mitral", "+ Vel"]
+_LABELS_TRICUSPIDE_VEL = ["TV Vmax", "tricúspide", "tricuspide", "TV", "valva tricúspide"]
+_LABELS_PULMONAR_VEL = ["+ PV Vmax", "PV Vmax", "Vmax", "pulmonar", "PV", "valva pulmonar"]
+_LABELS_AORTICA_VEL = ["x2 + Vel", "+ Vel", "AV Vmax", "aórtica", "aortica", "AV", "valva aórtica"]
+_LABELS_PULMONAR_GRAD = ["Max PG", "PV Vmax", "PV"]
+
+_ECHO_LABEL_SETS = (
+    _LABELS_DVED_D, _LABELS_DVED_S, _LABELS_SIVD, _LABELS_SIVS, _LABELS_PLVD, _LABELS_PLVS,
+    _LABELS_AE, _LABELS_AO, _LABELS_FS, _LABELS_FE,
+    _LABELS_E, _LABELS_A, _LABELS_TRIV, _LABELS_DT,
+    _LABELS_EPSS, _LABELS_MAPSE, _LABELS_SIMPSON,
+    _LABELS_TAPSE, _LABELS_FAC, _LABELS_TDIS, _LABELS_RAP_MAX, _LABELS_RAP_MIN, _LABELS_AD,
+    _LABELS_TDI_SEPTAL_E, _LABELS_TDI_SEPTAL_A, _LABELS_TDI_SEPTAL_S,
+    _LABELS_TDI_LIVRE_E, _LABELS_TDI_LIVRE_A, _LABELS_TDI_LIVRE_S,
+    _LABELS_MITRAL_VEL, _LABELS_TRICUSPIDE_VEL, _LABELS_PULMONAR_VEL, _LABELS_AORTICA_VEL,
+    _LABELS_PULMONAR_GRAD,
+)
+
+# Number after a label: optional spaces/:= then number (allow space as decimal separator).
+# Tried in order per label: digit.digit then digit digit (OCR often drops decimal point) then plain digits.
+_NUMBER_AFTER_LABEL_PATTERNS = [
+    re.compile(r"[\s:=\-]*(\d+[,\.]\d*)"),  # 0.409, 2,01
+    re.compile(r"[\s:=\-]*(\d+[\s,\.]\d+)"),  # 0 409, 1 . 31
+    re.compile(r"[\s:=\-]*(\d+[,\.]?\d*)"),  # 38, 38.8
+]
+
+
+def _trie_regex(node: dict) -> str:
+    """Build a regex alternation from a character trie; longer labels are tried before their prefixes."""
+    alternatives = [re.escape(ch) + _trie_regex(child) for ch, child in sorted(node.items()) if ch]
+    if not alternatives:
+        return ""
+    if len(alternatives) == 1 and "" not in node:
+        return alternatives[0]
+    return "(?:" + "|".join(alternatives) + ")" + ("?" if "" in node else "")
+
+
+class _LabelMatcher:
+    """
+    Precompiled index over a fixed set of labels.
+    scan() walks the text once and records, for every label, the first number found after it
+    by each of the _NUMBER_AFTER_LABEL_PATTERNS, so fields resolve by label priority without rescanning.
+    """
+
+    def __init__(self, labels):
+        self.keys = {}
+        trie: dict = {}
+        for label in labels:
+            key = label.lower()
+            self.keys[label] = key
+            node = trie
+            for ch in key:
+                node = node.setdefault(ch, {})
+            node[""] = {}
+        # Every label found at a position is a prefix of the longest label found there.
+        unique = set(self.keys.values())
+        self._prefixes = {
+            key: sorted((k for k in unique if key.startswith(k)), key=len) for key in unique
+        }
+        self._scanner = re.compile("(?=(" + _trie_regex(trie) + "))", re.IGNORECASE)
+
+    def _key_for(self, matched: str) -> Optional[str]:
+        key = matched.lower()
+        if key in self._prefixes:
+            return key
+        # Case mapping that changes length (rare in OCR output): compare the regex way.
+        for k in self._prefixes:
+            if re.fullmatch(re.escape(k), matched, re.IGNORECASE):
+                return k
+        return None
+
+    def is_label(self, text: str) -> bool:
+        """True when text is one of the labels by itself (ignoring case and trailing separators)."""
+        return text.strip().rstrip(":=- ").lower() in self._prefixes
+
+    def scan(self, text: str) -> "_LabelHits":
+        """Single pass over text; newlines are treated as spaces (labels may wrap in OCR output)."""
+        hits: dict[str, list] = {}
+        if not text or not text.strip():
+            return _LabelHits(self, hits)
+        self._scan_into(hits, text.replace("\n", " "))
+        return _LabelHits(self, hits)
+
+    def scan_boxes(self, ocr: OcrResult) -> "_LabelHits":
+        """
+        Labels found inside each text box. A label with no number after it in its own box takes the value box
+        to its right on the same row, else the one below it (OcrResult.value_for), never text from other rows.
+        """
+        hits: dict[str, list] = {}
+        for box in ocr.boxes:
+            self._scan_into(hits, box.text.replace("\n", " "), lambda: ocr.value_for(box))
+        return _LabelHits(self, hits)
+
+    def _scan_into(self, hits: dict, text: str, neighbour: Optional[Callable[[], Optional[TextBox]]] = None) -> None:
+        numbers_at: dict[int, list] = {}
+        for m in self._scanner.finditer(text):
+            longest = self._key_for(m.group(1))
+            if longest is None:
+                continue
+            start = m.start()
+            for key in self._prefixes[longest]:
+                slots = hits.setdefault(key, [None, None, None])
+                if all(slots):
+                    continue
+                end = start + len(key)
+                numbers = numbers_at.get(end)
+                if numbers is None:
+                    numbers = _numbers_after(text, end)
+                    if neighbour is not None and not any(numbers) and not re.search(r"\d", text[end:]):
+                        value_box = neighbour()
+                        if value_box is not None:
+                            numbers = _numbers_after(value_box.text, 0)
+                    numbers_at[end] = numbers
+                for i, value in enumerate(numbers):
+                    if value and slots[i] is None:
+                        slots[i] = value
+
+
+def _numbers_after(text: str, pos: int) -> list:
+    """The number each of _NUMBER_AFTER_LABEL_PATTERNS finds at text[pos:] (None where it finds none)."""
+    numbers = []
+    for pattern in _NUMBER_AFTER_LABEL_PATTERNS:
+        nm = pattern.match(text, pos)
+        numbers.append(nm.group(1) if nm else None)
+    return numbers
+
+
+class _LabelHits:
+    """Result of _LabelMatcher.scan(): resolves a field from its ordered label list."""
+
+    def __init__(self, matcher: _LabelMatcher, hits: dict, fallback: Optional["_LabelHits"] = None):
+        self._matcher = matcher
+        self._hits = hits
+        self._fallback = fallback
+
+    def first(self, labels: list[str]) -> str:
+        """
+        Return the number after the first matching label (label order first, then number pattern order).
+        Only fields none of whose labels these hits found at all are looked up in the fallback hits: a label
+        found without a value stays missing rather than taking whatever number follows it in the fallback.
+        """
+        found = False
+        for label in labels:
+            slots = self._hits.get(self._matcher.keys[label])
+            if not slots:
+                continue
+            found = True
+            for value in slots:
+                if value:
+                    return _normalize_number(value)
+        if found or self._fallback is None:
+            return ""
+        return self._fallback.first(labels)
+
+    def or_else(self, fallback: "_LabelHits") -> "_LabelHits":
+        return _LabelHits(self._matcher, self._hits, fallback)
+
+
+_ECHO_LABEL_MATCHER = _LabelMatcher(label for labels in _ECHO_LABEL_SETS for label in labels)
+
+
 def _extract_number_after_labels(
     text: str, labels: list[str], units: Optional[str] = None
 ) -> str:
     """Find first label and return the following number (with comma/dot/space as decimal).
     units: optional regex suffix for allowed units (e.g. r'(?:cm|mm|%|ml|cm/s|mmHg|m/s)?').
-    Tries: digit.digit then digit,digit then digit digit (OCR often drops decimal point).
+    The unit suffix is optional, so it never changes which number is returned.
+    Prefer _ECHO_LABEL_MATCHER.scan(text).first(labels) when resolving several fields from the same text.
     """
-    if not text or not text.strip():
-        return ""
-    text_norm = text.replace("\n", " ")
-    suffix = units or r"(?:cm|mm|%|ml|cm²|cm/s|mmHg|m/s|g)?"
-    for label in labels:
-        # Pattern: label then optional spaces/:= then number (allow space as decimal separator)
-        base = re.escape(label) + r"[\s:=\-]*"
-        for num_pattern in [
-            r"(\d+[,\.]\d*)",           # 0.409, 2,01
-            r"(\d+[\s,\.]\d+)",       # 0 409, 1 . 31
-            r"(\d+[,\.]?\d*)",        # 38, 38.8
-        ]:
-            pattern = base + num_pattern + r"\s*" + suffix
-            m = re.search(pattern, text_norm, re.IGNORECASE)
-            if m and m.group(1):
-                return _normalize_number(m.group(1))
-    return ""
+    if all(label in _ECHO_LABEL_MATCHER.keys for label in labels):
+        matcher = _ECHO_LABEL_MATCHER
+    else:
+        matcher = _LabelMatcher(labels)
+    return matcher.scan(text).first(labels)
 
 
-def parse_echo_measurements(text: str) -> dict:
+@timed("parse_echo_measurements")
+def parse_echo_measurements(text: str, ocr: Optional[OcrResult] = None) -> dict:
     """
     Extract echocardiography measurements and findings from OCR text.
     Returns dicts matching frontend state: measurementsData, funcaoDiastolica, etc.
     Supports both Portuguese report labels and ultrasound machine labels (IVSd, LVIDd, etc.).
+    All label lookups share a single scan of the text (see _LabelMatcher).
+    With ocr (the boxes behind text), each label is paired with the value box beside or below it;
+    only fields whose labels are in no box (e.g. a label split over two boxes) fall back to the flat text.
     """
     if not text or not text.strip():
         return {}
     out = {}
+    hits = _ECHO_LABEL_MATCHER.scan(text)
+    if ocr:
+        hits = _ECHO_LABEL_MATCHER.scan_boxes(ocr).or_else(hits)
 
     # Measurements (VE, AE, Ao, FS, FE) — include machine-style labels from Philips/GE etc.
-    labels_dved_d = [
-        "LVIDd", "LVID d", "VED", "VEd", "DVED", "ventrículo esquerdo diástole", "LVEDd", "VEDd",
-        "Left Ventricular Internal Dimension in diastole",
-    ]
-    labels_dved_s = [
-        "LVIDs", "LVID s", "VES", "VEs", "DVES", "ventrículo esquerdo sístole", "LVEDs", "VEDs",
-        "Left Ventricular Internal Dimension in systole",
-    ]
-    labels_sivd = ["IVSd", "IVS d", "IVS d", "SIVd", "septo interventricular diástole", "I VSd"]
-    labels_sivs = ["IVSs", "IVS s", "SIVs", "septo interventricular sístole", "I VSs"]
-    labels_plvd = [
-        "LVPWd", "PLVEd", "PLVED", "parede livre diástole", "LVFWd", "PWVd",
-        "Left Ventricular Posterior Wall thickness in diastole",
-    ]
-    labels_plvs = [
-        "LVPWs", "PLVEs", "PLVES", "parede livre sístole", "LVFWs", "PWVs",
-        "Left Ventricular Posterior Wall thickness in systole",
-    ]
-    labels_ae = [
-        "Atrial Area", "Atrial Length", "Atrial Volume", "atrio esquerdo", "AE",
-        "átrio esquerdo", "LA", "left atrium", "LA A4Cs",
-    ]
-    labels_ao = ["Ao", "aorta", "aortic", "AO"]
-    labels_fs = [
-        "FS (MM-Teich)", "FS(MM-Teich)", "FS", "fração encurtamento",
-        "fração de encurtamento", "shortening fraction", "Fractional Shortening",
-    ]
-    labels_fe = [
-        "EF (MM-Teich)", "EF(MM-Teich)", "FE", "fração de ejeção", "fração ejection",
-        "ejection fraction", "FE Teicholz", "FET", "Ejection Fraction",
-    ]
     measurements = {
-        "dvedDiastole": _extract_number_after_labels(text, labels_dved_d),
-        "dvedSistole": _extract_number_after_labels(text, labels_dved_s),
-        "septoIVd": _extract_number_after_labels(text, labels_sivd),
-        "septoIVs": _extract_number_after_labels(text, labels_sivs),
-        "paredeLVd": _extract_number_after_labels(text, labels_plvd),
-        "paredeLVs": _extract_number_after_labels(text, labels_plvs),
-        "atrioEsquerdo": _extract_number_after_labels(text, labels_ae),
-        "aorta": _extract_number_after_labels(text, labels_ao),
-        "fracaoEncurtamento": _extract_number_after_labels(text, labels_fs),
-        "fracaoEjecaoTeicholz": _extract_number_after_labels(text, labels_fe),
+        "dvedDiastole": hits.first(_LABELS_DVED_D),
+        "dvedSistole": hits.first(_LABELS_DVED_S),
+        "septoIVd": hits.first(_LABELS_SIVD),
+        "septoIVs": hits.first(_LABELS_SIVS),
+        "paredeLVd": hits.first(_LABELS_PLVD),
+        "paredeLVs": hits.first(_LABELS_PLVS),
+        "atrioEsquerdo": hits.first(_LABELS_AE),
+        "aorta": hits.first(_LABELS_AO),
+        "fracaoEncurtamento": hits.first(_LABELS_FS),
+        "fracaoEjecaoTeicholz": hits.first(_LABELS_FE),
     }
     out["measurementsData"] = {k: v for k, v in measurements.items() if v}
 
     # Função diastólica: E, A, E/A, TRIV, etc.
-    labels_e = ["onda E", "E wave", "E:", "E =", "velocidade E"]
-    labels_a = ["onda A", "A wave", "A:", "A =", "velocidade A"]
-    labels_triv = ["TRIV", "TRI V", "tempo relaxamento"]
-    labels_dt = ["DT", "tempo desaceleração", "deceleration time"]
     funcao_d = {
-        "ondaE": _extract_number_after_labels(text, labels_e),
-        "ondaA": _extract_number_after_labels(text, labels_a),
-        "triv": _extract_number_after_labels(text, labels_triv),
-        "tempoDesaceleracao": _extract_number_after_labels(text, labels_dt),
+        "ondaE": hits.first(_LABELS_E),
+        "ondaA": hits.first(_LABELS_A),
+        "triv": hits.first(_LABELS_TRIV),
+        "tempoDesaceleracao": hits.first(_LABELS_DT),
     }
     out["funcaoDiastolica"] = {k: v for k, v in funcao_d.items() if v}
 
     # Função sistólica: EPSS, MAPSE, Simpson
-    labels_epss = ["EPSS", "epss", "E-point septal separation"]
-    labels_mapse = ["MAPSE", "mapse", "mitral annular plane"]
-    labels_simpson = ["EF (Simpson)", "EF(Simpson)", "Simpson", "FE Simpson", "fração de ejeção Simpson"]
     funcao_s = {
-        "epss": _extract_number_after_labels(text, labels_epss),
-        "mapse": _extract_number_after_labels(text, labels_mapse),
-        "simpson": _extract_number_after_labels(text, labels_simpson),
+        "epss": hits.first(_LABELS_EPSS),
+        "mapse": hits.first(_LABELS_MAPSE),
+        "simpson": hits.first(_LABELS_SIMPSON),
     }
     out["funcaoSistolica"] = {k: v for k, v in funcao_s.items() if v}
 
     # Ventrículo direito: TAPSE, FAC, TDI S', RAP (atrio direito)
-    labels_tapse = ["TAPSE", "tapse"]
-    labels_fac = ["FAC", "fractional area change"]
-    labels_tdis = ["TDI S'", "TDI S", "S'", "s prime"]
-    labels_rap_max = ["RAP M max", "Dist. RAP M max", "RAP max", "Dist RAP M max"]
-    labels_rap_min = ["RAP M min", "Dist. RAP M min", "RAP min"]
     vd = {
-        "tapse": _extract_number_after_labels(text, labels_tapse),
-        "fac": _extract_number_after_labels(text, labels_fac),
-        "tdiS": _extract_number_after_labels(text, labels_tdis),
-        "atrioDireito": _extract_number_after_labels(text, labels_rap_max)
-        or _extract_number_after_labels(text, ["atrio direito", "atrium right", "AD"]),
+        "tapse": hits.first(_LABELS_TAPSE),
+        "fac": hits.first(_LABELS_FAC),
+        "tdiS": hits.first(_LABELS_TDIS),
+        "atrioDireito": hits.first(_LABELS_RAP_MAX) or hits.first(_LABELS_AD),
     }
     out["ventriculoDireito"] = {k: v for k, v in vd.items() if v}
 
     # TDI septal/livre: e', a', S
-    labels_eprime = ["e'", "e prime", "e’", "Em"]
-    labels_aprime = ["a'", "a prime", "a’", "Am"]
     tdi_s = {
-        "e": _extract_number_after_labels(text, ["septal " + l for l in labels_eprime] + ["septal e'"]),
-        "a": _extract_number_after_labels(text, ["septal " + l for l in labels_aprime]),
-        "s": _extract_number_after_labels(text, ["septal S'", "septal S"]),
+        "e": hits.first(_LABELS_TDI_SEPTAL_E),
+        "a": hits.first(_LABELS_TDI_SEPTAL_A),
+        "s": hits.first(_LABELS_TDI_SEPTAL_S),
     }
     tdi_l = {
-        "e": _extract_number_after_labels(text, ["livre " + l for l in labels_eprime] + ["free wall e'", "parede livre e'"]),
-        "a": _extract_number_after_labels(text, ["livre " + l for l in labels_aprime]),
-        "s": _extract_number_after_labels(text, ["livre S'", "free wall S'"]),
+        "e": hits.first(_LABELS_TDI_LIVRE_E),
+        "a": hits.first(_LABELS_TDI_LIVRE_A),
+        "s": hits.first(_LABELS_TDI_LIVRE_S),
     }
     if any(tdi_s.values()):
         out["tdiSeptal"] = tdi_s
@@ -348,21 +673,13 @@ def parse_echo_measurements(text: str) -> dict:
 
     # Doppler valvas: velocidades (cm/s) e gradientes (mmHg) - machine labels
     valv_vel = {
-        "mitralVelocidade": _extract_number_after_labels(
-            text, ["* Vel", "MV Vmax", "mitral Vmax", "mitral", "MV", "valva mitral", "+ Vel"]
-        ),
-        "tricuspideVelocidade": _extract_number_after_labels(
-            text, ["TV Vmax", "tricúspide", "tricuspide", "TV", "valva tricúspide"]
-        ),
-        "pulmonarVelocidade": _extract_number_after_labels(
-            text, ["+ PV Vmax", "PV Vmax", "Vmax", "pulmonar", "PV", "valva pulmonar"]
-        ),
-        "aorticaVelocidade": _extract_number_after_labels(
-            text, ["x2 + Vel", "+ Vel", "AV Vmax", "aórtica", "aortica", "AV", "valva aórtica"]
-        ),
+        "mitralVelocidade": hits.first(_LABELS_MITRAL_VEL),
+        "tricuspideVelocidade": hits.first(_LABELS_TRICUSPIDE_VEL),
+        "pulmonarVelocidade": hits.first(_LABELS_PULMONAR_VEL),
+        "aorticaVelocidade": hits.first(_LABELS_AORTICA_VEL),
     }
     valv_grad = {
-        "pulmonarGradiente": _extract_number_after_labels(text, ["Max PG", "PV Vmax", "PV"], r"(?:mmHg)?"),
+        "pulmonarGradiente": hits.first(_LABELS_PULMONAR_GRAD),
     }
     combined_valv = {**valv_vel, **valv_grad}
     out["valvasDoppler"] = {k: v for k, v in combined_valv.items() if v}
@@ -383,11 +700,37 @@ def parse_echo_measurements(text: str) -> dict:
     return out
 
 
-def parse_exam_info(text: str) -> dict:
-    """Extract exam metadata from ultrasound image text: date, time, heart rate (bpm)."""
+_HEART_RATE_LABEL = re.compile(r"(?:HR|FC)[\s:=]*$", re.IGNORECASE)
+
+
+def _heart_rate_from_boxes(ocr: OcrResult) -> str:
+    """Heart rate from box geometry: the number box left of a lone "bpm", or right of an "HR"/"FC" label."""
+    for box in ocr.boxes:
+        text = box.text.strip()
+        value = None
+        if re.fullmatch(r"bpm", text, re.IGNORECASE):
+            value = ocr.value_left_of(box)
+        elif _HEART_RATE_LABEL.fullmatch(text):
+            value = ocr.value_right_of(box)
+        m = re.match(r"[\s:=]*(\d{2,3})\b", value.text) if value is not None else None
+        if m:
+            return m.group(1)
+    return ""
+
+
+@timed("parse_exam_info")
+def parse_exam_info(text: str, ocr: Optional[OcrResult] = None) -> dict:
+    """
+    Extract exam metadata from ultrasound image text: date, time, heart rate (bpm).
+    With ocr (the boxes behind text), a heart rate split across boxes is paired by position first.
+    """
     if not text or not text.strip():
         return {}
     info = {}
+    if ocr:
+        heart_rate = _heart_rate_from_boxes(ocr)
+        if heart_rate:
+            info["frequenciaCardiaca"] = heart_rate
     # Date dd/mm/yyyy or dd-mm-yyyy
     m = re.search(r"(\d{1,2})[/\-](\d{1,2})[/\-](\d{4})", text)
     if m:
@@ -395,39 +738,354 @@ def parse_exam_info(text: str) -> dict:
         info["data"] = f"{y}-{mo.zfill(2)}-{d.zfill(2)}"  # ISO for input type=date
     # Heart rate: 155 bpm, 143bpm, 157bpm
     m = re.search(r"(\d{2,3})\s*bpm", text, re.IGNORECASE)
-    if m and m.group(1):
+    if m and m.group(1) and "frequenciaCardiaca" not in info:
         info["frequenciaCardiaca"] = m.group(1).strip()
     return info
 
 
-def run_ocr(image_bytes: bytes) -> str:
-    """Run EasyOCR on image bytes; return combined text."""
-    reader = get_reader()
+def _readtext(
+    image_bytes: bytes, options: PreprocessOptions = PREPROCESS_EXAM, engine: str = "", layouts: bool = True
+) -> list:
+    """
+    Decode and preprocess the image, then run the OCR engine; returns raw results [(box, text, confidence), ...].
+    The array's share of the image budget is held until the engine is done with it.
+    """
+    with image_budget.hold() as hold:
+        img_array = decode_image(image_bytes, options, hold=hold)
+        metrics.sample_memory()
+        return _readtext_array(img_array, engine=engine, layouts=layouts)
+
+
+def _readtext_array(
+    img_array, manufacturer: str = "", model: str = "", engine: str = "", layouts: bool = True
+) -> list:
+    """
+    Run the OCR engine on an already decoded grayscale or RGB array (e.g. a DICOM frame).
+    With layouts, when a layout profile matches the machine (DICOM tags, or header tokens in the top band of
+    a plain image), only its crops are read; box coordinates are always relative to the full frame.
+    """
+    reader = get_reader(engine)
+    height, width = img_array.shape[:2]
+    profile = layout_store.select(
+        width, height, manufacturer, model, read_header=lambda: _read_header_band(img_array, reader)
+    ) if layouts else None
+    if profile is None:
+        results = adaptive_ocr.readtext(reader, img_array, _ECHO_LABEL_MATCHER.is_label)
+        metrics.sample_memory()
+        if layouts:
+            layout_store.record(manufacturer, model, width, height, results)
+        return results
+    results = []
+    for x0, y0, x1, y1 in profile.crops(width, height):
+        crop = _crop(img_array, x0, y0, x1, y1)
+        results.extend(_offset_results(adaptive_ocr.readtext(reader, crop, _ECHO_LABEL_MATCHER.is_label), x0, y0))
+    metrics.sample_memory()
+    return results
+
+
+def _crop(img_array, x0: int, y0: int, x1: int, y1: int):
     import numpy as np
-    from PIL import Image
-    img = Image.open(io.BytesIO(image_bytes))
-    img_array = np.array(img)
-    if len(img_array.shape) == 2:
-        pass
-    elif img_array.shape[2] == 4:
-        img_array = img_array[:, :, :3]
-    results = reader.readtext(img_array)
+    return np.ascontiguousarray(img_array[y0:y1, x0:x1])
+
+
+def _offset_results(results: list, dx: int, dy: int) -> list:
+    """Move readtext boxes from crop coordinates to full-frame coordinates (extra items such as the escalated flag are kept)."""
+    return [([[x + dx, y + dy] for x, y in box], text, confidence, *rest) for box, text, confidence, *rest in results]
+
+
+def _read_header_band(img_array, reader) -> str:
+    """Quick read of the top band (where scanners print vendor/model) to pick between same-size layouts."""
+    band = _crop(img_array, 0, 0, img_array.shape[1], max(1, int(img_array.shape[0] * HEADER_BAND)))
+    return " ".join(reader.readtext(band, detail=0))
+
+
+def _readtext_batch(
+    images: list[bytes], options: PreprocessOptions = PREPROCESS_EXAM, engine: str = "", hold=None
+) -> tuple[list, dict]:
+    """
+    Run the OCR engine over several images with batched detection and recognition.
+    Images of the same size (frames of one study) go through readtext_batched together;
+    the others fall back to readtext. Entries for images that cannot be decoded are ValueError instances.
+    Within a same-size group, frames whose overlay did not change (frame_dedup) reuse the earlier frame's results.
+    Returns (results, {"ocrFrames", "duplicateFrames"}).
+    """
+    if hold is None:
+        with image_budget.hold() as hold:  # every decoded array of the batch is held until the batch is read
+            return _readtext_batch(images, options, engine, hold)
+    reader = get_reader(engine)
+    out: list = [None] * len(images)
+    stats = {"ocrFrames": 0, "duplicateFrames": 0}
+    groups: dict[tuple, list[tuple[int, object]]] = {}
+    for i, image_bytes in enumerate(images):
+        try:
+            arr = decode_image(image_bytes, options, hold=hold)
+        except ImageTooLarge as e:
+            out[i] = e
+            continue
+        except ImageMemoryBusy:
+            raise
+        except Exception as e:
+            out[i] = ValueError(f"Invalid image: {e}")
+            continue
+        groups.setdefault(arr.shape, []).append((i, arr))
+    metrics.sample_memory()
+    duplicates: list[tuple[int, int]] = []
+    for shape, members in groups.items():
+        refs = select_frames([block_signature(arr) for _, arr in members])
+        duplicates.extend((members[j][0], members[ref][0]) for j, ref in enumerate(refs) if ref != j)
+        groups[shape] = [m for j, m in enumerate(members) if refs[j] == j]
+    for (height, width, *_), members in groups.items():
+        stats["ocrFrames"] += len(members)
+        profile = layout_store.select(width, height, read_header=lambda: _read_header_band(members[0][1], reader))
+        if profile is not None:
+            # Same crop of every frame in the group forms one batch
+            for i, _ in members:
+                out[i] = []
+            for x0, y0, x1, y1 in profile.crops(width, height):
+                crops = [_crop(arr, x0, y0, x1, y1) for _, arr in members]
+                batched = adaptive_ocr.readtext_batched(
+                    reader, crops, _ECHO_LABEL_MATCHER.is_label, batch_size=OCR_RECOGNITION_BATCH_SIZE
+                )
+                for (i, _), results in zip(members, batched):
+                    out[i].extend(_offset_results(results, x0, y0))
+            continue
+        if len(members) == 1:
+            i, arr = members[0]
+            out[i] = adaptive_ocr.readtext(reader, arr, _ECHO_LABEL_MATCHER.is_label, batch_size=OCR_RECOGNITION_BATCH_SIZE)
+        else:
+            batched = adaptive_ocr.readtext_batched(
+                reader, [arr for _, arr in members], _ECHO_LABEL_MATCHER.is_label, batch_size=OCR_RECOGNITION_BATCH_SIZE
+            )
+            for (i, _), results in zip(members, batched):
+                out[i] = results
+        for i, _ in members:
+            layout_store.record("", "", width, height, out[i])
+    metrics.sample_memory()
+    for i, ref in duplicates:
+        out[i] = out[ref]
+    stats["duplicateFrames"] = len(duplicates)
+    return out, stats
+
+
+def _cache_variant(options: PreprocessOptions, engine: str = "", layouts: bool = True) -> str:
+    """Cache key tag: engine, preprocessing options, layout profiles and two-pass mode all change the results."""
+    layout = layout_store.cache_variant() if layouts else ""
+    parts = (ocr_engines.cache_tag(engine), options.variant(), layout, adaptive_ocr.cache_variant())
+    return "-".join(v for v in parts if v)
+
+
+def run_ocr_results(
+    image_bytes: bytes, options: PreprocessOptions = PREPROCESS_EXAM, engine: str = "", layouts: bool = True
+) -> list:
+    """
+    Raw OCR results [[box, text, confidence], ...] for image bytes, served from ocr_cache when possible.
+    layouts=False reads the full image even when a machine layout profile would match (patient forms).
+    """
+    key = image_key(image_bytes, _cache_variant(options, engine, layouts))
+    return ocr_cache.get_or_compute(key, lambda: ocr_pool.compute(_readtext, image_bytes, options, engine, layouts))
+
+
+def run_ocr_results_batch(
+    images: list[bytes], options: PreprocessOptions = PREPROCESS_EXAM, engine: str = ""
+) -> tuple[list, dict]:
+    """
+    Raw OCR results for several images; cached images are not re-read and duplicates are read once.
+    Entries are results lists, or exceptions for images that could not be decoded.
+    Returns (results, frame counters: ocrFrames, duplicateFrames, cachedFrames).
+    """
+    variant = _cache_variant(options, engine)
+    keys = [image_key(b, variant) for b in images]
+    out: list = [ocr_cache.get(k) for k in keys]
+    stats = {"ocrFrames": 0, "duplicateFrames": 0, "cachedFrames": sum(1 for r in out if r is not None)}
+    missing: dict[str, bytes] = {}
+    for k, b, cached in zip(keys, images, out):
+        if cached is None:
+            missing.setdefault(k, b)
+    stats["duplicateFrames"] = len(images) - stats["cachedFrames"] - len(missing)
+    if missing:
+        computed, batch_stats = ocr_pool.compute(_readtext_batch, list(missing.values()), options, engine)
+        stats["ocrFrames"] = batch_stats["ocrFrames"]
+        stats["duplicateFrames"] += batch_stats["duplicateFrames"]
+        fresh = {}
+        for k, results in zip(missing, computed):
+            fresh[k] = results if isinstance(results, Exception) else ocr_cache.put(k, results)
+        out = [fresh[k] if cached is None else cached for k, cached in zip(keys, out)]
+    return out, stats
+
+
+def results_to_text(results: list) -> str:
+    """Join recognized text in reading order (as returned by EasyOCR)."""
     return " ".join([r[1] for r in results]).strip()
 
 
-@app.post("/ocr/extract", response_model=OcrResponse)
-async def extract_ocr(file: Optional[UploadFile] = File(None), image_base64: Optional[str] = None):
+def run_ocr(image_bytes: bytes, options: PreprocessOptions = PREPROCESS_EXAM, engine: str = "") -> str:
+    """Run the OCR engine (OCR_ENGINE unless named) on image bytes; return combined text."""
+    return results_to_text(run_ocr_results(image_bytes, options, engine))
+
+
+def _read_dicom_frame(frame, hold, dicom: DicomFile, options: PreprocessOptions, engine: str) -> list:
+    """OCR one decoded frame, its preprocessed copy reserved from the budget while the engine reads it."""
+    array = preprocess_array(frame, options)
+    metrics.sample_memory()
+    extra = array.nbytes if array is not frame else 0
+    hold.acquire(extra)
+    try:
+        return ocr_pool.compute(_readtext_array, array, dicom.manufacturer, dicom.model, engine)
+    finally:
+        hold.release(extra)
+
+
+def read_dicom(
+    image_bytes: bytes, patient_only: bool = False, options: PreprocessOptions = PREPROCESS_EXAM, engine: str = ""
+) -> tuple[dict, dict, list[list], dict]:
+    """
+    Header fields and burned-in text of a DICOM file: (patient_data, exam_info, frame_results, frame_stats),
+    frame_results holding the raw OCR results of each OCR'd frame.
+    Frames are decoded one at a time and only text-bearing frames whose overlay changed are OCR'd
+    (see DicomFile.text_frames); each frame is reserved from the image budget before it is decoded (its size is
+    known from the header) and stays reserved, with its preprocessed copy, while it is read.
+    patient_only reads just the first text frame, and skips OCR when the header already covers every
+    DICOM patient field.
+    """
+    dicom = DicomFile(image_bytes)
+    patient = dicom.patient_data()
+    exam_info = dicom.exam_info()
+    frame_results: list[list] = []
+    if patient_only and all(patient.get(f) for f in DICOM_PATIENT_FIELDS):
+        dicom.frame_stats["skippedFrames"] = dicom.number_of_frames
+        return patient, exam_info, frame_results, dicom.frame_stats
+    digest = image_key(image_bytes, _cache_variant(options, engine))
+    with image_budget.hold() as hold:
+        for index, frame in dicom.text_frames("first" if patient_only else DICOM_FRAMES, hold):
+            results = ocr_cache.get_or_compute(
+                f"{digest}-frame{index}", lambda: _read_dicom_frame(frame, hold, dicom, options, engine)
+            )
+            del frame
+            frame_results.append(results)
+    return patient, exam_info, frame_results, dicom.frame_stats
+
+
+async def _run_on_pool(fn, *args):
+    """
+    Run fn on the OCR pool, in the request's lane (schedule_request). Full lane or image budget -> 503 with Retry-After;
+    over OCR_TIMEOUT_SECONDS or the request deadline -> 504; client gone -> 499;
+    engine not installed on this host -> 501.
+    """
+    try:
+        return await ocr_pool.run(fn, *args)
+    except (PoolBusy, ImageMemoryBusy) as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="OCR deadline exceeded")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="OCR timed out")
+    except ClientDisconnected as e:
+        raise HTTPException(status_code=499, detail=str(e))
+    except EngineUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+
+def _engine_param(engine: Optional[str]) -> str:
+    """Validated engine name of a request ("" = OCR_ENGINE); unknown or disallowed names -> 400."""
+    if not engine:
+        return ""
+    try:
+        return ocr_engines.resolve(engine)
+    except UnknownEngine as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def run_ocr_results_async(
+    image_bytes: bytes, options: PreprocessOptions = PREPROCESS_EXAM, engine: str = "", layouts: bool = True
+) -> list:
+    """run_ocr_results on the OCR pool; images over the pixel limit -> 413."""
+    try:
+        return await _run_on_pool(run_ocr_results, image_bytes, options, engine, layouts)
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+
+async def run_ocr_batch_async(
+    images: list[bytes], options: PreprocessOptions = PREPROCESS_EXAM, engine: str = ""
+) -> tuple[list, dict]:
+    """run_ocr_results_batch on the OCR pool, OCR_BATCH_CHUNK images per pool job (other requests can run in between)."""
+    out: list = []
+    stats = {"ocrFrames": 0, "duplicateFrames": 0, "cachedFrames": 0}
+    for start in range(0, len(images), OCR_BATCH_CHUNK):
+        results, chunk_stats = await _run_on_pool(
+            run_ocr_results_batch, images[start:start + OCR_BATCH_CHUNK], options, engine
+        )
+        out.extend(results)
+        for k, v in chunk_stats.items():
+            stats[k] += v
+    return out, stats
+
+
+async def read_raw_body(request: Request) -> bytearray:
+    """
+    Request body of a raw upload (application/octet-stream, image/*, application/dicom; fixed length or chunked).
+    With Content-Length the chunks are copied into one preallocated buffer as they arrive, so the image is held
+    once; the buffer is decoded in place (see preprocess.open_buffer). Over OCR_MAX_UPLOAD_MB -> 413.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith(("application/json", "multipart/")):
+        raise HTTPException(status_code=415, detail="Send the image bytes as the body (e.g. application/octet-stream)")
+    limit = int(OCR_MAX_UPLOAD_MB * 1024 * 1024)
+    too_large = HTTPException(status_code=413, detail=f"Upload too large (max {OCR_MAX_UPLOAD_MB:g} MB)")
+    length = request.headers.get("content-length", "")
+    if length.isdigit():
+        if int(length) > limit:
+            raise too_large
+        buffer = bytearray(int(length))
+        with memoryview(buffer) as view:
+            pos = 0
+            async for chunk in request.stream():
+                if pos + len(chunk) > len(buffer):
+                    raise HTTPException(status_code=400, detail="Body longer than Content-Length")
+                view[pos:pos + len(chunk)] = chunk
+                pos += len(chunk)
+        if pos != len(buffer):
+            raise HTTPException(status_code=400, detail="Incomplete body")
+    else:
+        buffer = bytearray()
+        async for chunk in request.stream():
+            buffer += chunk
+            if len(buffer) > limit:
+                raise too_large
+    if not buffer:
+        raise HTTPException(status_code=400, detail="Empty image")
+    return buffer
+
+
+async def read_dicom_async(
+    image_bytes: bytes, patient_only: bool = False, options: PreprocessOptions = PREPROCESS_EXAM, engine: str = ""
+) -> tuple[dict, dict, list[list], dict]:
+    """read_dicom on the OCR pool; missing pydicom -> 415, unreadable file -> 400."""
+    try:
+        return await _run_on_pool(read_dicom, image_bytes, patient_only, options, engine)
+    except DicomUnavailable as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/ocr/extract", response_model=OcrResponse, dependencies=OCR_ROUTE_DEPENDENCIES)
+async def extract_ocr(
+    file: Optional[UploadFile] = File(None), image_base64: Optional[str] = None, engine: Optional[str] = None
+):
     """
     Extract patient data from an image.
     Accepts either multipart file upload or JSON body with image_base64.
     """
+    engine = _engine_param(engine)
     image_bytes: Optional[bytes] = None
 
     if file and file.filename:
         image_bytes = await file.read()
     elif image_base64:
         try:
-            image_bytes = base64.b64decode(image_base64)
+            with stage("base64"):
+                image_bytes = base64.b64decode(image_base64)
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Invalid base64 image: {e}")
     else:
@@ -435,13 +1093,26 @@ async def extract_ocr(file: Optional[UploadFile] = File(None), image_base64: Opt
 
     if not image_bytes or len(image_bytes) == 0:
         raise HTTPException(status_code=400, detail="Empty image")
+    return await _extract_patient(image_bytes, engine)
+
 
+async def _extract_patient(image_bytes: bytes, engine: str = "") -> OcrResponse:
+    """Patient fields of an image or DICOM file (shared by /ocr/extract and /ocr/extract-raw)."""
     try:
-        full_text = run_ocr(image_bytes)
+        if is_dicom(image_bytes):
+            # Header tags first; OCR of burned-in text only fills what the tags leave empty
+            header_data, _, frame_results, _ = await read_dicom_async(image_bytes, True, PREPROCESS_PATIENT, engine)
+        else:
+            # Machine layout profiles cover exam screens, not patient forms: read the whole image
+            header_data, frame_results = {}, [
+                await run_ocr_results_async(image_bytes, PREPROCESS_PATIENT, engine, layouts=False)
+            ]
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"OCR failed: {str(e)}")
 
-    data = parse_patient_data(full_text)
+    data = fill_missing_fields(header_data, [parse_patient_data(results_to_text(r)) for r in frame_results])
     return OcrResponse(
         nome=data.get("nome", ""),
         responsavel=data.get("responsavel", ""),
@@ -455,16 +1126,23 @@ async def extract_ocr(file: Optional[UploadFile] = File(None), image_base64: Opt
     )
 
 
-@app.post("/ocr/extract-json", response_model=OcrResponse)
+@app.post("/ocr/extract-json", response_model=OcrResponse, dependencies=OCR_ROUTE_DEPENDENCIES)
 async def extract_ocr_json(body: OcrJsonRequest):
     """Accept JSON body with base64 image (for Supabase Edge Function)."""
     image_base64 = body.image_base64 or body.image
     if not image_base64:
         raise HTTPException(status_code=400, detail="Missing image_base64 or image in body")
-    return await extract_ocr(file=None, image_base64=image_base64)
+    return await extract_ocr(file=None, image_base64=image_base64, engine=body.engine)
+
+
+@app.post("/ocr/extract-raw", response_model=OcrResponse, dependencies=OCR_ROUTE_DEPENDENCIES)
+async def extract_ocr_raw(request: Request, engine: Optional[str] = None):
+    """Same as /ocr/extract, with the image (or DICOM file) as the raw request body instead of base64 or multipart."""
+    engine = _engine_param(engine)
+    return await _extract_patient(await read_raw_body(request), engine)
 
 
-@app.post("/ocr/extract-exam")
+@app.post("/ocr/extract-exam", dependencies=OCR_ROUTE_DEPENDENCIES)
 async def extract_exam(body: OcrJsonRequest):
     """
     Extract full exam data from an ultrasound/echocardiogram image.
@@ -472,43 +1150,502 @@ async def extract_exam(body: OcrJsonRequest):
     valvasDoppler, achados, conclusoes, plus optional examInfo (data, frequenciaCardiaca)
     and patientData for one-shot form fill. Used by Supabase Edge Function 'extract-exam'.
     """
+    engine = _engine_param(body.engine)
     image_base64 = body.image_base64 or body.image
     if not image_base64:
         raise HTTPException(status_code=400, detail="Missing image_base64 or image in body")
     try:
-        image_bytes = base64.b64decode(image_base64)
+        with stage("base64"):
+            image_bytes = base64.b64decode(image_base64)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid base64 image: {e}")
     if not image_bytes or len(image_bytes) == 0:
         raise HTTPException(status_code=400, detail="Empty image")
+    return await _extract_exam(image_bytes, engine)
+
+
+@app.post("/ocr/extract-exam-raw", dependencies=OCR_ROUTE_DEPENDENCIES)
+async def extract_exam_raw(request: Request, engine: Optional[str] = None):
+    """Same as /ocr/extract-exam, with the image (or DICOM file) as the raw request body instead of base64 JSON."""
+    engine = _engine_param(engine)
+    return await _extract_exam(await read_raw_body(request), engine)
+
+
+async def _extract_exam(image_bytes: bytes, engine: str = "") -> dict:
+    """Exam response for an image or DICOM file (shared by /ocr/extract-exam and /ocr/extract-exam-raw)."""
     try:
-        full_text = run_ocr(image_bytes)
+        if is_dicom(image_bytes):
+            return build_dicom_exam_response(*await read_dicom_async(image_bytes, engine=engine))
+        results = await run_ocr_results_async(image_bytes, engine=engine)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"OCR failed: {str(e)}")
-    exam_content = parse_echo_measurements(full_text)
-    exam_info = parse_exam_info(full_text)
+    return build_exam_response_from_results(results)
+
+
+def build_exam_response(full_text: str, ocr: Optional[OcrResult] = None) -> dict:
+    """
+    Run the exam, exam-info and patient parsers on OCR text; shape returned by /ocr/extract-exam.
+    ocr (the boxes behind full_text) lets the exam parsers pair labels and values by position.
+    """
+    exam_content = parse_echo_measurements(full_text, ocr)
+    exam_info = parse_exam_info(full_text, ocr)
     patient_data = parse_patient_data(full_text)
     response = {**exam_content}
     if exam_info:
         response["examInfo"] = exam_info
     if patient_data and any(patient_data.values()):
-        response["patientData"] = {
-            "nome": patient_data.get("nome", ""),
-            "responsavel": patient_data.get("responsavel", ""),
-            "responsavelTelefone": patient_data.get("responsavelTelefone", ""),
-            "responsavelEmail": patient_data.get("responsavelEmail", ""),
-            "especie": patient_data.get("especie", ""),
-            "raca": patient_data.get("raca", ""),
-            "sexo": patient_data.get("sexo", ""),
-            "idade": patient_data.get("idade", ""),
-            "peso": patient_data.get("peso", ""),
-        }
+        response["patientData"] = _patient_data_response(patient_data)
+    return response
+
+
+def build_exam_response_from_results(results: list) -> dict:
+    """
+    build_exam_response for raw OCR results [[box, text, confidence], ...].
+    In two-pass mode (OCR_ADAPTIVE) ocrStats reports how many boxes were re-read at full resolution.
+    """
+    ocr = OcrResult(results)
+    response = build_exam_response(ocr.text, ocr)
+    if adaptive_ocr.ADAPTIVE_ENABLED:
+        response["ocrStats"] = {"boxes": len(results), "escalatedBoxes": adaptive_ocr.escalated_count(results)}
+    return response
+
+
+def _add_escalated_boxes(frame_stats: dict, responses: list[dict]) -> dict:
+    """frameStats with the escalatedBoxes total of per-frame responses (two-pass mode only)."""
+    if adaptive_ocr.ADAPTIVE_ENABLED:
+        frame_stats["escalatedBoxes"] = sum(r.get("ocrStats", {}).get("escalatedBoxes", 0) for r in responses)
+    return frame_stats
+
+
+def _patient_data_response(patient_data: dict) -> dict:
+    """patientData object of the exam response: every OcrResponse field, empty when unknown."""
+    return {field: patient_data.get(field, "") for field in PATIENT_FIELDS}
+
+
+def fill_missing_fields(base: dict, others: list[dict]) -> dict:
+    """Copy of base where each empty field takes the first non-empty value from others, in order."""
+    out = {k: v for k, v in base.items() if v}
+    for other in others:
+        for k, v in other.items():
+            if v and not out.get(k):
+                out[k] = v
+    return out
+
+
+def build_dicom_exam_response(patient: dict, exam_info: dict, frame_results: list[list], frame_stats: dict) -> dict:
+    """
+    /ocr/extract-exam response for a DICOM file: per-frame OCR merged like the batch endpoint,
+    with header tags taking precedence over OCR for patient and exam info fields.
+    frameStats reports how many frames were OCR'd and how many were skipped.
+    """
+    responses = [build_exam_response_from_results(r) for r in frame_results]
+    response = merge_exam_responses(responses)
+    exam_info = fill_missing_fields(exam_info, [response.get("examInfo", {})])
+    if exam_info:
+        response["examInfo"] = exam_info
+    patient = fill_missing_fields(patient, [response.get("patientData", {})])
+    if patient:
+        response["patientData"] = _patient_data_response(patient)
+    response["frameStats"] = _add_escalated_boxes(dict(frame_stats), responses)
     return response
 
 
+def merge_exam_responses(responses: list[dict]) -> dict:
+    """
+    Merge per-frame exam responses in frame order: a later frame only fills fields
+    that earlier frames left missing or empty (sections like measurementsData merge per field).
+    """
+    merged: dict = {}
+    for response in responses:
+        for section, value in response.items():
+            if section in ("ocrStats", "frameStats"):
+                continue  # per-frame / per-file counters; totals go to the caller's frameStats
+            if isinstance(value, dict):
+                target = merged.setdefault(section, {})
+                for field, field_value in value.items():
+                    if field_value and not target.get(field):
+                        target[field] = field_value
+                    else:
+                        target.setdefault(field, field_value)
+            elif value and not merged.get(section):
+                merged[section] = value
+    return merged
+
+
+@app.post("/ocr/extract-exam-batch", dependencies=OCR_ROUTE_DEPENDENCIES)
+async def extract_exam_batch(body: OcrBatchRequest):
+    """
+    Extract exam data from several frames of one study in a single request.
+    Returns {"results": [...], "merged": {...}, "frameStats": {...}}: one /ocr/extract-exam response per image
+    (or {"error", "detail"} for images that could not be read), the merged exam view where later frames
+    fill fields earlier frames left empty, and how many frames were OCR'd, cached or skipped as duplicates.
+    """
+    if not body.images:
+        raise HTTPException(status_code=400, detail="Missing images in body")
+    if len(body.images) > OCR_BATCH_MAX_IMAGES:
+        raise HTTPException(status_code=413, detail=f"Too many images (max {OCR_BATCH_MAX_IMAGES})")
+    engine = _engine_param(body.engine)
+    decoded: list = []
+    for image_base64 in body.images:
+        try:
+            with stage("base64"):
+                image_bytes = base64.b64decode(image_base64)
+        except Exception as e:
+            decoded.append(ValueError(f"Invalid base64 image: {e}"))
+            continue
+        decoded.append(image_bytes if image_bytes else ValueError("Empty image"))
+    valid = [b for b in decoded if isinstance(b, bytes)]
+    try:
+        ocr_results, frame_stats = await run_ocr_batch_async(valid, engine=engine)
+        ocr_results = iter(ocr_results)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"OCR failed: {str(e)}")
+
+    results = []
+    for item in decoded:
+        outcome = next(ocr_results) if isinstance(item, bytes) else item
+        if isinstance(outcome, Exception):
+            results.append({"error": "OCR failed", "detail": str(outcome)})
+        else:
+            results.append(build_exam_response_from_results(outcome))
+    merged = merge_exam_responses([r for r in results if "error" not in r])
+    frame_stats = {"frames": len(decoded), **frame_stats}
+    frame_stats["skippedFrames"] = frame_stats["frames"] - frame_stats["ocrFrames"]
+    _add_escalated_boxes(frame_stats, [r for r in results if "error" not in r])
+    return {"results": results, "merged": merged, "frameStats": frame_stats}
+
+
+@app.post("/ocr/extract-exam-stream", dependencies=OCR_ROUTE_DEPENDENCIES)
+async def extract_exam_stream(files: list[UploadFile] = File(...), engine: Optional[str] = None):
+    """
+    Batch extraction with multipart file uploads (no base64) and an NDJSON response.
+    One line {"index", ...exam response} (or {"index", "error", "detail"}) is written per image as soon as its
+    chunk of OCR_BATCH_CHUNK images is done, then a last line {"merged", "frameStats"}.
+    Files are read a chunk at a time, so only one chunk of images is in memory.
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="Missing files")
+    if len(files) > OCR_BATCH_MAX_IMAGES:
+        raise HTTPException(status_code=413, detail=f"Too many images (max {OCR_BATCH_MAX_IMAGES})")
+    engine = _engine_param(engine)
+    return StreamingResponse(_stream_exam_batch(files, engine), media_type="application/x-ndjson")
+
+
+async def _stream_exam_batch(files: list[UploadFile], engine: str = "") -> AsyncIterator[str]:
+    responses: list[dict] = []
+    stats = {"frames": len(files), "ocrFrames": 0, "duplicateFrames": 0, "cachedFrames": 0}
+    for start in range(0, len(files), OCR_BATCH_CHUNK):
+        chunk = [await f.read() for f in files[start:start + OCR_BATCH_CHUNK]]
+        valid = [b for b in chunk if b]
+        try:
+            results, chunk_stats = await _run_on_pool(run_ocr_results_batch, valid, PREPROCESS_EXAM, engine)
+            for k, v in chunk_stats.items():
+                stats[k] += v
+        except Exception as e:
+            # Headers are already sent: report the failure on each line of this chunk and go on
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            results = [RuntimeError(detail)] * len(valid)
+        outcomes = iter(results)
+        for index, image_bytes in enumerate(chunk, start):
+            outcome = next(outcomes) if image_bytes else ValueError("Empty image")
+            if isinstance(outcome, Exception):
+                line = {"index": index, "error": "OCR failed", "detail": str(outcome)}
+            else:
+                response = build_exam_response_from_results(outcome)
+                responses.append(response)
+                line = {"index": index, **response}
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+        del chunk, valid, results, outcomes  # release this chunk before reading the next
+    stats["skippedFrames"] = stats["frames"] - stats["ocrFrames"]
+    _add_escalated_boxes(stats, responses)
+    yield json.dumps({"merged": merge_exam_responses(responses), "frameStats": stats}, ensure_ascii=False) + "\n"
+
+
+def _parse_input(item: ParseRequest) -> tuple[str, Optional[list]]:
+    """(text, results) of a parse request: results are validated and text is derived from them when given."""
+    if item.results is not None:
+        try:
+            results = to_plain_results(item.results)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid results (expected [[box, text, confidence], ...]): {e}")
+        return results_to_text(results), results
+    if item.text is None:
+        raise ValueError("Provide 'text' or 'results'")
+    return item.text, None
+
+
+def parse_patient(item: ParseRequest) -> dict:
+    """/ocr/extract fields of OCR text or results, without OCR."""
+    text, _ = _parse_input(item)
+    return _patient_data_response(parse_patient_data(text))
+
+
+def parse_exam(item: ParseRequest) -> dict:
+    """/ocr/extract-exam response of OCR text or results (with results, labels and values pair by box position)."""
+    text, results = _parse_input(item)
+    if results is not None:
+        return build_exam_response_from_results(results)
+    return build_exam_response(text)
+
+
+_PARSERS = {"exam": parse_exam, "patient": parse_patient}
+
+
+def _parse_chunk(parse: Callable[[ParseRequest], dict], items: list[ParseRequest]) -> list[dict]:
+    out = []
+    for item in items:
+        try:
+            response = parse(item)
+        except ValueError as e:
+            response = {"error": "Parse failed", "detail": str(e)}
+        out.append({"id": item.id, **response} if item.id is not None else response)
+    return out
+
+
+@app.post("/parse/patient", response_model=OcrResponse)
+async def parse_patient_endpoint(body: ParseRequest):
+    """Patient fields (same shape as /ocr/extract) from OCR text or stored OCR results; no image, no OCR."""
+    try:
+        return parse_patient(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/parse/exam")
+async def parse_exam_endpoint(body: ParseRequest):
+    """Exam response (same shape as /ocr/extract-exam) from OCR text or stored OCR results; no image, no OCR."""
+    try:
+        return parse_exam(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/parse/batch")
+async def parse_batch(body: ParseBatchRequest):
+    """
+    Parse many texts or stored results in one request (e.g. re-extracting stored exams after a parser fix).
+    Returns {"results": [...]}: one /parse/exam or /parse/patient response per item (kind), in order, with the
+    item's id when it has one, or {"error", "detail"} for items that could not be parsed.
+    Items are parsed OCR_PARSE_CHUNK at a time on a worker thread, so the event loop stays free.
+    """
+    parse = _PARSERS.get(body.kind)
+    if parse is None:
+        raise HTTPException(status_code=400, detail=f"Unknown kind {body.kind!r} (exam or patient)")
+    if not body.items:
+        raise HTTPException(status_code=400, detail="Missing items in body")
+    if len(body.items) > OCR_PARSE_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Too many items (max {OCR_PARSE_BATCH_MAX_ITEMS})")
+    results: list[dict] = []
+    for start in range(0, len(body.items), OCR_PARSE_CHUNK):
+        results.extend(await asyncio.to_thread(_parse_chunk, parse, body.items[start:start + OCR_PARSE_CHUNK]))
+    return {"results": results}
+
+
+# Asynchronous jobs (jobs.py): queued in SQLite, read chunk by chunk by OCR_JOB_WORKERS background tasks
+job_store = JobStore()
+
+
+async def _run_job_chunk(engine: str, items: list[tuple[int, bytes]]) -> tuple[list[tuple[int, dict]], dict]:
+    """
+    One chunk of a job: images are read together like /ocr/extract-exam-batch, DICOM files one by one like
+    /ocr/extract-exam. Returns ([(index, response)], frame counters). A full pool raises JobRetry when nothing
+    was read yet; otherwise the items not read stay pending for the next chunk.
+    """
+    current_schedule.set(Schedule(ENDPOINT_LANES["/ocr/extract-exam-batch"]))
+    out: list[tuple[int, dict]] = []
+    stats = {"frames": 0, "ocrFrames": 0, "duplicateFrames": 0, "cachedFrames": 0}
+    images = [(i, data) for i, data in items if not is_dicom(data)]
+    dicoms = [(i, data) for i, data in items if is_dicom(data)]
+    try:
+        if images:
+            try:
+                results, chunk_stats = await _run_on_pool(
+                    run_ocr_results_batch, [data for _, data in images], PREPROCESS_EXAM, engine
+                )
+            except HTTPException as e:
+                if e.status_code == 503:
+                    raise
+                results, chunk_stats = [RuntimeError(e.detail)] * len(images), {}
+            stats["frames"] += len(images)
+            for k, v in chunk_stats.items():
+                stats[k] += v
+            for (i, _), outcome in zip(images, results):
+                out.append((i, error_result(outcome) if isinstance(outcome, Exception) else build_exam_response_from_results(outcome)))
+        for i, data in dicoms:
+            try:
+                response = await _extract_exam(data, engine)
+            except HTTPException as e:
+                if e.status_code == 503:
+                    raise
+                out.append((i, error_result(RuntimeError(e.detail))))
+                continue
+            for k in ("frames", "ocrFrames", "duplicateFrames"):
+                stats[k] += response["frameStats"].get(k, 0)
+            out.append((i, response))
+    except HTTPException as e:
+        if not out:
+            raise JobRetry(float(e.headers.get("Retry-After", 1)) if e.headers else 1.0)
+    return out, stats
+
+
+job_runner = JobRunner(job_store, _run_job_chunk)
+
+
+def _job_response(job: dict, with_results: bool) -> dict:
+    """GET /jobs/{id} body: job summary, merged exam view of the items read so far and, optionally, per-item results."""
+    results = job.pop("results")
+    responses = [r for r in results if r is not None and "error" not in r]
+    frame_stats = {"frames": 0, "ocrFrames": 0, "duplicateFrames": 0, "cachedFrames": 0, **job["frameStats"]}
+    frame_stats["skippedFrames"] = frame_stats["frames"] - frame_stats["ocrFrames"]
+    job["frameStats"] = _add_escalated_boxes(frame_stats, responses)
+    job["merged"] = merge_exam_responses(responses)
+    if with_results:
+        job["results"] = results
+    return job
+
+
+async def _submit_job(items: list, engine: str) -> JSONResponse:
+    job = await asyncio.to_thread(job_store.submit, items, engine)
+    job_runner.notify()
+    return JSONResponse(status_code=202, content=job, headers={"Location": f"/jobs/{job['id']}"})
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(body: JobRequest):
+    """
+    Queue an exam extraction over many frames (or DICOM files) and return at once with the job id (202).
+    Poll GET /jobs/{id} for progress, partial results and the merged exam view.
+    """
+    if not body.images:
+        raise HTTPException(status_code=400, detail="Missing images in body")
+    if len(body.images) > JOB_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Too many images (max {JOB_MAX_ITEMS})")
+    engine = _engine_param(body.engine)
+    items: list = []
+    for image_base64 in body.images:
+        try:
+            with stage("base64"):
+                image_bytes = base64.b64decode(image_base64)
+        except Exception as e:
+            items.append(ValueError(f"Invalid base64 image: {e}"))
+            continue
+        items.append(image_bytes if image_bytes else ValueError("Empty image"))
+    return await _submit_job(items, engine)
+
+
+@app.post("/jobs/raw", status_code=202)
+async def create_job_raw(request: Request, engine: Optional[str] = None):
+    """Same as POST /jobs for one file (e.g. a multi-frame DICOM study) sent as the raw request body."""
+    engine = _engine_param(engine)
+    return await _submit_job([await read_raw_body(request)], engine)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, results: bool = True):
+    """
+    Job status (queued, running, done, failed, cancelled), progress (completed of total), frameStats, the merged
+    exam view so far and, unless results=false, one entry per item (null while pending).
+    """
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_response(job, results)
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancel a job: queued jobs stop at once, running ones after the chunk being read. Finished jobs -> 409."""
+    job = await asyncio.to_thread(job_store.cancel, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] in FINISHED and job["status"] != "cancelled":
+        raise HTTPException(status_code=409, detail=f"Job already {job['status']}")
+    return job
+
+
 @app.get("/health")
 async def health():
-    return {"status": "ok", "service": "ocr"}
+    return {
+        "status": "ok",
+        "service": "ocr",
+        "ready": _readiness["state"] == "ready",
+        "engine": {"default": ocr_engines.OCR_ENGINE, "loaded": ocr_engines.loaded()},
+        "cache": ocr_cache.stats,
+        "pool": ocr_pool.snapshot(),
+        "preprocess": preprocess_stats.snapshot(),
+        "imageMemory": image_budget.snapshot(),
+        "jobs": await asyncio.to_thread(job_store.counts),
+    }
+
+
+# Snapshot-based series, refreshed on each GET /metrics
+_cache_events = metrics.registry.add("ocr_cache_events_total", "counter", "OCR result cache lookups by outcome.", ("event",))
+_pool_work = metrics.registry.add("ocr_pool_work", "gauge", "OCR pool work queued or running per lane.", ("lane", "state"))
+_pool_outcomes = metrics.registry.add("ocr_pool_work_total", "counter", "OCR pool work per lane by outcome.", ("lane", "outcome"))
+_jobs = metrics.registry.add("ocr_jobs", "gauge", "Asynchronous jobs by status.", ("status",))
+_image_memory = metrics.registry.add("ocr_image_memory_bytes", "gauge", "Image budget: limit and bytes reserved.", ("state",))
+_image_memory_waits = metrics.registry.add(
+    "ocr_image_memory_waits_total", "counter", "Decodes that waited for the image budget, by outcome.", ("outcome",)
+)
+
+
+@metrics.registry.collector
+def _collect_service() -> None:
+    for event, count in dict(ocr_cache.stats).items():
+        _cache_events.set(count, event=event)
+    for lane, stats in ocr_pool.snapshot()["lanes"].items():
+        for state in ("queued", "running"):
+            _pool_work.set(stats[state], lane=lane, state=state)
+        for outcome in ("completed", "rejected", "timeouts", "cancelled", "expired"):
+            _pool_outcomes.set(stats[outcome], lane=lane, outcome=outcome)
+    counts = job_store.counts()
+    for status in ("queued", "running", *FINISHED):
+        _jobs.set(counts.get(status, 0), status=status)
+    budget = image_budget.totals()
+    _image_memory.set(budget["limitBytes"], state="limit")
+    _image_memory.set(budget["inUseBytes"], state="in_use")
+    _image_memory.set(budget["peakBytes"], state="peak")
+    _image_memory_waits.set(budget["waits"] - budget["rejected"], outcome="admitted")
+    _image_memory_waits.set(budget["rejected"], outcome="rejected")
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus metrics: requests, stage and queue-wait histograms, image sizes, cache, pool, jobs and memory."""
+    return Response(await asyncio.to_thread(metrics.registry.render), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/ready")
+async def ready():
+    """
+    Readiness probe: 200 once the models are loaded and a warmup inference has run on every pool worker, else 503
+    ("loading", or "error" until the service is restarted). Without OCR_PRELOAD the first call starts the warmup,
+    so a probe never sends traffic to a cold worker.
+    """
+    start_warmup()
+    with _readiness_lock:
+        state = dict(_readiness)
+    if state["state"] != "ready":
+        return JSONResponse(status_code=503, content={"status": state["state"], "detail": state["detail"]})
+    return {"status": "ready"}
+
+
+@app.on_event("startup")
+def preload_models():
+    if OCR_PRELOAD:
+        start_warmup()
+    job_runner.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_pool():
+    await job_runner.stop()
+    job_store.close()
+    ocr_pool.shutdown()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,358 @@
+"""
+Prometheus metrics and per-request stage timings.
+
+Code times its stages with `with stage("detect"):` (or the @timed decorator). Each stage is observed in the
+ocr_stage_seconds histogram and added to the timings of the current request (request_timings), which
+TimingMiddleware sends back as a Server-Timing header and counts in ocr_requests_total / ocr_request_seconds.
+GET /metrics renders registry in the Prometheus text format (no client library needed).
+
+Each request also tracks its memory: the process RSS, sampled after its images are decoded and after the engine
+has read them (sample_memory), and raised to the process's high-water mark (ru_maxrss) when that rose while the
+request ran, so short-lived peaks inside the engine are not missed; and the bytes it reserved from the image
+budget (image_budget.py). Work run in a pool worker process is measured there (measured) and merged into the
+request. The highest values go to the ocr_request_peak_rss_bytes / ocr_request_image_memory_bytes histograms and
+the X-OCR-Peak-RSS-MB header. RSS is per process, so under concurrency a request's peak includes what the
+requests beside it hold.
+
+OCR_METRICS=0 turns off the per-request bookkeeping and the Server-Timing and X-OCR-Peak-RSS-MB headers.
+"""
+import os
+import re
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Optional
+
+# Configuration (environment variables)
+METRICS_ENABLED = os.environ.get("OCR_METRICS", "1") in ("1", "true", "yes")
+
+CONTENT_TYPE = "text/plain; version=0.0.4"  # Response appends the charset
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """One metric family: counter, gauge or histogram, with a fixed tuple of label names. Thread-safe."""
+
+    def __init__(self, name: str, kind: str, help: str, labels: tuple = (), buckets: tuple = SECONDS_BUCKETS):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value: float, **labels) -> None:
+        """Gauges, and counters mirrored from a running total kept elsewhere (e.g. ocr_cache.stats)."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = sorted(self._values.items())
+            if self.kind == "histogram":
+                values = [(key, ([*counts], total, n)) for key, (counts, total, n) in values]
+        for key, value in values:
+            if self.kind != "histogram":
+                lines.append(f"{self.name}{_labels(self.label_names, key)} {_number(value)}")
+                continue
+            counts, total, n = value
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = 'le="' + _number(float(bound)) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(float(total))}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {n}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[Metric] = []
+        self._collectors: list[Callable[[], None]] = []
+
+    def add(self, name: str, kind: str, help: str, labels: tuple = (), buckets: tuple = SECONDS_BUCKETS) -> Metric:
+        metric = Metric(name, kind, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn: Callable[[], None]) -> Callable[[], None]:
+        """Register fn to refresh snapshot-based metrics right before each render."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        for fn in self._collectors:
+            fn()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+requests_total = registry.add("ocr_requests_total", "counter", "HTTP requests by endpoint and status.", ("endpoint", "method", "status"))
+request_seconds = registry.add("ocr_request_seconds", "histogram", "HTTP request duration in seconds.", ("endpoint",))
+stage_seconds = registry.add("ocr_stage_seconds", "histogram", "Duration of each processing stage in seconds.", ("stage",))
+queue_wait_seconds = registry.add("ocr_queue_wait_seconds", "histogram", "Time OCR work waited for a pool worker.", ("lane",))
+image_bytes = registry.add(
+    "ocr_image_bytes", "histogram", "Size of the encoded images decoded.", (),
+    (10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000, 10_000_000, 25_000_000),
+)
+image_pixels = registry.add(
+    "ocr_image_pixels", "histogram", "Pixels (width x height) of the images and frames read.", (),
+    (100_000, 300_000, 640 * 480, 1_000_000, 1920 * 1080, 4_000_000, 8_000_000, 16_000_000, 40_000_000),
+)
+model_load_seconds = registry.add("ocr_model_load_seconds", "gauge", "Time taken to load each OCR engine.", ("engine",))
+_MEMORY_BUCKETS = tuple(mb * 1024 * 1024 for mb in (16, 64, 128, 256, 512, 768, 1024, 1536, 2048, 3072, 4096, 8192))
+request_peak_rss = registry.add(
+    "ocr_request_peak_rss_bytes", "histogram", "Peak RSS of the process (or pool worker) serving each request.", ("endpoint",), _MEMORY_BUCKETS
+)
+request_image_memory = registry.add(
+    "ocr_request_image_memory_bytes", "histogram", "Highest image budget reservation of each request that decoded images.",
+    ("endpoint",), _MEMORY_BUCKETS,
+)
+resident_memory = registry.add("process_resident_memory_bytes", "gauge", "Resident set size of the process.")
+peak_resident_memory = registry.add("process_peak_resident_memory_bytes", "gauge", "Highest resident set size of the process.")
+
+
+def _peak_rss() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # kilobytes on Linux
+
+
+def resident_bytes() -> int:
+    """Current resident set size in bytes (the peak where /proc is missing)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return _peak_rss()
+
+
+def process_memory() -> tuple[int, int]:
+    """(current, peak) resident set size in bytes."""
+    current = resident_bytes()
+    return current, max(current, _peak_rss())
+
+
+@registry.collector
+def _collect_memory() -> None:
+    current, peak = process_memory()
+    resident_memory.set(current)
+    peak_resident_memory.set(peak)
+
+
+def percentiles(values: list[float], points: tuple = (50, 95, 99)) -> dict:
+    """pNN (linear interpolation) and mean of values in seconds, as milliseconds: {"p50Ms": ..., "meanMs": ...}."""
+    if not values:
+        return {**{f"p{p}Ms": 0.0 for p in points}, "meanMs": 0.0}
+    ordered = sorted(values)
+
+    def at(q: float) -> float:
+        pos = (len(ordered) - 1) * q
+        low = int(pos)
+        high = min(low + 1, len(ordered) - 1)
+        return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+    return {
+        **{f"p{p}Ms": round(at(p / 100) * 1000, 3) for p in points},
+        "meanMs": round(sum(ordered) / len(ordered) * 1000, 3),
+    }
+
+
+# Stage timings of the request being served (set by TimingMiddleware; the OCR pool carries it to its threads)
+request_timings: ContextVar[Optional[dict]] = ContextVar("ocr_request_timings", default=None)
+# [peak RSS, peak image budget bytes] of the request being served (carried like request_timings)
+request_memory: ContextVar[Optional[list]] = ContextVar("ocr_request_memory", default=None)
+_timings_lock = threading.Lock()
+
+
+def sample_memory() -> None:
+    """Raise the current request's peak RSS to the process RSS now."""
+    peaks = request_memory.get()
+    if peaks is not None:
+        current = resident_bytes()
+        with _timings_lock:
+            peaks[0] = max(peaks[0], current)
+
+
+def note_image_memory(nbytes: int) -> None:
+    """Record that the current request holds nbytes of the image budget."""
+    peaks = request_memory.get()
+    if peaks is not None:
+        with _timings_lock:
+            peaks[1] = max(peaks[1], nbytes)
+
+
+def _note_peak_rss(peaks: list, high_water_before: int) -> None:
+    """Raise peaks to the process's high-water mark if it rose since high_water_before (the peak was reached then)."""
+    high_water = _peak_rss()
+    if high_water > high_water_before:
+        with _timings_lock:
+            peaks[0] = max(peaks[0], high_water)
+
+
+def measured(fn: Callable, *args):
+    """
+    Run fn(*args) in a pool worker process with its own memory peaks, and return (result, peaks) for
+    merge_peaks to add to the request that sent the work.
+    """
+    peaks = [0, 0]
+    token = request_memory.set(peaks)
+    high_water = _peak_rss()
+    try:
+        result = fn(*args)
+    finally:
+        request_memory.reset(token)
+    _note_peak_rss(peaks, high_water)
+    return result, peaks
+
+
+def merge_peaks(worker_peaks: list) -> None:
+    """Raise the current request's peaks to those measured in a worker process."""
+    peaks = request_memory.get()
+    if peaks is not None:
+        with _timings_lock:
+            peaks[0] = max(peaks[0], worker_peaks[0])
+            peaks[1] = max(peaks[1], worker_peaks[1])
+
+
+def record_stage(name: str, seconds: float) -> None:
+    """Observe a stage duration and add it to the current request's timings."""
+    stage_seconds.observe(seconds, stage=name)
+    timings = request_timings.get()
+    if timings is not None:
+        with _timings_lock:
+            timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def timed(name: str):
+    """Decorator form of stage()."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def server_timing(timings: dict, total: float) -> str:
+    """Server-Timing header value: one entry per stage in milliseconds, then the total."""
+    entries = [f"{re.sub(r'[^A-Za-z0-9_-]', '_', name)};dur={seconds * 1000:.2f}" for name, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware counting HTTP requests (endpoint = route template, so /jobs/{job_id} is one series) and
+    adding the Server-Timing and X-OCR-Peak-RSS-MB headers. Written against raw ASGI so streamed bodies and
+    disconnect checks pass through untouched; the headers report what was done before the response started
+    (a streamed body is measured again when it ends, for the histograms).
+    """
+
+    def __init__(self, app, endpoint: Callable[[dict], str]):
+        self.app = app
+        self.endpoint = endpoint
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        timings: dict = {}
+        peaks = [0, 0]
+        sampled = False  # RSS is read at a few points per request, not per stage (/proc/self/statm is not free)
+        high_water = _peak_rss()
+        token = request_timings.set(timings)
+        memory_token = request_memory.set(peaks)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status, sampled
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                sample_memory()
+                _note_peak_rss(peaks, high_water)
+                sampled = True
+                with _timings_lock:
+                    value = server_timing(dict(timings), time.perf_counter() - start)
+                    peak_rss = f"{peaks[0] / 1024 / 1024:.1f}"
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"server-timing", value.encode("latin-1")),
+                    (b"x-ocr-peak-rss-mb", peak_rss.encode("latin-1")),
+                ]
+            elif message["type"] == "http.response.body" and message.get("more_body"):
+                sampled = False  # streamed: the work continues after the headers, sample again at the end
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if not sampled:
+                sample_memory()
+                _note_peak_rss(peaks, high_water)
+            request_timings.reset(token)
+            request_memory.reset(memory_token)
+            endpoint = self.endpoint(scope)
+            requests_total.inc(endpoint=endpoint, method=scope["method"], status=status)
+            request_seconds.observe(time.perf_counter() - start, endpoint=endpoint)
+            request_peak_rss.observe(peaks[0], endpoint=endpoint)
+            if peaks[1]:
+                request_image_memory.observe(peaks[1], endpoint=endpoint)
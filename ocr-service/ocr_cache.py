@@ -0,0 +1,207 @@
+"""
+Content-addressed cache for raw OCR results (boxes, text, confidence).
+Keyed on a hash of the decoded image bytes so /ocr/extract, /ocr/extract-json and
+/ocr/extract-exam share one OCR run per image; they only differ in the parse_* step.
+
+Tiers: in-memory LRU, plus an optional size-bounded directory of JSON files that survives restarts.
+Concurrent requests for the same key wait on the single in-flight computation.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+# Configuration (environment variables)
+CACHE_MAX_ENTRIES = int(os.environ.get("OCR_CACHE_MAX_ENTRIES", "256"))  # 0 disables the memory tier
+CACHE_DIR = os.environ.get("OCR_CACHE_DIR", "")  # empty disables the disk tier
+CACHE_DISK_MAX_MB = float(os.environ.get("OCR_CACHE_DISK_MAX_MB", "512"))
+
+
+def image_key(image_bytes: bytes, variant: str = "") -> str:
+    """Cache key for an image: sha256 of the bytes, plus a variant tag for settings that change OCR output."""
+    digest = hashlib.sha256(image_bytes).hexdigest()
+    return f"{digest}-{variant}" if variant else digest
+
+
+def to_plain_results(results) -> list:
+    """
+    Convert EasyOCR readtext output (numpy ints/floats) to JSON-safe [[box, text, confidence], ...].
+    Extra items after confidence (the two-pass "escalated" flag) are kept.
+    """
+    plain = []
+    for box, text, confidence, *rest in results:
+        plain.append([[[float(x), float(y)] for x, y in box], str(text), float(confidence), *(bool(v) for v in rest)])
+    return plain
+
+
+class OcrResultCache:
+    """LRU memory tier + optional disk tier + in-flight request coalescing. Thread-safe."""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, cache_dir: str = CACHE_DIR, disk_max_mb: float = CACHE_DISK_MAX_MB):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.disk_max_bytes = int(disk_max_mb * 1024 * 1024)
+        self._memory: "OrderedDict[str, list]" = OrderedDict()
+        self._inflight: dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._disk_bytes = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0}
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, _, size in self._disk_entries())
+
+    def get_or_compute(self, key: str, compute: Callable[[], list]) -> list:
+        """Return cached results for key, or run compute() once (other callers for the same key wait for it)."""
+        with self._lock:
+            cached = self._memory_get(key)
+            if cached is not None:
+                self.stats["memory_hits"] += 1
+                return cached
+            future = self._inflight.get(key)
+            if future is not None:
+                self.stats["coalesced"] += 1
+                owner = False
+            else:
+                future = Future()
+                self._inflight[key] = future
+                owner = True
+        if not owner:
+            return future.result()
+
+        try:
+            results = self._disk_get(key)
+            with self._lock:
+                self.stats["disk_hits" if results is not None else "misses"] += 1
+            if results is None:
+                results = to_plain_results(compute())
+                self._disk_put(key, results)
+            with self._lock:
+                self._memory_put(key, results)
+            future.set_result(results)
+            return results
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def get(self, key: str) -> Optional[list]:
+        """Look up key in memory, then on disk (promoting disk hits to memory). None on miss."""
+        with self._lock:
+            cached = self._memory_get(key)
+            if cached is not None:
+                self.stats["memory_hits"] += 1
+                return cached
+        results = self._disk_get(key)
+        with self._lock:
+            if results is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["disk_hits"] += 1
+            self._memory_put(key, results)
+        return results
+
+    def put(self, key: str, results) -> list:
+        """Store raw readtext results for key (both tiers); returns the stored JSON-safe form."""
+        plain = to_plain_results(results)
+        self._disk_put(key, plain)
+        with self._lock:
+            self._memory_put(key, plain)
+        return plain
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+
+    # Memory tier (callers hold self._lock)
+
+    def _memory_get(self, key: str) -> Optional[list]:
+        results = self._memory.get(key)
+        if results is not None:
+            self._memory.move_to_end(key)
+        return results
+
+    def _memory_put(self, key: str, results: list) -> None:
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = results
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    # Disk tier
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def _disk_entries(self) -> list:
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, name, st.st_size))
+        return entries
+
+    def _disk_get(self, key: str) -> Optional[list]:
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                results = json.load(f)
+            os.utime(path)  # mtime doubles as last-access time for eviction
+            return results
+        except (OSError, ValueError):
+            return None
+
+    def _disk_put(self, key: str, results: list) -> None:
+        if not self.cache_dir or self.disk_max_bytes <= 0:
+            return
+        data = json.dumps(results, ensure_ascii=False).encode("utf-8")
+        if len(data) > self.disk_max_bytes:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+        except OSError:
+            return
+        with self._disk_lock:
+            try:
+                replaced = os.stat(path).st_size  # an entry for the same key is overwritten, not added
+            except OSError:
+                replaced = 0
+            try:
+                os.replace(tmp_path, path)
+            except OSError:
+                return
+            self._disk_bytes += len(data) - replaced
+            if self._disk_bytes > self.disk_max_bytes:
+                self._disk_evict()
+
+    def _disk_evict(self) -> None:
+        """Drop least recently used files until the directory fits in disk_max_bytes (caller holds _disk_lock)."""
+        entries = sorted(self._disk_entries())
+        total = sum(size for _, _, size in entries)
+        for _, name, size in entries:
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+                total -= size
+            except OSError:
+                pass
+        self._disk_bytes = total
+
+
+ocr_cache = OcrResultCache()
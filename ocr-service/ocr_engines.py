@@ -0,0 +1,176 @@
+"""
+OCR engines behind run_ocr. Every engine exposes the subset of easyocr.Reader the service calls:
+readtext(img, detail=1, **kw), readtext_batched(imgs, **kw) and recognize(gray, horizontal_list, free_list),
+returning [box, text, confidence] items (box = 4 corner points) in reading order.
+
+  easyocr   - easyocr.Reader(["pt", "en"]) on PyTorch (default)
+  onnx      - EasyOCR's detector and recognizer exported to ONNX, run by ONNX Runtime (onnx_engine.py)
+  tesseract - Tesseract through pytesseract (needs the tesseract binary and the por/eng language data)
+
+OCR_ENGINE picks the deployment default; requests can name another one (the "engine" field or query parameter).
+Engines are loaded on first use and kept for the life of the process; load time is the "model_load" stage
+and the ocr_model_load_seconds gauge, detection and recognition are the "detect" and "recognize" stages.
+"""
+import os
+import threading
+import time
+
+import metrics
+from ocr_pool import limit_torch_threads
+
+OCR_ENGINE = os.environ.get("OCR_ENGINE", "easyocr").strip().lower()
+OCR_ENGINES_ALLOWED = [
+    e.strip().lower() for e in os.environ.get("OCR_ENGINES_ALLOWED", "easyocr,onnx,tesseract").split(",") if e.strip()
+]
+TESSERACT_LANG = os.environ.get("OCR_TESSERACT_LANG", "por+eng")
+
+
+class UnknownEngine(ValueError):
+    """Engine name that is not registered or not in OCR_ENGINES_ALLOWED."""
+
+
+class EngineUnavailable(Exception):
+    """Engine whose package or model files are missing."""
+
+
+class OcrEngine:
+    name = ""
+
+    def readtext(self, img_array, detail: int = 1, **kwargs) -> list:
+        raise NotImplementedError
+
+    def readtext_batched(self, arrays: list, **kwargs) -> list:
+        return [self.readtext(a, **kwargs) for a in arrays]
+
+    def recognize(self, gray, horizontal_list: list, free_list=None, **kwargs) -> list:
+        """Read each [x_min, x_max, y_min, y_max] rectangle of gray as one text line."""
+        raise NotImplementedError
+
+
+def rect_box(x0, y0, x1, y1) -> list:
+    """Axis-aligned rectangle as the 4 corner points readtext returns (clockwise from top-left)."""
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1]]
+
+
+def with_detail(results: list, detail: int) -> list:
+    return results if detail else [r[1] for r in results]
+
+
+class EasyOcrEngine(OcrEngine):
+    name = "easyocr"
+
+    def __init__(self):
+        limit_torch_threads()
+        # Monkey patch PIL.Image.ANTIALIAS for Pillow 10+ compatibility (ANTIALIAS was removed)
+        from PIL import Image
+        if not hasattr(Image, "ANTIALIAS"):
+            Image.ANTIALIAS = Image.LANCZOS  # LANCZOS is the modern replacement
+        try:
+            import easyocr
+        except ImportError as e:
+            raise EngineUnavailable(f"easyocr engine needs the easyocr package: {e}")
+        self.reader = easyocr.Reader(["pt", "en"], gpu=False)
+        # readtext and readtext_batched call these through self, so instance attributes time both stages
+        self.reader.detect = metrics.timed("detect")(self.reader.detect)
+        self.reader.recognize = metrics.timed("recognize")(self.reader.recognize)
+
+    def readtext(self, img_array, detail: int = 1, **kwargs) -> list:
+        return self.reader.readtext(img_array, detail=detail, **kwargs)
+
+    def readtext_batched(self, arrays: list, **kwargs) -> list:
+        return self.reader.readtext_batched(arrays, **kwargs)
+
+    def recognize(self, gray, horizontal_list: list, free_list=None, **kwargs) -> list:
+        return self.reader.recognize(gray, horizontal_list=horizontal_list, free_list=free_list or [], **kwargs)
+
+
+class TesseractEngine(OcrEngine):
+    """Tesseract LSTM engine; words are grouped into lines so boxes match EasyOCR's line-level output."""
+
+    name = "tesseract"
+
+    def __init__(self):
+        try:
+            import pytesseract
+            pytesseract.get_tesseract_version()
+        except Exception as e:
+            raise EngineUnavailable(f"tesseract engine needs pytesseract and the tesseract binary: {e}")
+        self.tesseract = pytesseract
+
+    def readtext(self, img_array, detail: int = 1, config: str = "", **kwargs) -> list:
+        with metrics.stage("recognize"):  # Tesseract detects and recognizes in one call
+            data = self.tesseract.image_to_data(
+                img_array, lang=TESSERACT_LANG, config=config, output_type=self.tesseract.Output.DICT
+            )
+        lines: dict[tuple, list[int]] = {}
+        for i, word in enumerate(data["text"]):
+            if word.strip() and float(data["conf"][i]) >= 0:
+                lines.setdefault((data["block_num"][i], data["par_num"][i], data["line_num"][i]), []).append(i)
+        results = []
+        for words in lines.values():
+            x0 = min(data["left"][i] for i in words)
+            y0 = min(data["top"][i] for i in words)
+            x1 = max(data["left"][i] + data["width"][i] for i in words)
+            y1 = max(data["top"][i] + data["height"][i] for i in words)
+            text = " ".join(data["text"][i].strip() for i in words)
+            confidence = sum(float(data["conf"][i]) for i in words) / len(words) / 100
+            results.append((rect_box(x0, y0, x1, y1), text, confidence))
+        return with_detail(results, detail)
+
+    def recognize(self, gray, horizontal_list: list, free_list=None, **kwargs) -> list:
+        results = []
+        for x_min, x_max, y_min, y_max in horizontal_list:
+            line = self.readtext(gray[y_min:y_max, x_min:x_max], config="--psm 7")
+            if line:
+                text = " ".join(r[1] for r in line)
+                confidence = min(r[2] for r in line)
+                results.append((rect_box(x_min, y_min, x_max, y_max), text, confidence))
+        return results
+
+
+def _onnx_engine() -> OcrEngine:
+    from onnx_engine import OnnxEngine
+    return OnnxEngine()
+
+
+_FACTORIES = {"easyocr": EasyOcrEngine, "onnx": _onnx_engine, "tesseract": TesseractEngine}
+_engines: dict[str, OcrEngine] = {}
+_lock = threading.Lock()
+
+
+def resolve(name: str = "") -> str:
+    """Engine name for a request: name (case-insensitive) or OCR_ENGINE when empty. Unknown names -> UnknownEngine."""
+    name = (name or OCR_ENGINE).strip().lower()
+    if name not in _FACTORIES or name not in OCR_ENGINES_ALLOWED:
+        allowed = ", ".join(e for e in OCR_ENGINES_ALLOWED if e in _FACTORIES)
+        raise UnknownEngine(f"Unknown OCR engine {name!r} (available: {allowed})")
+    return name
+
+
+def get_engine(name: str = "") -> OcrEngine:
+    """Loaded engine (OCR_ENGINE when name is empty); loads it on first use."""
+    name = resolve(name)
+    engine = _engines.get(name)
+    if engine is not None:
+        return engine
+    with _lock:
+        if name not in _engines:
+            start = time.perf_counter()
+            _engines[name] = _FACTORIES[name]()
+            seconds = time.perf_counter() - start
+            metrics.record_stage("model_load", seconds)
+            metrics.model_load_seconds.set(seconds, engine=name)
+    return _engines[name]
+
+
+def cache_tag(name: str = "") -> str:
+    """OCR cache key tag of an engine; easyocr results keep the untagged keys they had before engines were pluggable."""
+    name = resolve(name)
+    if name == "onnx":
+        from onnx_engine import ONNX_INT8
+        return "onnx-int8" if ONNX_INT8 else "onnx"
+    return "" if name == "easyocr" else name
+
+
+def loaded() -> list[str]:
+    return sorted(_engines)
@@ -0,0 +1,340 @@
+"""
+Bounded worker pool that runs blocking OCR work outside the asyncio event loop.
+
+OCR_POOL_MODE=thread (default): OCR runs in a thread pool sharing one EasyOCR reader;
+OCR_TORCH_THREADS caps the intra-op threads torch uses per inference.
+OCR_POOL_MODE=process: each worker process builds its own reader; requests are still admitted
+and cached in the main process, only the decode + readtext step crosses the process boundary.
+
+Work waits in priority lanes (OCR_LANES, highest first): whenever a worker frees up it takes the oldest
+job of the highest non-empty lane, so a patient-form fill does not queue behind a long exam batch.
+Queued work is dropped when its deadline passes or its HTTP client disconnects, freeing the slot at once.
+
+Admission is bounded per lane: once OCR_MAX_PENDING jobs of a lane are running or queued, new work in
+that lane is rejected with PoolBusy so the API can answer 503 + Retry-After instead of growing an
+unbounded backlog.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
+from typing import Awaitable, Callable, Optional
+
+from metrics import measured, merge_peaks, queue_wait_seconds, record_stage
+
+# Configuration (environment variables)
+POOL_MODE = os.environ.get("OCR_POOL_MODE", "thread")  # thread | process
+POOL_WORKERS = int(os.environ.get("OCR_WORKERS", "1"))
+MAX_PENDING = int(os.environ.get("OCR_MAX_PENDING", "8"))  # running + queued jobs
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get("OCR_TIMEOUT_SECONDS", "120"))
+RETRY_AFTER_SECONDS = int(os.environ.get("OCR_RETRY_AFTER_SECONDS", "5"))
+TORCH_THREADS = int(os.environ.get("OCR_TORCH_THREADS", "0"))  # 0 = torch default
+LANES = [lane.strip() for lane in os.environ.get("OCR_LANES", "interactive,exam,batch").split(",") if lane.strip()]
+DISCONNECT_POLL_SECONDS = float(os.environ.get("OCR_DISCONNECT_POLL_SECONDS", "0.5"))
+
+
+class PoolBusy(Exception):
+    """Raised when the pool already holds max_pending jobs."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("OCR service busy, retry later")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """The request's deadline passed before its OCR work finished."""
+
+
+class ClientDisconnected(Exception):
+    """The HTTP client went away while its OCR work was waiting."""
+
+
+class Schedule:
+    """
+    How a request's pool work is queued: its lane, an optional deadline (time.monotonic()) and an optional
+    coroutine function telling whether the client has disconnected. Set per request in current_schedule.
+    """
+
+    __slots__ = ("lane", "deadline", "disconnected")
+
+    def __init__(
+        self,
+        lane: str = "",
+        deadline: Optional[float] = None,
+        disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    ):
+        self.lane = lane
+        self.deadline = deadline
+        self.disconnected = disconnected
+
+
+current_schedule: ContextVar[Optional[Schedule]] = ContextVar("ocr_schedule", default=None)
+
+
+def limit_torch_threads() -> None:
+    """Apply OCR_TORCH_THREADS (call before the first inference in each process)."""
+    if TORCH_THREADS > 0:
+        import torch
+        torch.set_num_threads(TORCH_THREADS)
+
+
+def _init_process(initializer: Optional[Callable[..., object]], initargs: tuple, warmed) -> None:
+    """Worker process initializer: run the pool's initializer (e.g. load and warm up the reader), then count in."""
+    if initializer is not None:
+        initializer(*initargs)
+    warmed.release()
+
+
+def _noop() -> None:
+    pass
+
+
+class _Work:
+    __slots__ = ("fn", "args", "lane", "deadline", "future", "enqueued", "wait", "context")
+
+    def __init__(self, fn: Callable, args: tuple, lane: str, deadline: Optional[float]):
+        self.fn = fn
+        self.args = args
+        self.lane = lane
+        self.deadline = deadline
+        self.future: Future = Future()
+        self.enqueued = time.monotonic()
+        self.wait = 0.0
+        self.context = copy_context()  # the caller's request timings and schedule, inside the pool thread
+
+
+class _Lane:
+    __slots__ = ("queue", "pending", "running", "stats", "wait_total", "wait_max")
+
+    def __init__(self):
+        self.queue: deque[_Work] = deque()
+        self.pending = 0  # queued + running
+        self.running = 0
+        self.stats = {"completed": 0, "rejected": 0, "timeouts": 0, "cancelled": 0, "expired": 0}
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def snapshot(self) -> dict:
+        started = self.stats["completed"] + self.running
+        return {
+            "queued": len(self.queue),
+            "running": self.running,
+            **self.stats,
+            "waitMsAvg": round(self.wait_total / started * 1000, 1) if started else 0.0,
+            "waitMsMax": round(self.wait_max * 1000, 1),
+        }
+
+
+class OcrPool:
+    def __init__(
+        self,
+        mode: str = POOL_MODE,
+        workers: int = POOL_WORKERS,
+        max_pending: int = MAX_PENDING,
+        timeout: float = REQUEST_TIMEOUT_SECONDS,
+        retry_after: int = RETRY_AFTER_SECONDS,
+        initializer: Optional[Callable[..., object]] = None,
+        initargs: tuple = (),
+        lanes: Optional[list[str]] = None,
+    ):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"OCR_POOL_MODE must be 'thread' or 'process', got {mode!r}")
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.lanes = list(lanes or LANES) or ["default"]
+        self._initializer = initializer
+        self._initargs = initargs
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._warmed = None  # semaphore each worker process releases once its initializer has run
+        self._lock = threading.RLock()  # re-entered when cancelling queued work runs _release
+        self._lanes = {name: _Lane() for name in self.lanes}
+        self._running = 0
+
+    def _ensure_started(self) -> None:
+        # Executors are created lazily so importing the app (or forking workers) does not spawn threads.
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ocr")
+            if self.mode == "process":
+                context = multiprocessing.get_context()
+                self._warmed = context.Semaphore(0)
+                self._processes = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=context,
+                    initializer=_init_process,
+                    initargs=(self._initializer, self._initargs, self._warmed),
+                )
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None, schedule: Optional[Schedule] = None):
+        """
+        Run fn(*args) on a pool thread, queued in the lane of schedule (default: current_schedule, else the
+        lowest lane). Raises PoolBusy when the lane is full, asyncio.TimeoutError after timeout,
+        DeadlineExceeded after the schedule's deadline and ClientDisconnected when its client went away.
+        Work still queued when the caller stops waiting is dropped; running work finishes in the background.
+        """
+        schedule = schedule or current_schedule.get() or Schedule()
+        lane_name = schedule.lane if schedule.lane in self._lanes else self.lanes[-1]
+        work = _Work(fn, args, lane_name, schedule.deadline)
+        with self._lock:
+            lane = self._lanes[lane_name]
+            if lane.pending >= self.max_pending:
+                lane.stats["rejected"] += 1
+                raise PoolBusy(self.retry_after)
+            lane.pending += 1
+            lane.queue.append(work)
+            self._ensure_started()
+        # Frees the lane slot when the work really ends (or is dropped from the queue), not when we stop waiting
+        work.future.add_done_callback(lambda f: self._release(work))
+        self._dispatch()
+
+        waiter = asyncio.wrap_future(work.future)
+        limit = time.monotonic() + (timeout or self.timeout)
+        if schedule.deadline is not None:
+            limit = min(limit, schedule.deadline)
+        try:
+            while True:
+                remaining = limit - time.monotonic()
+                if remaining <= 0:
+                    if schedule.deadline is not None and limit == schedule.deadline:
+                        raise DeadlineExceeded("OCR deadline exceeded")
+                    raise asyncio.TimeoutError()
+                if schedule.disconnected is not None:
+                    remaining = min(remaining, DISCONNECT_POLL_SECONDS)
+                done, _ = await asyncio.wait({waiter}, timeout=remaining)
+                if done:
+                    break
+                if schedule.disconnected is not None and await schedule.disconnected():
+                    raise ClientDisconnected("Client disconnected")
+        except BaseException as e:
+            # Drop the work now if it has not started: cancelling only the waiter reaches the future a loop
+            # iteration later, and until then it would still hold its lane slot
+            work.future.cancel()
+            waiter.cancel()
+            with self._lock:
+                if isinstance(e, DeadlineExceeded):
+                    lane.stats["expired"] += 1
+                elif isinstance(e, asyncio.TimeoutError):
+                    lane.stats["timeouts"] += 1
+                else:
+                    lane.stats["cancelled"] += 1
+            raise
+        return waiter.result()
+
+    def _dispatch(self) -> None:
+        """Start queued work, highest lane first, while workers are free."""
+        with self._lock:
+            while self._threads is not None and self._running < self.workers:
+                work = self._next_work()
+                if work is None:
+                    return
+                self._running += 1
+                lane = self._lanes[work.lane]
+                lane.running += 1
+                work.wait = wait = time.monotonic() - work.enqueued
+                lane.wait_total += wait
+                lane.wait_max = max(lane.wait_max, wait)
+                queue_wait_seconds.observe(wait, lane=work.lane)
+                self._threads.submit(self._call, work)
+
+    def _next_work(self) -> Optional[_Work]:
+        # Caller holds self._lock. Skips work its caller gave up on and work whose deadline passed.
+        now = time.monotonic()
+        for name in self.lanes:
+            queue = self._lanes[name].queue
+            while queue:
+                work = queue.popleft()
+                if work.deadline is not None and work.deadline <= now:
+                    work.future.cancel()
+                    continue
+                if work.future.set_running_or_notify_cancel():
+                    return work
+        return None
+
+    def compute(self, fn: Callable, *args):
+        """
+        Run the CPU-heavy step: inline in thread mode, in a worker process in process mode (whose memory peaks
+        are added to the current request's, see metrics.measured).
+        """
+        if self._processes is not None:
+            result, peaks = self._processes.submit(measured, fn, *args).result()
+            merge_peaks(peaks)
+            return result
+        return fn(*args)
+
+    def warm_up(self, fn: Callable) -> None:
+        """
+        Warm every worker up front. Thread mode runs fn inline (the threads share one reader). In process mode
+        each worker process warms itself in the pool initializer (pass fn as initializer); this starts them all
+        and returns once every one has finished its initializer, or raises BrokenProcessPool if one failed.
+        """
+        with self._lock:
+            self._ensure_started()
+        if self._processes is None:
+            fn()
+            return
+        # Tasks submitted while no worker is idle each start a process, up to the pool size
+        for future in [self._processes.submit(_noop) for _ in range(self.workers)]:
+            future.result()
+        for _ in range(self.workers):
+            while not self._warmed.acquire(timeout=1.0):
+                self._processes.submit(_noop).result()  # raises once a worker died in its initializer
+
+    def _call(self, work: _Work) -> None:
+        try:
+            result = work.context.run(self._timed_call, work)
+        except BaseException as e:
+            work.future.set_exception(e)
+        else:
+            work.future.set_result(result)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._lanes[work.lane].running -= 1
+            self._dispatch()
+
+    @staticmethod
+    def _timed_call(work: _Work):
+        record_stage("queue", work.wait)
+        return work.fn(*work.args)
+
+    def _release(self, work: _Work) -> None:
+        with self._lock:
+            lane = self._lanes[work.lane]
+            lane.pending -= 1
+            if not work.future.cancelled():
+                lane.stats["completed"] += 1
+                return
+            try:
+                lane.queue.remove(work)  # still queued: leave the queued count (snapshot) with live work only
+            except ValueError:
+                pass  # already taken off by _next_work
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lanes = {name: lane.snapshot() for name, lane in self._lanes.items()}
+        totals = {k: sum(lane[k] for lane in lanes.values()) for k in ("running", "queued", "completed", "rejected", "timeouts")}
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "maxPending": self.max_pending,
+            **totals,
+            "lanes": lanes,
+        }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            for lane in self._lanes.values():
+                while lane.queue:
+                    lane.queue.popleft().future.cancel()
+        if self._threads is not None:
+            self._threads.shutdown(wait=False, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+        self._threads = self._processes = None
@@ -0,0 +1,104 @@
+"""
+OCR results with their geometry: each recognized text keeps its box and confidence, and the boxes are
+bucketed into rows (sorted by vertical centre, each row sorted by left edge) so the value next to a label
+is found with a binary search in the label's row (or the next row) instead of scanning the joined text.
+"""
+import re
+from bisect import bisect_left, bisect_right
+from typing import Optional
+
+_STARTS_WITH_NUMBER = re.compile(r"[\s:=\-]*\d")
+# Tokens that may sit between a label and its value on the same row (separators, units)
+_FILLER = re.compile(r"[\s:=\-.,()]*(?:cm/s|mm/s|m/s|mmhg|cm2|cm|mm|ms|ml|bpm|%|s)?[\s:=\-.,()]*", re.IGNORECASE)
+
+
+class TextBox:
+    __slots__ = ("text", "confidence", "x0", "y0", "x1", "y1", "row", "col")
+
+    def __init__(self, box, text: str, confidence: float):
+        xs = [p[0] for p in box]
+        ys = [p[1] for p in box]
+        self.text = str(text)
+        self.confidence = float(confidence)
+        self.x0, self.y0, self.x1, self.y1 = float(min(xs)), float(min(ys)), float(max(xs)), float(max(ys))
+        self.row = self.col = 0  # position in OcrResult.rows
+
+    @property
+    def height(self) -> float:
+        return max(1.0, self.y1 - self.y0)
+
+    @property
+    def cy(self) -> float:
+        return (self.y0 + self.y1) / 2
+
+    def starts_with_number(self) -> bool:
+        return bool(_STARTS_WITH_NUMBER.match(self.text))
+
+
+class _Row:
+    __slots__ = ("boxes", "x0s", "cy")
+
+    def __init__(self, boxes: list[TextBox]):
+        self.boxes = sorted(boxes, key=lambda b: b.x0)
+        self.x0s = [b.x0 for b in self.boxes]
+        self.cy = sum(b.cy for b in boxes) / len(boxes)
+
+
+class OcrResult:
+    """
+    readtext output ([box, text, confidence] items, in reading order) with a row index over the boxes.
+    text is the same space-joined string the flat-text parsers use.
+    """
+
+    def __init__(self, results: list):
+        self.boxes = [TextBox(r[0], r[1], r[2]) for r in results]
+        self.text = " ".join(b.text for b in self.boxes).strip()
+        self.rows: list[_Row] = []
+        current: list[TextBox] = []
+        for box in sorted(self.boxes, key=lambda b: b.cy):
+            # Same row while the centre stays within half a line height of the row's first box
+            if current and box.cy - current[0].cy > 0.5 * max(current[0].height, box.height):
+                self.rows.append(_Row(current))
+                current = []
+            current.append(box)
+        if current:
+            self.rows.append(_Row(current))
+        for r, row in enumerate(self.rows):
+            for c, box in enumerate(row.boxes):
+                box.row, box.col = r, c
+
+    def __bool__(self) -> bool:
+        return bool(self.boxes)
+
+    def value_right_of(self, box: TextBox) -> Optional[TextBox]:
+        """Nearest box to the right on the same row that starts with a number; stops at the next label."""
+        row = self.rows[box.row]
+        for candidate in row.boxes[bisect_right(row.x0s, box.x0, lo=box.col + 1):]:
+            if candidate.starts_with_number():
+                return candidate
+            if not _FILLER.fullmatch(candidate.text):
+                return None
+        return None
+
+    def value_below(self, box: TextBox) -> Optional[TextBox]:
+        """Box on the next row (within two line heights) that overlaps the label horizontally and starts with a number."""
+        r = box.row + 1
+        if r >= len(self.rows) or self.rows[r].cy - box.cy > 2 * box.height:
+            return None
+        row = self.rows[r]
+        end = bisect_left(row.x0s, box.x1)
+        # Rows are sorted by x0, not x1: a wide box further left can still reach under the label, so no early exit
+        for candidate in reversed(row.boxes[:end]):
+            if candidate.x1 > box.x0 and candidate.starts_with_number():
+                return candidate
+        return None
+
+    def value_for(self, box: TextBox) -> Optional[TextBox]:
+        """Value of a label box that has no number of its own: to its right, else below."""
+        return self.value_right_of(box) or self.value_below(box)
+
+    def value_left_of(self, box: TextBox) -> Optional[TextBox]:
+        """Nearest box to the left on the same row that starts with a number (e.g. "150" before "bpm")."""
+        row = self.rows[box.row]
+        candidate = row.boxes[box.col - 1] if box.col > 0 else None
+        return candidate if candidate is not None and candidate.starts_with_number() else None
@@ -0,0 +1,293 @@
+"""
+ONNX Runtime engine: EasyOCR's CRAFT detector and recognizer exported with export_onnx.py, run on CPU
+without PyTorch (no torch import at startup, ONNX Runtime's graph optimizations at inference).
+
+Pre- and post-processing follow easyocr.Reader.readtext with its default arguments (canvas size, CRAFT
+thresholds, line grouping, 64-pixel recognizer input, greedy CTC decoding with the pt/en character set),
+so results stay close to the easyocr engine's. Differences: rotated text is read through its bounding
+rectangle (EasyOCR warps it), and there is no paragraph mode.
+
+Models are read from OCR_ONNX_DIR: detector.onnx, recognizer.onnx and recognizer.json (character set).
+With OCR_ONNX_INT8=1 the int8 models (detector.int8.onnx / recognizer.int8.onnx) are used where present.
+Needs onnxruntime and opencv-python-headless (both come without torch).
+"""
+import json
+import math
+import os
+
+import numpy as np
+
+import metrics
+from ocr_engines import EngineUnavailable, OcrEngine, rect_box, with_detail
+
+ONNX_DIR = os.environ.get("OCR_ONNX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models"))
+ONNX_INT8 = os.environ.get("OCR_ONNX_INT8", "0") in ("1", "true", "yes")
+ONNX_THREADS = int(os.environ.get("OCR_ONNX_THREADS", "0"))  # 0 = ONNX Runtime default
+
+# easyocr.Reader.readtext defaults
+CANVAS_SIZE = 2560
+TEXT_THRESHOLD = 0.7
+LINK_THRESHOLD = 0.4
+LOW_TEXT = 0.4
+YCENTER_THS = 0.5
+HEIGHT_THS = 0.5
+WIDTH_THS = 0.5
+ADD_MARGIN = 0.1
+MIN_SIZE = 20
+CONTRAST_THS = 0.1  # lines read below this confidence are read again with contrast adjusted
+ADJUST_CONTRAST = 0.5
+_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32) * 255.0
+_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32) * 255.0
+
+
+def _model_path(name: str) -> str:
+    if ONNX_INT8:
+        quantized = os.path.join(ONNX_DIR, f"{name}.int8.onnx")
+        if os.path.exists(quantized):
+            return quantized
+    return os.path.join(ONNX_DIR, f"{name}.onnx")
+
+
+class OnnxEngine(OcrEngine):
+    name = "onnx"
+
+    def __init__(self):
+        try:
+            import cv2
+            import onnxruntime
+        except ImportError as e:
+            raise EngineUnavailable(f"onnx engine needs onnxruntime and opencv-python-headless: {e}")
+        paths = [_model_path("detector"), _model_path("recognizer"), os.path.join(ONNX_DIR, "recognizer.json")]
+        missing = [p for p in paths if not os.path.exists(p)]
+        if missing:
+            raise EngineUnavailable(f"onnx engine models missing (run export_onnx.py): {', '.join(missing)}")
+        self.cv2 = cv2
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ONNX_THREADS > 0:
+            options.intra_op_num_threads = ONNX_THREADS
+        providers = ["CPUExecutionProvider"]
+        self.detector = onnxruntime.InferenceSession(paths[0], options, providers=providers)
+        self.recognizer = onnxruntime.InferenceSession(paths[1], options, providers=providers)
+        with open(paths[2], encoding="utf-8") as f:
+            charset = json.load(f)
+        self.characters = ["[blank]"] + list(charset["characters"])
+        self.model_height = int(charset.get("imgH", 64))
+        # Characters of the model outside pt/en are never emitted (easyocr's ignore_char)
+        ignored = set(charset.get("ignore", ""))
+        self.ignore_idx = np.array([i for i, ch in enumerate(self.characters) if ch in ignored], dtype=np.int64)
+
+    # readtext / readtext_batched / recognize (easyocr.Reader surface)
+
+    def readtext(self, img_array, detail: int = 1, batch_size: int = 1, **kwargs) -> list:
+        return self.readtext_batched([img_array], detail=detail, batch_size=batch_size)[0]
+
+    def readtext_batched(self, arrays: list, detail: int = 1, batch_size: int = 1, **kwargs) -> list:
+        """Detection runs once over same-size arrays stacked into one batch; recognition per array."""
+        out = []
+        groups: dict[tuple, list[int]] = {}
+        images = [self._bgr(a) for a in arrays]
+        for i, img in enumerate(images):
+            groups.setdefault(img.shape, []).append(i)
+        lines: dict[int, list] = {}
+        for members in groups.values():
+            with metrics.stage("detect"):
+                detected = self._detect([images[i] for i in members])
+            for i, horizontal in zip(members, detected):
+                lines[i] = horizontal
+        for i, img in enumerate(images):
+            results = self.recognize(self._gray(arrays[i], img), lines[i], batch_size=batch_size)
+            out.append(with_detail(results, detail))
+        return out
+
+    def recognize(self, gray, horizontal_list: list, free_list=None, batch_size: int = 1, **kwargs) -> list:
+        crops = self._line_images(gray, horizontal_list)
+        if not crops:
+            return []
+        boxes = [box for box, _ in crops]
+        images = [img for _, img in crops]
+        with metrics.stage("recognize"):
+            texts, confidences = self._recognize_lines(images, batch_size, adjust_contrast=0.0)
+            retry = [i for i, c in enumerate(confidences) if c < CONTRAST_THS]
+            if retry:
+                again = self._recognize_lines([images[i] for i in retry], batch_size, adjust_contrast=ADJUST_CONTRAST)
+                for i, text, confidence in zip(retry, *again):
+                    if confidence > confidences[i]:
+                        texts[i], confidences[i] = text, confidence
+        return [(box, text, confidence) for box, text, confidence in zip(boxes, texts, confidences)]
+
+    # Input formats (easyocr.utils.reformat_input)
+
+    def _bgr(self, img_array):
+        if img_array.ndim == 2:
+            return self.cv2.cvtColor(img_array, self.cv2.COLOR_GRAY2BGR)
+        return np.ascontiguousarray(img_array[:, :, :3])
+
+    def _gray(self, img_array, img):
+        if img_array.ndim == 2:
+            return img_array
+        return self.cv2.cvtColor(img, self.cv2.COLOR_BGR2GRAY)  # channels taken as BGR, as easyocr does
+
+    # Detection (CRAFT)
+
+    def _detect(self, images: list) -> list[list]:
+        """Text line rectangles [x_min, x_max, y_min, y_max] of each same-size image, sorted top to bottom."""
+        cv2 = self.cv2
+        height, width = images[0].shape[:2]
+        ratio = min(CANVAS_SIZE, max(height, width)) / max(height, width)
+        target_h, target_w = int(height * ratio), int(width * ratio)
+        batch = np.zeros((len(images), target_h + (-target_h) % 32, target_w + (-target_w) % 32, 3), dtype=np.float32)
+        for b, img in enumerate(images):
+            batch[b, :target_h, :target_w] = cv2.resize(img, (target_w, target_h), interpolation=cv2.INTER_LINEAR)
+        batch = ((batch - _MEAN) / _STD).transpose(0, 3, 1, 2)
+        y = self.detector.run(None, {self.detector.get_inputs()[0].name: batch})[0]
+        scale = 2 / ratio  # score maps are half the network input size
+        out = []
+        for score in y:
+            polys = [box * scale for box in self._boxes(score[:, :, 0], score[:, :, 1])]
+            lines = _group_lines(polys)
+            out.append([line for line in lines if max(line[1] - line[0], line[3] - line[2]) > MIN_SIZE])
+        return out
+
+    def _boxes(self, textmap, linkmap) -> list:
+        """craft_utils.getDetBoxes: connected components of the text + link score maps as rotated boxes."""
+        cv2 = self.cv2
+        _, text_score = cv2.threshold(textmap, LOW_TEXT, 1, 0)
+        _, link_score = cv2.threshold(linkmap, LINK_THRESHOLD, 1, 0)
+        combined = np.clip(text_score + link_score, 0, 1).astype(np.uint8)
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(combined, connectivity=4)
+        map_h, map_w = textmap.shape
+        boxes = []
+        for k in range(1, count):
+            size = stats[k, cv2.CC_STAT_AREA]
+            if size < 10 or np.max(textmap[labels == k]) < TEXT_THRESHOLD:
+                continue
+            segmap = np.zeros(textmap.shape, dtype=np.uint8)
+            segmap[labels == k] = 255
+            segmap[np.logical_and(link_score == 1, text_score == 0)] = 0
+            x, y = stats[k, cv2.CC_STAT_LEFT], stats[k, cv2.CC_STAT_TOP]
+            w, h = stats[k, cv2.CC_STAT_WIDTH], stats[k, cv2.CC_STAT_HEIGHT]
+            niter = int(math.sqrt(size * min(w, h) / (w * h)) * 2)
+            sx, ex, sy, ey = max(0, x - niter), min(map_w, x + w + niter + 1), max(0, y - niter), min(map_h, y + h + niter + 1)
+            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1 + niter, 1 + niter))
+            segmap[sy:ey, sx:ex] = cv2.dilate(segmap[sy:ey, sx:ex], kernel)
+            points = np.roll(np.array(np.where(segmap != 0)), 1, axis=0).transpose().reshape(-1, 2)
+            box = cv2.boxPoints(cv2.minAreaRect(points))
+            # Box of a diamond-shaped component: use its bounding rectangle
+            bw, bh = np.linalg.norm(box[0] - box[1]), np.linalg.norm(box[1] - box[2])
+            if abs(1 - max(bw, bh) / (min(bw, bh) + 1e-5)) <= 0.1:
+                l, r = points[:, 0].min(), points[:, 0].max()
+                t, b = points[:, 1].min(), points[:, 1].max()
+                box = np.array([[l, t], [r, t], [r, b], [l, b]], dtype=np.float32)
+            boxes.append(box)
+        return boxes
+
+    # Recognition
+
+    def _line_images(self, gray, horizontal_list: list) -> list:
+        """easyocr.utils.get_image_list: each rectangle cropped and scaled to the model height, top to bottom."""
+        from PIL import Image
+        max_y, max_x = gray.shape[:2]
+        crops = []
+        for x_min, x_max, y_min, y_max in horizontal_list:
+            x_min, x_max, y_min, y_max = max(0, int(x_min)), min(int(x_max), max_x), max(0, int(y_min)), min(int(y_max), max_y)
+            width, height = x_max - x_min, y_max - y_min
+            if width <= 0 or height <= 0:
+                continue
+            ratio = width / height
+            if int(self.model_height * ratio) == 0:
+                continue
+            size = (int(self.model_height * ratio), self.model_height) if ratio >= 1 else (self.model_height, int(self.model_height / ratio))
+            crop = np.asarray(Image.fromarray(gray[y_min:y_max, x_min:x_max]).resize(size, Image.LANCZOS))
+            crops.append((rect_box(x_min, y_min, x_max, y_max), crop))
+        crops.sort(key=lambda item: item[0][0][1])
+        return crops
+
+    def _recognize_lines(self, images: list, batch_size: int, adjust_contrast: float) -> tuple[list, list]:
+        from PIL import Image
+        max_width = math.ceil(max(img.shape[1] / img.shape[0] for img in images)) * self.model_height
+        texts, confidences = [], []
+        batch_size = max(1, batch_size)
+        for start in range(0, len(images), batch_size):
+            chunk = images[start:start + batch_size]
+            widths = []
+            for img in chunk:
+                w = min(max_width, math.ceil(self.model_height * img.shape[1] / img.shape[0]))
+                widths.append(w)
+            batch_width = max(widths)
+            batch = np.zeros((len(chunk), 1, self.model_height, batch_width), dtype=np.float32)
+            for b, (img, w) in enumerate(zip(chunk, widths)):
+                if adjust_contrast > 0:
+                    img = _adjust_contrast_grey(img, adjust_contrast)
+                line = np.asarray(Image.fromarray(img).resize((w, self.model_height), Image.BICUBIC), dtype=np.float32)
+                line = (line / 255.0 - 0.5) / 0.5
+                batch[b, 0, :, :w] = line
+                batch[b, 0, :, w:] = line[:, -1:]  # easyocr's NormalizePAD repeats the last column
+            preds = self.recognizer.run(None, {self.recognizer.get_inputs()[0].name: batch})[0]
+            for text, confidence in self._decode(preds):
+                texts.append(text)
+                confidences.append(confidence)
+        return texts, confidences
+
+    def _decode(self, preds) -> list[tuple[str, float]]:
+        """Greedy CTC decoding; confidence = product of the kept steps' probabilities ** (2 / sqrt(n))."""
+        preds = preds - preds.max(axis=2, keepdims=True)
+        prob = np.exp(preds)
+        prob /= prob.sum(axis=2, keepdims=True)
+        if self.ignore_idx.size:
+            prob[:, :, self.ignore_idx] = 0.0
+            prob /= prob.sum(axis=2, keepdims=True)
+        indices = prob.argmax(axis=2)
+        values = prob.max(axis=2)
+        out = []
+        for index, value in zip(indices, values):
+            keep = np.insert(index[1:] != index[:-1], 0, True) & (index != 0)
+            text = "".join(self.characters[i] for i in index[keep])
+            steps = value[index != 0]
+            confidence = float(np.prod(steps) ** (2.0 / math.sqrt(len(steps)))) if len(steps) else 0.0
+            out.append((text, confidence))
+        return out
+
+
+def _group_lines(polys: list) -> list[list[int]]:
+    """easyocr.utils.group_text_box (horizontal boxes): words on one line merged into one rectangle."""
+    boxes = []
+    for poly in polys:
+        xs, ys = poly[:, 0], poly[:, 1]
+        x_min, x_max, y_min, y_max = int(xs.min()), int(xs.max()), int(ys.min()), int(ys.max())
+        boxes.append([x_min, x_max, y_min, y_max, 0.5 * (y_min + y_max), y_max - y_min])
+    boxes.sort(key=lambda b: b[4])
+    rows: list[list] = []
+    for box in boxes:
+        row = rows[-1] if rows else None
+        if row and abs(np.mean([b[4] for b in row]) - box[4]) < YCENTER_THS * np.mean([b[5] for b in row]):
+            row.append(box)
+        else:
+            rows.append([box])
+    merged = []
+    for row in rows:
+        runs: list[list] = []
+        x_end = 0
+        for box in sorted(row, key=lambda b: b[0]):
+            run = runs[-1] if runs else None
+            heights = [b[5] for b in run] if run else []
+            if run and abs(np.mean(heights) - box[5]) < HEIGHT_THS * np.mean(heights) and box[0] - x_end < WIDTH_THS * (box[3] - box[2]):
+                run.append(box)
+            else:
+                runs.append([box])
+            x_end = box[1]
+        for run in runs:
+            x_min, x_max = min(b[0] for b in run), max(b[1] for b in run)
+            y_min, y_max = min(b[2] for b in run), max(b[3] for b in run)
+            margin = int(ADD_MARGIN * min(x_max - x_min, y_max - y_min))
+            merged.append([x_min - margin, x_max + margin, y_min - margin, y_max + margin])
+    return merged
+
+
+def _adjust_contrast_grey(img, target: float):
+    """easyocr.utils.adjust_contrast_grey: stretch low-contrast line images."""
+    high, low = np.percentile(img, 90), np.percentile(img, 10)
+    if (high - low) / max(10, high + low) >= target:
+        return img
+    ratio = 200.0 / max(10, high - low)
+    return np.clip((img.astype(np.float32) - low + 25) * ratio, 0, 255).astype(np.uint8)
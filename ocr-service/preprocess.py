@@ -0,0 +1,305 @@
+"""
+Image preprocessing before OCR: decompression-bomb guard, EXIF orientation, reduced-size JPEG decode
+(Image.draft), long-side cap, grayscale, contrast normalization and binarization.
+
+Options are read per endpoint from the environment: OCR_<OPTION> sets the default for every endpoint and
+OCR_<ENDPOINT>_<OPTION> overrides it (endpoints: PATIENT for /ocr/extract and /ocr/extract-json, EXAM for
+/ocr/extract-exam and the batch endpoint), e.g. OCR_MAX_SIDE=2560, OCR_PATIENT_GRAYSCALE=1. The defaults hand the
+reader the same pixels as before preprocessing existed: no resize, full JPEG decode, no EXIF rotation.
+Every step is timed; totals are kept in preprocess_stats and each step is an ocr_stage_seconds stage (metrics.py).
+Images are converted to arrays a strip of rows at a time and every intermediate image is closed as soon as the
+next one exists, so a decode holds at most the decoded image and the output array (see image_budget.py).
+"""
+import io
+import os
+import threading
+import time
+from typing import Optional
+
+import metrics
+from image_budget import image_nbytes
+
+STRIP_PIXELS = 1 << 20  # pixels per strip when converting an image to an array (to_array)
+
+
+class ImageTooLarge(ValueError):
+    """Image pixel count is over the configured max_pixels (decompression bomb guard)."""
+
+
+def _env(endpoint: str, name: str, default: str) -> str:
+    return os.environ.get(f"OCR_{endpoint}_{name}", os.environ.get(f"OCR_{name}", default))
+
+
+def _env_flag(endpoint: str, name: str, default: bool) -> bool:
+    return _env(endpoint, name, "1" if default else "0") in ("1", "true", "yes")
+
+
+class PreprocessOptions:
+    def __init__(
+        self,
+        max_side: int = 0,
+        draft: bool = False,
+        grayscale: bool = False,
+        autocontrast: bool = False,
+        binarize: bool = False,
+        max_pixels: int = 40_000_000,
+        exif_transpose: bool = False,
+    ):
+        self.max_side = max_side  # 0 = keep full resolution (EasyOCR detection works at <= 2560 px anyway)
+        self.draft = draft  # let the JPEG decoder downscale by 1/2, 1/4 or 1/8 while decoding
+        self.grayscale = grayscale
+        self.autocontrast = autocontrast
+        self.binarize = binarize  # Otsu threshold; implies grayscale
+        self.max_pixels = max_pixels
+        self.exif_transpose = exif_transpose
+
+    @classmethod
+    def from_env(cls, endpoint: str) -> "PreprocessOptions":
+        endpoint = endpoint.upper()
+        return cls(
+            max_side=int(_env(endpoint, "MAX_SIDE", "0")),
+            draft=_env_flag(endpoint, "DRAFT_DECODE", False),
+            grayscale=_env_flag(endpoint, "GRAYSCALE", False),
+            autocontrast=_env_flag(endpoint, "AUTOCONTRAST", False),
+            binarize=_env_flag(endpoint, "BINARIZE", False),
+            max_pixels=int(_env(endpoint, "MAX_PIXELS", "40000000")),
+            exif_transpose=_env_flag(endpoint, "EXIF_TRANSPOSE", False),
+        )
+
+    def variant(self) -> str:
+        """Tag for OCR cache keys (options that change the pixels handed to the reader)."""
+        return "pp{}{}{}{}{}{}".format(
+            self.max_side,
+            "d" if self.draft else "",
+            "g" if self.grayscale else "",
+            "c" if self.autocontrast else "",
+            "b" if self.binarize else "",
+            "o" if self.exif_transpose else "",
+        )
+
+
+class PreprocessStats:
+    """Running count and total milliseconds per preprocessing step."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: dict[str, list] = {}
+
+    def record(self, timings: dict) -> None:
+        with self._lock:
+            for step, ms in timings.items():
+                entry = self._totals.setdefault(step, [0, 0.0])
+                entry[0] += 1
+                entry[1] += ms
+        for step, ms in timings.items():
+            metrics.record_stage(step, ms / 1000)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {step: {"count": n, "avgMs": round(total / n, 2)} for step, (n, total) in self._totals.items()}
+
+
+preprocess_stats = PreprocessStats()
+
+
+class _Timer:
+    def __init__(self, timings: dict):
+        self.timings = timings
+        self.t = time.perf_counter()
+
+    def step(self, name: str) -> None:
+        now = time.perf_counter()
+        self.timings[name] = self.timings.get(name, 0.0) + (now - self.t) * 1000
+        self.t = now
+
+
+class _BufferReader(io.RawIOBase):
+    """Seekable read-only file over a bytes-like object (bytearray, memoryview) that does not copy it."""
+
+    name = "<buffer>"  # pydicom reads file.name
+
+    def __init__(self, data):
+        self._view = memoryview(data).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = max(0, min(len(b), len(self._view) - self._pos))
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+
+def open_buffer(data):
+    """File object over image bytes without a copy: io.BytesIO shares a bytes object but copies anything else."""
+    if isinstance(data, bytes):
+        return io.BytesIO(data)
+    return io.BufferedReader(_BufferReader(data))
+
+
+def _otsu_threshold(gray) -> int:
+    import numpy as np
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = hist.sum()
+    if total == 0:
+        return 128
+    levels = np.arange(256)
+    weight_bg = np.cumsum(hist)
+    weight_fg = total - weight_bg
+    sum_bg = np.cumsum(hist * levels)
+    mean_bg = np.divide(sum_bg, weight_bg, out=np.zeros(256), where=weight_bg > 0)
+    mean_fg = np.divide(sum_bg[-1] - sum_bg, weight_fg, out=np.zeros(256), where=weight_fg > 0)
+    between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return int(np.argmax(between))
+
+
+def _is_wide(mode: str) -> bool:
+    """Single-channel modes with more than 8 bits per pixel (16-bit, 32-bit integer, float)."""
+    return mode in ("I", "F") or mode.startswith("I;16")
+
+
+def _target_mode(mode: str, options: PreprocessOptions) -> str:
+    if options.grayscale or options.binarize:
+        return "L"
+    if mode in ("1", "L", "LA") or _is_wide(mode):
+        return "L"  # single-channel (wide modes are rescaled to 0-255 by to_array), alpha dropped
+    return mode if mode == "RGB" else "RGB"  # RGBA, P, CMYK ...
+
+
+def _fitted(size: tuple[int, int], max_side: int) -> tuple[int, int]:
+    """Size after the long-side cap (as thumbnail() computes it, give or take a pixel)."""
+    width, height = size
+    if not max_side or max(width, height) <= max_side:
+        return width, height
+    scale = max_side / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def to_array(img, mode: str):
+    """
+    img as a new, writable, contiguous uint8 array in mode ("L" or "RGB"). Rows are converted and copied
+    STRIP_PIXELS at a time into the one output array, so no full-size converted image or tobytes() copy is ever
+    held next to img (np.asarray(img.convert(mode)) holds both, and RGBA sliced to RGB would be a third).
+    16-bit, 32-bit and float images are stretched from their min/max to 0-255 (convert("L") would clip
+    everything above 255, leaving full-range 16-bit images almost white).
+    """
+    import numpy as np
+    width, height = img.size
+    out = np.empty((height, width) if mode == "L" else (height, width, 3), dtype=np.uint8)
+    rows = max(1, STRIP_PIXELS // max(1, width))
+    wide = _is_wide(img.mode) and mode == "L"
+    if wide:
+        low, high = img.getextrema()
+        scale = 255.0 / (high - low) if high > low else 0.0
+    for y in range(0, height, rows):
+        strip = img.crop((0, y, width, min(height, y + rows)))
+        if wide:
+            values = np.asarray(strip, dtype=np.float32)
+            out[y:y + strip.height] = np.rint((values - low) * scale)
+            continue
+        if strip.mode != mode:
+            strip = strip.convert(mode)
+        out[y:y + strip.height] = np.asarray(strip)
+    return out
+
+
+def _finish(img, options: PreprocessOptions, timer: _Timer):
+    """Steps shared by encoded images and raw frames; returns a uint8 array (HxW or HxWx3) and closes img."""
+    import numpy as np
+    from PIL import Image, ImageOps
+
+    if _is_wide(img.mode):
+        # Narrow to 8 bits first (rescaled, see to_array), so resize and contrast work on the values OCR sees
+        narrowed = Image.fromarray(to_array(img, "L"))
+        img.close()
+        img = narrowed
+        timer.step("convert")
+    if options.max_side and max(img.size) > options.max_side:
+        img.thumbnail((options.max_side, options.max_side), Image.LANCZOS, reducing_gap=2.0)  # in place
+        timer.step("resize")
+    target_mode = _target_mode(img.mode, options)
+    if options.autocontrast:
+        # autocontrast needs the whole converted image; each step frees the image it replaces
+        if img.mode != target_mode:
+            converted = img.convert(target_mode)
+            img.close()
+            img = converted
+            timer.step("convert")
+        contrasted = ImageOps.autocontrast(img, cutoff=1)
+        img.close()
+        img = contrasted
+        timer.step("autocontrast")
+    converting = img.mode != target_mode
+    arr = to_array(img, target_mode)
+    img.close()
+    timer.step("convert" if converting else "array")
+    if options.binarize:
+        threshold = _otsu_threshold(arr)
+        np.greater(arr, threshold, out=arr)  # 0 / 1 in place, then 0 / 255
+        arr *= 255
+        timer.step("binarize")
+    return arr
+
+
+def decode_image(image_bytes: bytes, options: PreprocessOptions, timings: Optional[dict] = None, hold=None):
+    """
+    Decode encoded image bytes (JPEG, PNG, ...; any bytes-like object) and preprocess them; returns a uint8 array.
+    With hold (image_budget.Hold), the decoded image and the array are reserved from the image budget before
+    decoding; the decoded image's share is given back once it is freed, the array's stays with hold.
+    """
+    from PIL import Image, ImageOps
+
+    timings = {} if timings is None else timings
+    timer = _Timer(timings)
+    img = Image.open(open_buffer(image_bytes))
+    width, height = img.size
+    metrics.image_bytes.observe(len(image_bytes))
+    metrics.image_pixels.observe(width * height)
+    if options.max_pixels and width * height > options.max_pixels:
+        raise ImageTooLarge(f"Image too large ({width}x{height} pixels, max {options.max_pixels})")
+    if options.draft and img.format == "JPEG":
+        # Let the decoder produce the target mode (luma only for grayscale) at 1/2, 1/4 or 1/8 scale when capped
+        img.draft("L" if options.grayscale or options.binarize else "RGB", _fitted((width, height), options.max_side))
+    decoded = image_nbytes(img.mode, *img.size)
+    if hold is not None:
+        out_width, out_height = _fitted(img.size, options.max_side)
+        channels = 1 if _target_mode(img.mode, options) == "L" else 3
+        hold.acquire(decoded + out_width * out_height * channels)
+    img.load()
+    timer.step("decode")
+    if options.exif_transpose and img.getexif().get(0x0112, 1) != 1:  # Orientation tag
+        ImageOps.exif_transpose(img, in_place=True)
+        timer.step("orient")
+    arr = _finish(img, options, timer)
+    if hold is not None:
+        hold.release(decoded)
+    preprocess_stats.record(timings)
+    return arr
+
+
+def preprocess_array(arr, options: PreprocessOptions, timings: Optional[dict] = None):
+    """Preprocess an already decoded frame (e.g. DICOM); returns it unchanged when no step applies."""
+    from PIL import Image
+
+    metrics.image_pixels.observe(arr.shape[0] * arr.shape[1])
+    needs_resize = options.max_side and max(arr.shape[:2]) > options.max_side
+    if not (needs_resize or options.grayscale or options.autocontrast or options.binarize):
+        return arr
+    timings = {} if timings is None else timings
+    timer = _Timer(timings)
+    arr = _finish(Image.fromarray(arr), options, timer)
+    preprocess_stats.record(timings)
+    return arr
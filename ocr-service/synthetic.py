@@ -0,0 +1,290 @@
+"""
+Synthetic benchmark corpus with known ground truth (used by benchmark.py; runs offline, no fonts to download).
+
+  exam - ultrasound-style frame: black background, speckled sector, date / time / heart rate header and a
+         measurement table (machine labels such as IVSd, LVIDd, EF(MM-Teich)) with values in a right column
+  form - Portuguese patient form on white paper: Paciente, Espécie, Raça, Sexo, Idade, Peso, Responsável,
+         Telefone, E-mail, with the label variants the parsers accept
+
+Each sample is {"kind", "name", "size": [w, h], "items": [[box, text, confidence], ...], "truth": {...}}:
+items are the text boxes exactly as drawn (a perfect OCR read, readtext format) and truth is the part of the
+/ocr/extract-exam response (exam) or patientData (form) the image shows. Everything is drawn from a seeded
+random.Random, so a seed always gives the same corpus.
+
+    python synthetic.py bench-corpus/ --count 10          # <kind>-<w>x<h>-<n>.png + .json per sample
+
+The directory doubles as a golden set for compare_engines.py (exam images; the .json holds the truth).
+Text is drawn with the first TrueType font found (OCR_BENCH_FONT, DejaVu Sans, Liberation Sans, Arial),
+else Pillow's built-in font; fonts without Portuguese accents get accent-free text.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import unicodedata
+from typing import Optional
+
+EXAM_SIZES = [(640, 480), (1024, 768), (1920, 1080)]
+FORM_SIZES = [(827, 1169), (1240, 1754), (2480, 3508)]  # A4 at 100, 150 and 300 dpi
+FONT_CANDIDATES = ["DejaVuSans.ttf", "LiberationSans-Regular.ttf", "Arial.ttf", "arial.ttf"]
+
+# (field, label variants, unit, low, high, decimals)
+EXAM_FIELDS = [
+    ("septoIVd", ["IVSd"], "cm", 0.3, 1.2, 2),
+    ("dvedDiastole", ["LVIDd"], "cm", 1.5, 5.5, 2),
+    ("paredeLVd", ["LVPWd"], "cm", 0.3, 1.2, 2),
+    ("septoIVs", ["IVSs"], "cm", 0.5, 1.6, 2),
+    ("dvedSistole", ["LVIDs"], "cm", 0.8, 3.8, 2),
+    ("paredeLVs", ["LVPWs"], "cm", 0.5, 1.6, 2),
+    ("fracaoEjecaoTeicholz", ["EF(MM-Teich)", "EF (MM-Teich)"], "%", 40, 85, 0),
+    ("fracaoEncurtamento", ["FS(MM-Teich)", "FS (MM-Teich)"], "%", 20, 50, 0),
+    ("atrioEsquerdo", ["LA"], "cm", 1.0, 4.0, 2),
+    ("aorta", ["Ao"], "cm", 0.8, 2.5, 2),
+]
+
+NAMES = ["Thor", "Mel", "Luna", "Bob", "Nina", "Fred", "Belinha", "Toby", "Pipoca", "Max", "Frida", "Zeus"]
+OWNERS = ["Maria Silva", "João Souza", "Ana Paula Costa", "Carlos Oliveira", "Fernanda Lima", "José Santos"]
+BREEDS = {"canino": ["Poodle", "Shih Tzu", "Labrador", "Yorkshire", "Sem Raça Definida"], "felino": ["Siamês", "Persa", "Sem Raça Definida"]}
+SPECIES = {"canino": ["Canino", "Cão"], "felino": ["Felino", "Gato"]}
+SEXES = {"macho": "Macho", "femea": "Fêmea", "macho-castrado": "Macho castrado", "femea-castrada": "Fêmea castrada"}
+# (field, label variants); the form lists the fields in this order, one per line
+FORM_LABELS = [
+    ("nome", ["Paciente:", "Nome do paciente:", "Animal:"]),
+    ("especie", ["Espécie:"]),
+    ("raca", ["Raça:"]),
+    ("sexo", ["Sexo:"]),
+    ("idade", ["Idade:"]),
+    ("peso", ["Peso:"]),
+    ("responsavel", ["Responsável:", "Tutor:"]),
+    ("responsavelTelefone", ["Telefone:", "Celular:", "WhatsApp:"]),
+    ("responsavelEmail", ["E-mail:"]),
+]
+
+_fonts: dict = {}
+
+
+def font(size: int):
+    """TrueType font at size pixels (see module docstring), cached."""
+    from PIL import ImageFont
+    if size in _fonts:
+        return _fonts[size]
+    candidates = [os.environ.get("OCR_BENCH_FONT", "")] + FONT_CANDIDATES
+    for name in filter(None, candidates):
+        try:
+            _fonts[size] = ImageFont.truetype(name, size)
+            return _fonts[size]
+        except OSError:
+            continue
+    try:
+        _fonts[size] = ImageFont.load_default(size=size)  # Pillow >= 10.1
+    except TypeError:
+        _fonts[size] = ImageFont.load_default()
+    return _fonts[size]
+
+
+def font_name() -> str:
+    f = font(16)
+    return " ".join(filter(None, f.getname())) if hasattr(f, "getname") else "pillow-bitmap"
+
+
+def _has_accents(f) -> bool:
+    # A missing glyph renders as the font's .notdef box, the same for every missing character
+    if not hasattr(f, "getmask"):
+        return False
+    notdef = bytes(f.getmask("\U0010fffd"))
+    return all(bytes(f.getmask(ch)) != notdef for ch in "áâãçéêíóõú")
+
+
+def _fold(text: str) -> str:
+    return "".join(ch for ch in unicodedata.normalize("NFKD", text) if not unicodedata.combining(ch))
+
+
+def _number(rng: random.Random, low: float, high: float, decimals: int) -> str:
+    return f"{rng.uniform(low, high):.{decimals}f}"
+
+
+class _Layout:
+    """Places text items (measured with the font, not drawn) and keeps their boxes in readtext format."""
+
+    def __init__(self, size: tuple[int, int], text_height: int):
+        self.size = size
+        self.font = font(text_height)
+        self.accents = _has_accents(self.font)
+        self.items: list[list] = []
+
+    def text(self, x: float, y: float, text: str, align: str = "left") -> tuple[int, int, int, int]:
+        if not self.accents:
+            text = _fold(text)
+        x0, y0, x1, y1 = self.font.getbbox(text)
+        if align == "right":
+            x -= x1
+        x, y = int(x), int(y)
+        box = [[x + x0, y + y0], [x + x1, y + y0], [x + x1, y + y1], [x + x0, y + y1]]
+        self.items.append([box, text, 1.0])
+        return x + x0, y + y0, x + x1, y + y1
+
+
+def exam_sample(rng: random.Random, size: tuple[int, int]) -> dict:
+    """Ultrasound overlay: header (date, time, heart rate) and 5-10 measurements in a two-column table."""
+    width, height = size
+    line = max(12, height // 32)
+    layout = _Layout(size, line)
+    margin = width // 40
+    day, month, year = rng.randint(1, 28), rng.randint(1, 12), rng.randint(2019, 2025)
+    heart_rate = str(rng.randint(60, 220))
+    layout.text(margin, margin, f"{day:02d}/{month:02d}/{year}")
+    layout.text(margin + 8 * line, margin, f"{rng.randint(7, 19):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}")
+    layout.text(width - margin, margin, f"{heart_rate} bpm", align="right")
+    truth: dict = {"measurementsData": {}, "examInfo": {"data": f"{year}-{month:02d}-{day:02d}", "frequenciaCardiaca": heart_rate}}
+    fields = sorted(rng.sample(range(len(EXAM_FIELDS)), rng.randint(5, len(EXAM_FIELDS))))
+    y = margin + 3 * line
+    value_x = margin + 11 * line
+    for i in fields:
+        field, labels, unit, low, high, decimals = EXAM_FIELDS[i]
+        value = _number(rng, low, high, decimals)
+        layout.text(margin, y, rng.choice(labels))
+        layout.text(value_x, y, f"{value} {unit}", align="right")
+        truth["measurementsData"][field] = value
+        y += int(line * 1.5)
+    return {"kind": "exam", "size": list(size), "items": layout.items, "truth": truth}
+
+
+def form_sample(rng: random.Random, size: tuple[int, int]) -> dict:
+    """Patient form: title, then one "Label: value" line per field (a few fields left blank)."""
+    width, height = size
+    line = max(12, height // 60)
+    layout = _Layout(size, line)
+    margin = width // 12
+    species = rng.choice(list(SPECIES))
+    sex = rng.choice(list(SEXES))
+    name, owner = rng.choice(NAMES), rng.choice(OWNERS)
+    phone = f"{rng.randint(11, 99)}9{rng.randint(1000, 9999)}{rng.randint(1000, 9999)}"
+    phone = f"({phone[:2]}) {phone[2:7]}-{phone[7:]}"
+    age = rng.randint(1, 16)
+    age = f"{age} {'ano' if age == 1 else 'anos'}"
+    breed = rng.choice(BREEDS[species])
+    weight = _number(rng, 2, 40, 1)
+    email = f"{_fold(owner).split()[0].lower()}{rng.randint(1, 99)}@email.com"
+    # field -> (text on the form, expected parser output)
+    values = {
+        "nome": (name, name),
+        "especie": (rng.choice(SPECIES[species]), species),
+        "raca": (breed, breed),
+        "sexo": (SEXES[sex], sex),
+        "idade": (age, age),
+        "peso": (weight.replace(".", ",") + " kg", weight),
+        "responsavel": (owner, owner),
+        "responsavelTelefone": (phone, phone),
+        "responsavelEmail": (email, email),
+    }
+    blank = set(rng.sample([f for f, _ in FORM_LABELS[1:]], rng.randint(0, 2)))
+    layout.text(width / 2 - 6 * line, margin, "FICHA DO PACIENTE")
+    truth: dict = {}
+    y = margin + 3 * line
+    for field, labels in FORM_LABELS:
+        _, _, x1, _ = layout.text(margin, y, rng.choice(labels))
+        if field not in blank:
+            shown, expected = values[field]
+            layout.text(x1 + line // 2, y, shown)
+            truth[field] = expected if layout.accents else _fold(expected)
+        y += line * 2
+    return {"kind": "form", "size": list(size), "items": layout.items, "truth": {"patientData": truth}}
+
+
+def render(sample: dict, fmt: str = "PNG") -> bytes:
+    """Draw a sample's items (exam: light text over a dark speckled frame; form: dark text on paper)."""
+    import numpy as np
+    from PIL import Image, ImageDraw
+
+    width, height = sample["size"]
+    seed = sum(len(t) for _, t, _ in sample["items"]) * 7919 + width
+    noise = np.random.default_rng(seed)
+    if sample["kind"] == "exam":
+        img = Image.new("L", (width, height), 0)
+        draw = ImageDraw.Draw(img)
+        apex = (width * 0.6, height * 0.1)
+        draw.pieslice(
+            [apex[0] - height * 0.8, apex[1] - height * 0.8, apex[0] + height * 0.8, apex[1] + height * 0.8], 50, 130, fill=70
+        )
+        arr = np.asarray(img, dtype=np.int16)
+        speckle = noise.integers(-60, 60, size=arr.shape, dtype=np.int16)
+        img = Image.fromarray(np.clip(np.where(arr > 0, arr + speckle, arr), 0, 255).astype(np.uint8)).convert("RGB")
+        ink = (235, 235, 235)
+    else:
+        paper = noise.integers(238, 256, size=(height, width), dtype=np.uint8)
+        img = Image.fromarray(paper).convert("RGB")
+        ink = (20, 20, 30)
+    draw = ImageDraw.Draw(img)
+    line = max(12, height // (32 if sample["kind"] == "exam" else 60))
+    f = font(line)
+    for box, text, _ in sample["items"]:
+        x0, y0, _, _ = f.getbbox(text)
+        draw.text((box[0][0] - x0, box[0][1] - y0), text, font=f, fill=ink)
+    out = io.BytesIO()
+    img.save(out, fmt, **({"quality": 90} if fmt == "JPEG" else {}))
+    return out.getvalue()
+
+
+def samples(seed: int, count: int, kinds: tuple = ("exam", "form"), sizes: Optional[dict] = None) -> list[dict]:
+    """count samples per kind and size; names are <kind>-<w>x<h>-<n>."""
+    rng = random.Random(seed)
+    sizes = sizes or {"exam": EXAM_SIZES, "form": FORM_SIZES}
+    make = {"exam": exam_sample, "form": form_sample}
+    out = []
+    for kind in kinds:
+        for size in sizes[kind]:
+            for n in range(count):
+                sample = make[kind](rng, size)
+                sample["name"] = f"{kind}-{size[0]}x{size[1]}-{n:03d}"
+                out.append(sample)
+    return out
+
+
+def texts(seed: int, count: int) -> list[dict]:
+    """
+    Parser corpus: count samples (exam and form alternating, random sizes) as {"kind", "text", "items", "truth"}.
+    text is the items joined like run_ocr, with OCR-style noise that keeps the truth readable: comma decimals,
+    upper/lower case, doubled spaces and stray tokens between lines.
+    """
+    rng = random.Random(seed)
+    out = []
+    for i in range(count):
+        kind = "exam" if i % 2 == 0 else "form"
+        sample = (exam_sample if kind == "exam" else form_sample)(rng, rng.choice(EXAM_SIZES if kind == "exam" else FORM_SIZES))
+        words = []
+        for _, text, _ in sample["items"]:
+            if kind == "exam" and rng.random() < 0.3:
+                text = text.replace(".", ",")
+            if rng.random() < 0.1:
+                text = text.upper() if kind == "exam" else text.lower()
+            words.append(text)
+            if rng.random() < 0.05:
+                words.append(rng.choice(["|", "*", "--", "I"]))
+        sample["text"] = (" " if rng.random() < 0.8 else "  ").join(words)
+        out.append(sample)
+    return out
+
+
+def write(directory: str, corpus: list[dict], fmt: str = "PNG") -> None:
+    """<name>.png (or .jpg) and <name>.json (the truth, in /ocr/extract-exam response shape) per sample."""
+    os.makedirs(directory, exist_ok=True)
+    ext = ".jpg" if fmt == "JPEG" else ".png"
+    for sample in corpus:
+        with open(os.path.join(directory, sample["name"] + ext), "wb") as f:
+            f.write(render(sample, fmt))
+        with open(os.path.join(directory, sample["name"] + ".json"), "w", encoding="utf-8") as f:
+            json.dump(sample["truth"], f, ensure_ascii=False, indent=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory")
+    parser.add_argument("--count", type=int, default=5, help="samples per kind and resolution")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--kinds", default="exam,form")
+    parser.add_argument("--jpeg", action="store_true", help="write JPEG (quality 90) instead of PNG")
+    args = parser.parse_args()
+    corpus = samples(args.seed, args.count, tuple(k for k in args.kinds.split(",") if k))
+    write(args.directory, corpus, "JPEG" if args.jpeg else "PNG")
+    print(f"{len(corpus)} images written to {args.directory} (font: {font_name()})")
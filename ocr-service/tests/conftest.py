@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Importing main opens the job store: keep it out of the source tree
+os.environ.setdefault("OCR_JOB_DB", os.path.join(tempfile.mkdtemp(prefix="ocr-tests-"), "jobs.sqlite3"))
@@ -0,0 +1,48 @@
+import main
+from ocr_result import OcrResult
+
+
+def box(x0, y0, x1, y1):
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1]]
+
+
+def parse(results):
+    ocr = OcrResult(results)
+    return main.parse_echo_measurements(ocr.text, ocr)
+
+
+def test_label_takes_value_box_to_its_right():
+    out = parse([
+        (box(0, 0, 50, 10), "LVIDd", 0.9),
+        (box(60, 0, 100, 10), "3.21 cm", 0.8),
+        (box(0, 20, 50, 30), "LVIDs", 0.9),
+        (box(60, 20, 100, 30), "2.10 cm", 0.8),
+    ])
+    assert out["measurementsData"] == {"dvedDiastole": "3.21", "dvedSistole": "2.10"}
+
+
+def test_label_takes_value_box_below_it():
+    out = parse([
+        (box(0, 0, 50, 10), "TAPSE", 0.9),
+        (box(5, 14, 45, 24), "1.8 cm", 0.9),
+    ])
+    assert out["ventriculoDireito"] == {"tapse": "1.8"}
+
+
+def test_label_without_value_nearby_does_not_take_a_number_from_a_distant_row():
+    results = [
+        (box(0, 0, 60, 10), "PV Vmax", 0.9),
+        (box(300, 200, 360, 210), "98 bpm", 0.9),
+    ]
+    assert parse(results)["valvasDoppler"] == {}
+    # The flat text alone still reads the next number after the label, as the text-only parsers always did
+    assert main.parse_echo_measurements(OcrResult(results).text)["valvasDoppler"]["pulmonarVelocidade"] == "98"
+
+
+def test_label_split_over_boxes_falls_back_to_flat_text():
+    out = parse([
+        (box(0, 0, 20, 10), "PV", 0.9),
+        (box(25, 0, 60, 10), "Vmax", 0.9),
+        (box(70, 0, 100, 10), "1.2", 0.9),
+    ])
+    assert out["valvasDoppler"]["pulmonarVelocidade"] == "1.2"
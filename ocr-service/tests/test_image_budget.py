@@ -0,0 +1,137 @@
+import io
+import threading
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import image_budget
+import main
+from image_budget import ImageBudget, ImageMemoryBusy
+from ocr_pool import OcrPool
+
+
+class SlowReader:
+    """Stands in for the OCR engine: takes a while and records how many images it reads at once."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.most_active = 0
+
+    def readtext(self, img_array, **kwargs):
+        with self.lock:
+            self.active += 1
+            self.most_active = max(self.most_active, self.active)
+        time.sleep(0.2)
+        with self.lock:
+            self.active -= 1
+        return []
+
+
+def png(width, height):
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def test_concurrent_large_images_wait_for_the_budget(monkeypatch):
+    reader = SlowReader()
+    monkeypatch.setattr(main, "get_reader", lambda engine="": reader)
+    image = png(1200, 900)
+    probe = ImageBudget(limit_mb=1024)
+    monkeypatch.setattr(main, "image_budget", probe)
+    main._readtext(image)
+    one_image = probe.totals()["peakBytes"]
+
+    # Room for one decoded image at a time
+    budget = ImageBudget(limit_mb=one_image * 1.5 / 1024 / 1024, wait=10)
+    monkeypatch.setattr(main, "image_budget", budget)
+    reader.most_active = 0
+    threads = [threading.Thread(target=main._readtext, args=(image,)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    totals = budget.totals()
+    assert totals["waits"] >= 2
+    assert totals["peakBytes"] <= budget.limit
+    assert totals["inUseBytes"] == 0
+
+
+def attach_budget(shared):
+    image_budget.image_budget.attach(shared)
+
+
+def reserve(nbytes):
+    start = time.monotonic()
+    with image_budget.image_budget.hold() as hold:
+        hold.acquire(nbytes)
+    return time.monotonic() - start
+
+
+def test_worker_process_waits_for_room_held_by_the_parent():
+    budget = ImageBudget(limit_mb=1, wait=10)
+    pool = OcrPool(mode="process", workers=1, initializer=attach_budget, initargs=(budget.shared(),))
+    try:
+        pool.warm_up(attach_budget)  # start the worker process
+        with budget.hold() as hold:
+            hold.acquire(800 * 1024)
+            waited = []
+            child = threading.Thread(target=lambda: waited.append(pool.compute(reserve, 500 * 1024)))
+            child.start()
+            time.sleep(0.5)
+            assert child.is_alive()  # the worker process is waiting on the parent's reservation
+        child.join(10)
+        assert waited[0] >= 0.4
+        assert budget.totals()["waits"] == 1
+    finally:
+        pool.shutdown()
+
+
+def cine_dicom(frames=2, rows=64, columns=80):
+    pydicom = pytest.importorskip("pydicom")
+    from pydicom.dataset import FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian, UltrasoundMultiFrameImageStorage, generate_uid
+
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = UltrasoundMultiFrameImageStorage
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds = pydicom.Dataset()
+    ds.file_meta = meta
+    ds.SOPClassUID = UltrasoundMultiFrameImageStorage
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.Rows, ds.Columns, ds.NumberOfFrames = rows, columns, frames
+    ds.SamplesPerPixel, ds.PhotometricInterpretation = 1, "MONOCHROME2"
+    ds.BitsAllocated, ds.BitsStored, ds.HighBit, ds.PixelRepresentation = 16, 12, 11, 0
+    pixels = np.arange(frames * rows * columns, dtype=np.uint16).reshape(frames, rows, columns) % 4096
+    ds.PixelData = pixels.tobytes()
+    buf = io.BytesIO()
+    ds.save_as(buf, enforce_file_format=True)
+    return buf.getvalue()
+
+
+def test_dicom_frames_are_reserved_from_the_header_before_decoding():
+    from dicom_input import DicomFile
+
+    dicom = DicomFile(cine_dicom())
+    peak, frame = dicom.frame_nbytes()
+    assert (peak, frame) == (64 * 80 * (2 + 4 + 1), 64 * 80)
+
+    budget = ImageBudget(limit_mb=1, wait=0.1)
+    with budget.hold() as other:
+        other.acquire(budget.limit - peak + 1)  # not enough room left for one frame
+        with budget.hold() as hold, pytest.raises(ImageMemoryBusy):
+            next(dicom.iter_frames(hold=hold))
+
+    with budget.hold() as hold:
+        frames = dicom.iter_frames(hold=hold)
+        next(frames)
+        assert budget.in_use == frame  # only the uint8 frame stays reserved once converted
+        next(frames)
+        assert budget.in_use == frame
+        frames.close()
+        assert budget.in_use == 0
@@ -0,0 +1,209 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+import jobs
+from jobs import JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), lease_seconds=60, ttl_hours=1)
+    yield store
+    store.close()
+
+
+def test_claim_leases_oldest_queued_job(store):
+    first = store.submit([b"a", b"b"])
+    second = store.submit([b"c"])
+    assert first["status"] == "queued" and first["total"] == 2
+
+    assert store.claim() == (first["id"], "")
+    assert store.get(first["id"])["status"] == "running"
+    assert store.claim() == (second["id"], "")
+    assert store.claim() is None  # both leased
+
+
+def test_unreadable_items_are_stored_as_results(store):
+    job = store.submit([b"a", ValueError("not an image")])
+    assert job["completed"] == 1
+    assert store.pending(job["id"], 10) == [(0, b"a")]
+    assert store.get(job["id"])["results"][1]["error"]
+
+    only_errors = store.submit([ValueError("x")])
+    assert only_errors["status"] == "done"
+
+
+def test_expired_lease_is_resumed_from_first_pending_item(store):
+    job = store.submit([b"a", b"b", b"c"])
+    assert store.claim() == (job["id"], "")
+    assert store.save(job["id"], [(0, {"ok": 1})], {"frames": 1})
+    assert store.claim() is None
+
+    store.renew(job["id"], 0)  # a worker stopping releases its lease
+    assert store.claim() == (job["id"], "")
+    assert store.pending(job["id"], 10) == [(1, b"b"), (2, b"c")]
+
+    assert store.save(job["id"], [(1, {"ok": 2}), (2, {"ok": 3})], {"frames": 2})
+    store.finish(job["id"], "done")
+    done = store.get(job["id"])
+    assert done["status"] == "done" and done["completed"] == 3
+    assert done["frameStats"] == {"frames": 3}
+    assert done["results"] == [{"ok": 1}, {"ok": 2}, {"ok": 3}]
+    assert store.claim() is None
+
+
+def test_renewed_lease_is_not_taken_over(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), lease_seconds=0.2, ttl_hours=1)
+    job = store.submit([b"a"])
+    assert store.claim() == (job["id"], "")
+    store.renew(job["id"], 60)
+    time.sleep(0.3)
+    assert store.claim() is None
+    store.close()
+
+
+def test_cancel_queued_job_stops_at_once(store):
+    job = store.submit([b"a"])
+    assert store.cancel(job["id"])["status"] == "cancelled"
+    assert store.claim() is None
+    assert store.cancel("missing") is None
+
+
+def test_cancel_running_job_after_current_chunk(store):
+    job = store.submit([b"a", b"b"])
+    store.claim()
+    cancelled = store.cancel(job["id"])
+    assert cancelled["status"] == "running" and cancelled["cancelRequested"]
+    assert store.save(job["id"], [(0, {"ok": 1})], {}) is False  # the worker stops here
+
+    # A worker that died after the cancel request: the job is marked cancelled, not resumed
+    store.renew(job["id"], 0)
+    assert store.claim() is None
+    assert store.get(job["id"])["status"] == "cancelled"
+
+
+def test_purge_deletes_expired_finished_jobs(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), lease_seconds=60, ttl_hours=0)
+    finished = store.submit([b"a"])
+    store.claim()
+    store.finish(finished["id"], "done")
+    queued = store.submit([b"b"])
+
+    assert store.purge() == 1
+    assert store.get(finished["id"]) is None
+    assert store.get(queued["id"]) is not None
+    assert store.counts() == {"queued": 1}
+    store.close()
+
+
+# JobRunner
+
+def run_jobs(store, run_chunk, until, timeout=5.0, chunk=1):
+    """Run one job worker until until() holds (or timeout), then stop it; returns the runner."""
+    async def main():
+        runner = jobs.JobRunner(store, run_chunk, workers=1, chunk=chunk)
+        runner.start()
+        deadline = time.monotonic() + timeout
+        while not until() and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        alive = not runner._tasks[0].done()
+        await runner.stop()
+        return alive
+
+    return asyncio.run(main())
+
+
+async def read_chunk(engine, items):
+    return [(idx, {"read": data.decode()}) for idx, data in items], {"frames": len(items)}
+
+
+@pytest.fixture
+def fast_poll(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_POLL_SECONDS", 0.01)
+
+
+def errors(operation):
+    return jobs.store_errors._values.get((operation,), 0)
+
+
+class FlakyStore(JobStore):
+    """Raises "database is locked" from the named methods while fail[name] > 0."""
+
+    def __init__(self, *args, fail, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fail = fail
+
+    def _maybe_fail(self, name):
+        if self.fail.get(name, 0) > 0:
+            self.fail[name] -= 1
+            raise sqlite3.OperationalError("database is locked")
+
+    def claim(self):
+        self._maybe_fail("claim")
+        return super().claim()
+
+    def save(self, *args):
+        self._maybe_fail("save")
+        return super().save(*args)
+
+    def finish(self, *args):
+        self._maybe_fail("finish")
+        return super().finish(*args)
+
+
+def test_runner_survives_store_failures_and_finishes_the_job(tmp_path, fast_poll):
+    store = FlakyStore(str(tmp_path / "jobs.sqlite3"), lease_seconds=0.3, ttl_hours=1, fail={"claim": 3, "finish": 1})
+    job = store.submit([b"a", b"b"])
+    before = errors("claim"), errors("finish")
+
+    alive = run_jobs(store, read_chunk, lambda: store.get(job["id"])["status"] == "done")
+
+    assert alive
+    done = store.get(job["id"])
+    assert done["status"] == "done"
+    assert done["results"] == [{"read": "a"}, {"read": "b"}]
+    assert (errors("claim"), errors("finish")) == (before[0] + 3, before[1] + 1)
+    store.close()
+
+
+def test_store_failure_while_reading_resumes_instead_of_failing(tmp_path, fast_poll):
+    store = FlakyStore(str(tmp_path / "jobs.sqlite3"), lease_seconds=60, ttl_hours=1, fail={"save": 1})
+    job = store.submit([b"a"])
+
+    assert run_jobs(store, read_chunk, lambda: store.get(job["id"])["status"] in jobs.FINISHED)
+    assert store.fail["save"] == 0
+    assert store.get(job["id"])["status"] == "done"
+    store.close()
+
+
+def test_cancel_during_last_chunk_leaves_job_done(tmp_path, fast_poll):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), lease_seconds=60, ttl_hours=1)
+    job = store.submit([b"a", b"b"])
+
+    async def cancel_on_last(engine, items):
+        if items[0][0] == 1:
+            store.cancel(job["id"])
+        return await read_chunk(engine, items)
+
+    run_jobs(store, cancel_on_last, lambda: store.get(job["id"])["status"] in jobs.FINISHED)
+    assert store.get(job["id"])["status"] == "done"
+    store.close()
+
+
+def test_cancel_before_last_chunk_stops_the_job(tmp_path, fast_poll):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), lease_seconds=60, ttl_hours=1)
+    job = store.submit([b"a", b"b", b"c"])
+
+    async def cancel_on_first(engine, items):
+        if items[0][0] == 0:
+            store.cancel(job["id"])
+        return await read_chunk(engine, items)
+
+    run_jobs(store, cancel_on_first, lambda: store.get(job["id"])["status"] in jobs.FINISHED)
+    cancelled = store.get(job["id"])
+    assert cancelled["status"] == "cancelled"
+    assert cancelled["results"] == [{"read": "a"}, None, None]
+    store.close()
@@ -0,0 +1,99 @@
+import base64
+import io
+import json
+import multiprocessing
+
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import main
+from layouts import LayoutProfile, LayoutStore
+
+# A full-frame read of a 640x480 screen: model name in the top band, one measurement lower down
+FRAME = [
+    [[[10, 5], [90, 5], [90, 20], [10, 20]], "HM70A", 0.9],
+    [[[400, 300], [460, 300], [460, 315], [400, 315]], "LVIDd 3.21 cm", 0.9],
+]
+
+
+def learning_store(tmp_path) -> LayoutStore:
+    return LayoutStore(directory=str(tmp_path), enabled=True, learn=True)
+
+
+def test_learned_profile_is_keyed_on_the_machine(tmp_path):
+    store = learning_store(tmp_path)
+    profile = store.record("SAMSUNG MEDISON", "HM70A", 640, 480, FRAME)
+    assert profile.name == "samsung-medison-hm70a"
+    assert profile.header_tokens == ["HM70A"]
+
+    # A plain image of another machine (or a patient form) of the same size is not learned
+    assert store.record("", "", 640, 480, [[[[10, 5], [90, 5], [90, 20], [10, 20]], "Nome:", 0.9]]) is None
+    assert sorted(p.name for p in tmp_path.glob("*.json")) == ["samsung-medison-hm70a.json"]
+    # A plain screenshot showing the model in its top band extends the machine's profile
+    assert store.record("", "", 640, 480, FRAME).name == "samsung-medison-hm70a"
+    assert json.loads((tmp_path / "samsung-medison-hm70a.json").read_text())["learned_frames"] == 2
+
+
+def test_plain_images_need_the_header_tokens_not_just_the_size(tmp_path):
+    learning_store(tmp_path).record("SAMSUNG MEDISON", "HM70A", 640, 480, FRAME)
+    store = LayoutStore(directory=str(tmp_path), enabled=True, learn=False)
+
+    assert store.select(640, 480, read_header=lambda: "PACIENTE: REX") is None
+    assert store.select(640, 480, read_header=lambda: "SAMSUNG HM70A 12/03/2024").name == "samsung-medison-hm70a"
+    assert store.select(640, 480, "SAMSUNG MEDISON", "HM70A").name == "samsung-medison-hm70a"
+
+
+def test_hand_written_size_profile_still_applies_by_size(tmp_path):
+    (tmp_path / "screen.json").write_text(json.dumps({"name": "screen", "size": [640, 480], "regions": [[0, 0, 640, 60]]}))
+    store = LayoutStore(directory=str(tmp_path), enabled=True, learn=False)
+    assert store.select(640, 480).name == "screen"
+
+
+def learn_frames(directory, count):
+    store = LayoutStore(directory=directory, enabled=True, learn=True)
+    for _ in range(count):
+        store.record("SAMSUNG MEDISON", "HM70A", 640, 480, FRAME)
+
+
+def test_processes_learning_at_once_do_not_lose_updates(tmp_path):
+    context = multiprocessing.get_context()
+    processes = [context.Process(target=learn_frames, args=(str(tmp_path), 10)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+    assert [p.exitcode for p in processes] == [0] * 4
+    assert json.loads((tmp_path / "samsung-medison-hm70a.json").read_text())["learned_frames"] == 40
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+class RecordingReader:
+    def __init__(self):
+        self.shapes = []
+
+    def readtext(self, img_array, detail=1, **kwargs):
+        self.shapes.append(img_array.shape[:2])
+        return [] if detail else ["HM70A"]
+
+
+def test_patient_forms_are_read_in_full(tmp_path, monkeypatch):
+    store = LayoutStore(directory=str(tmp_path), enabled=True, learn=False)
+    store.profiles["hm70a"] = LayoutProfile(
+        {"name": "hm70a", "model": "HM70A", "size": [640, 480], "regions": [[0, 0, 640, 60]], "header_tokens": ["HM70A"]}
+    )
+    reader = RecordingReader()
+    monkeypatch.setattr(main, "layout_store", store)
+    monkeypatch.setattr(main, "get_reader", lambda engine="": reader)
+    buf = io.BytesIO()
+    Image.new("RGB", (640, 480), (3, 5, 7)).save(buf, "PNG")
+    image = base64.b64encode(buf.getvalue()).decode()
+    client = TestClient(main.app)
+
+    assert client.post("/ocr/extract-json", json={"image_base64": image}).status_code == 200
+    assert reader.shapes == [(480, 640)]
+
+    reader.shapes.clear()
+    buf = io.BytesIO()
+    Image.new("RGB", (640, 480), (9, 5, 7)).save(buf, "PNG")  # another image: not served from the OCR cache
+    assert client.post("/ocr/extract-exam", json={"image_base64": base64.b64encode(buf.getvalue()).decode()}).status_code == 200
+    assert (60, 640) in reader.shapes and (480, 640) not in reader.shapes  # header band, then the profile's crop
@@ -0,0 +1,61 @@
+import base64
+import io
+import resource
+
+import numpy as np
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import main
+import metrics
+from ocr_pool import OcrPool
+
+MB = 1024 * 1024
+
+
+def spike_mb() -> int:
+    """Enough to push the process past its RSS high-water mark by about 100 MB."""
+    high_water = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return (high_water - metrics.resident_bytes()) // MB + 100
+
+
+def allocate_and_free(mb: int) -> list:
+    spike = np.ones(mb * MB, dtype=np.uint8)  # ones, not zeros: every page is touched
+    del spike
+    return []
+
+
+class SpikyReader:
+    """Stands in for the OCR engine: allocates a large buffer while reading and frees it before returning."""
+
+    def readtext(self, img_array, **kwargs):
+        return allocate_and_free(spike_mb())
+
+
+def test_peak_rss_header_catches_a_spike_inside_the_engine(monkeypatch):
+    monkeypatch.setattr(main, "get_reader", lambda engine="": SpikyReader())
+    monkeypatch.setattr(main, "ocr_pool", OcrPool(mode="thread", workers=1))
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 48), (17, 99, 3)).save(buf, "PNG")
+    high_water = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    response = TestClient(main.app).post(
+        "/ocr/extract-exam", json={"image_base64": base64.b64encode(buf.getvalue()).decode()}
+    )
+
+    assert response.status_code == 200
+    # The spike is freed long before the response starts; only the high-water mark still shows it
+    assert float(response.headers["x-ocr-peak-rss-mb"]) * MB >= high_water + 90 * MB
+
+
+def test_worker_process_peak_is_merged_into_the_request():
+    pool = OcrPool(mode="process", workers=1)
+    pool.warm_up(lambda: None)  # start the worker process
+    peaks = [0, 0]
+    token = metrics.request_memory.set(peaks)
+    try:
+        pool.compute(allocate_and_free, 200)
+    finally:
+        metrics.request_memory.reset(token)
+        pool.shutdown()
+    assert peaks[0] >= 200 * MB
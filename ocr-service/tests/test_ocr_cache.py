@@ -0,0 +1,67 @@
+import os
+import threading
+
+import pytest
+
+from ocr_cache import OcrResultCache
+
+RESULTS = [[[[0, 0], [10, 0], [10, 5], [0, 5]], "LVIDd", 0.9]]
+
+
+def test_concurrent_calls_for_one_key_compute_once():
+    cache = OcrResultCache(max_entries=10, cache_dir="")
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return RESULTS
+
+    out = []
+    owner = threading.Thread(target=lambda: out.append(cache.get_or_compute("k", compute)))
+    owner.start()
+    assert started.wait(5)
+    waiters = [threading.Thread(target=lambda: out.append(cache.get_or_compute("k", compute))) for _ in range(4)]
+    for t in waiters:
+        t.start()
+    release.set()
+    for t in [owner, *waiters]:
+        t.join(5)
+
+    assert len(calls) == 1
+    assert out == [RESULTS] * 5
+    assert cache.stats["misses"] == 1
+    assert cache.stats["coalesced"] + cache.stats["memory_hits"] == 4
+    assert cache.get_or_compute("k", compute) == RESULTS and len(calls) == 1
+
+
+def test_failure_reaches_waiters_and_is_not_cached():
+    cache = OcrResultCache(max_entries=10, cache_dir="")
+
+    def fail():
+        raise RuntimeError("OCR failed")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("k", fail)
+    assert cache.get_or_compute("k", lambda: RESULTS) == RESULTS
+    assert cache.stats["misses"] == 2
+
+
+def test_disk_tier_survives_a_new_instance(tmp_path):
+    first = OcrResultCache(max_entries=10, cache_dir=str(tmp_path))
+    first.get_or_compute("k", lambda: RESULTS)
+
+    second = OcrResultCache(max_entries=10, cache_dir=str(tmp_path))
+    assert second.get_or_compute("k", lambda: pytest.fail("computed again")) == RESULTS
+    assert second.stats["disk_hits"] == 1
+
+
+def test_overwriting_a_disk_entry_does_not_grow_the_byte_count(tmp_path):
+    cache = OcrResultCache(max_entries=10, cache_dir=str(tmp_path), disk_max_mb=1)
+    for i in range(5):
+        cache.put("k", [[[[0, 0]], "x" * i, 0.5]])
+    on_disk = sum(os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path))
+    assert cache._disk_bytes == on_disk
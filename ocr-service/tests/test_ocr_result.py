@@ -0,0 +1,36 @@
+from ocr_result import OcrResult
+
+
+def box(x0, y0, x1, y1):
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1]]
+
+
+def test_value_right_of_skips_units_and_stops_at_next_label():
+    ocr = OcrResult([
+        (box(0, 0, 40, 10), "LVIDd", 0.9),
+        (box(45, 0, 55, 10), ":", 0.9),
+        (box(60, 0, 90, 10), "3.21", 0.9),
+        (box(0, 20, 40, 30), "LVIDs", 0.9),
+        (box(45, 20, 80, 30), "IVSs", 0.9),
+        (box(85, 20, 110, 30), "1.10", 0.9),
+    ])
+    assert ocr.value_for(ocr.boxes[0]).text == "3.21"
+    assert ocr.value_right_of(ocr.boxes[3]) is None
+
+
+def test_value_below_finds_wide_box_listed_after_a_left_offset_one():
+    # Row boxes are ordered by left edge: "cm" (ends before the label) comes after "3.21" (reaches under it)
+    ocr = OcrResult([
+        (box(100, 0, 150, 10), "E/A", 0.9),
+        (box(40, 15, 130, 25), "3.21", 0.9),
+        (box(50, 15, 90, 25), "cm", 0.9),
+    ])
+    assert ocr.value_below(ocr.boxes[0]).text == "3.21"
+
+
+def test_value_below_ignores_boxes_not_under_the_label():
+    ocr = OcrResult([
+        (box(100, 0, 150, 10), "E/A", 0.9),
+        (box(0, 15, 60, 25), "1.5", 0.9),
+    ])
+    assert ocr.value_below(ocr.boxes[0]) is None
@@ -0,0 +1,51 @@
+import json
+import os
+
+from fastapi.testclient import TestClient
+
+import main
+
+client = TestClient(main.app)
+
+with open(os.path.join(os.path.dirname(__file__), "data", "baseline_parsers.json"), encoding="utf-8") as f:
+    CASE = next(c for c in json.load(f) if c["echo"]["measurementsData"] and c["examInfo"])
+
+RESULTS = [
+    [[[0, 0], [50, 0], [50, 10], [0, 10]], "LVIDd", 0.9],
+    [[[60, 0], [100, 0], [100, 10], [60, 10]], "3.21 cm", 0.8],
+]
+
+
+def test_parse_exam_matches_text_parsers():
+    response = client.post("/parse/exam", json={"text": CASE["text"]})
+    assert response.status_code == 200
+    assert {k: response.json()[k] for k in CASE["echo"]} == CASE["echo"]
+    assert response.json()["examInfo"] == CASE["examInfo"]
+
+
+def test_parse_patient_matches_text_parser():
+    response = client.post("/parse/patient", json={"text": CASE["text"]})
+    assert response.status_code == 200
+    assert {k: v for k, v in response.json().items() if v} == CASE["patient"]
+
+
+def test_parse_exam_pairs_stored_results_by_position():
+    response = client.post("/parse/exam", json={"results": RESULTS})
+    assert response.json()["measurementsData"]["dvedDiastole"] == "3.21"
+
+
+def test_parse_rejects_bad_input():
+    assert client.post("/parse/patient", json={}).status_code == 400
+    assert client.post("/parse/exam", json={"results": [["x"]]}).status_code == 400
+
+
+def test_parse_batch_keeps_order_ids_and_per_item_errors():
+    items = [{"text": CASE["text"], "id": "a"}, {"results": RESULTS, "id": "b"}, {"results": [[1, 2]]}, {}]
+    response = client.post("/parse/batch", json={"items": items})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r.get("id") for r in results] == ["a", "b", None, None]
+    assert results[0]["examInfo"] == CASE["examInfo"]
+    assert results[1]["measurementsData"]["dvedDiastole"] == "3.21"
+    assert results[2]["error"] == "Parse failed" and results[3]["error"] == "Parse failed"
+    assert client.post("/parse/batch", json={"items": items, "kind": "x"}).status_code == 400
@@ -0,0 +1,21 @@
+"""
+The text parsers against the outputs of the original implementation. data/baseline_parsers.json holds OCR texts
+(synthetic exam and form samples, label/number noise, a few hand-written cases) and what the first version of
+main.py's parse_patient_data / parse_echo_measurements / parse_exam_info returned for them.
+"""
+import json
+import os
+
+import pytest
+
+import main
+
+with open(os.path.join(os.path.dirname(__file__), "data", "baseline_parsers.json"), encoding="utf-8") as f:
+    CASES = json.load(f)
+
+
+@pytest.mark.parametrize("case", CASES, ids=[f"case{i}" for i in range(len(CASES))])
+def test_text_parsers_match_baseline(case):
+    assert main.parse_patient_data(case["text"]) == case["patient"]
+    assert main.parse_echo_measurements(case["text"]) == case["echo"]
+    assert main.parse_exam_info(case["text"]) == case["examInfo"]
@@ -0,0 +1,43 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+import preprocess
+
+
+def encode(arr, fmt="PNG"):
+    buf = io.BytesIO()
+    Image.fromarray(arr).save(buf, fmt)
+    return buf.getvalue()
+
+
+def test_full_range_16_bit_image_is_rescaled_not_clipped():
+    arr = np.linspace(0, 65535, 300 * 400).reshape(300, 400).astype(np.uint16)
+    data = encode(arr)
+    assert Image.open(io.BytesIO(data)).mode.startswith("I;16")
+
+    out = preprocess.decode_image(data, preprocess.PreprocessOptions())
+    assert out.dtype == np.uint8 and out.shape == (300, 400)
+    assert out.min() == 0 and out.max() == 255
+    assert abs(int(out[150, 200]) - 128) <= 1
+    assert (out == 255).mean() < 0.01  # clipping at 255 would leave almost every pixel white
+
+
+def test_16_bit_image_keeps_contrast_through_resize_and_autocontrast():
+    arr = np.zeros((200, 200), dtype=np.uint16)
+    arr[50:150, 50:150] = 40000
+    out = preprocess.decode_image(encode(arr), preprocess.PreprocessOptions(max_side=100, autocontrast=True))
+    assert out.shape == (100, 100)
+    assert out[0, 0] == 0 and out[50, 50] == 255
+
+
+def test_flat_wide_image_becomes_black_without_dividing_by_zero():
+    out = preprocess.to_array(Image.fromarray(np.full((4, 4), 1000, dtype=np.int32)), "L")
+    assert out.dtype == np.uint8 and not out.any()
+
+
+def test_defaults_pass_8_bit_pixels_through():
+    arr = np.random.default_rng(0).integers(0, 256, (60, 80, 3), dtype=np.uint8)
+    out = preprocess.decode_image(encode(arr), preprocess.PreprocessOptions())
+    assert np.array_equal(out, arr)
@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from ocr_pool import OcrPool
+
+
+def slow_warm_up():
+    time.sleep(0.3)
+    with open(os.path.join(os.environ["OCR_TEST_WARM_DIR"], str(os.getpid())), "w"):
+        pass
+
+
+def test_process_pool_warm_up_waits_for_every_worker(tmp_path, monkeypatch):
+    monkeypatch.setenv("OCR_TEST_WARM_DIR", str(tmp_path))
+    pool = OcrPool(mode="process", workers=3, initializer=slow_warm_up)
+    try:
+        pool.warm_up(slow_warm_up)
+        assert len(os.listdir(tmp_path)) == 3
+    finally:
+        pool.shutdown()
+
+
+def broken_warm_up():
+    raise RuntimeError("no model")
+
+
+def test_process_pool_warm_up_raises_when_a_worker_fails_to_warm_up():
+    pool = OcrPool(mode="process", workers=2, initializer=broken_warm_up)
+    try:
+        with pytest.raises(BrokenProcessPool):
+            pool.warm_up(broken_warm_up)
+    finally:
+        pool.shutdown()
+
+
+def test_ready_is_503_until_the_first_probe_has_warmed_up(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(main, "ocr_pool", OcrPool(mode="thread", workers=1))
+    monkeypatch.setattr(main, "warm_up", lambda: release.wait(5))
+    monkeypatch.setitem(main._readiness, "state", "idle")
+    monkeypatch.setitem(main._readiness, "detail", "")
+    client = TestClient(main.app)
+
+    response = client.get("/ready")
+    assert response.status_code == 503 and response.json()["status"] == "loading"
+    release.set()
+    deadline = time.monotonic() + 5
+    while main._readiness["state"] != "ready" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert client.get("/ready").json() == {"status": "ready"}
+
+
+def test_failed_warm_up_keeps_ready_at_503(monkeypatch):
+    def fail():
+        raise RuntimeError("model file missing")
+
+    monkeypatch.setattr(main, "ocr_pool", OcrPool(mode="thread", workers=1))
+    monkeypatch.setattr(main, "warm_up", fail)
+    monkeypatch.setitem(main._readiness, "state", "idle")
+    monkeypatch.setitem(main._readiness, "detail", "")
+    client = TestClient(main.app)
+
+    client.get("/ready")
+    deadline = time.monotonic() + 5
+    while main._readiness["state"] == "loading" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json() == {"status": "error", "detail": "model file missing"}
@@ -0,0 +1,49 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from ocr_pool import ClientDisconnected, OcrPool, PoolBusy, Schedule
+
+client = TestClient(main.app)
+
+
+def test_scheduling_headers_only_apply_to_ocr_routes():
+    headers = {"X-OCR-Priority": "urgent", "X-OCR-Deadline-Ms": "soon"}
+    assert client.get("/health", headers=headers).status_code == 200
+    assert client.get("/metrics", headers=headers).status_code == 200
+    assert client.get("/ready", headers=headers).status_code != 400
+    assert client.post("/parse/exam", json={"text": "LVIDd 3.21 cm"}, headers=headers).status_code == 200
+
+    response = client.post("/ocr/extract-exam", json={"image_base64": ""}, headers={"X-OCR-Priority": "urgent"})
+    assert response.status_code == 400
+    assert "Unknown priority" in response.json()["detail"]
+
+
+def test_cancelled_queued_work_leaves_the_lane_at_once():
+    async def scenario():
+        pool = OcrPool(mode="thread", workers=1, max_pending=2, lanes=["default"])
+        gate = threading.Event()
+        running = asyncio.ensure_future(pool.run(gate.wait, 5))
+        await asyncio.sleep(0.05)
+
+        async def gone():
+            return True
+
+        with pytest.raises(ClientDisconnected):
+            await pool.run(print, "never", schedule=Schedule("default", None, gone))
+        assert pool.snapshot()["lanes"]["default"]["queued"] == 0
+
+        queued = asyncio.ensure_future(pool.run(lambda: "queued"))
+        await asyncio.sleep(0.05)
+        assert pool.snapshot()["lanes"]["default"]["queued"] == 1
+        with pytest.raises(PoolBusy):
+            await pool.run(lambda: "one too many")
+        gate.set()
+        assert await running is True
+        assert await queued == "queued"
+        pool.shutdown()
+
+    asyncio.run(scenario())
@@ -20,6 +20,56 @@ interface ExtractExamRequest {
   image_base64: string;
 }
 
+/** True for explicit binary uploads (image/*, application/dicom, application/octet-stream); anything else,
+ * including a missing or empty Content-Type, takes the JSON path. */
+function isBinaryUpload(contentType: string): boolean {
+  const mediaType = contentType.split(";")[0].trim().toLowerCase();
+  return mediaType.startsWith("image/") || mediaType === "application/dicom" ||
+    mediaType === "application/octet-stream";
+}
+
+/** POST to the OCR service and relay its JSON answer (network failure -> 503, non-JSON -> 502). */
+async function forwardToOcr(url: string, init: RequestInit): Promise<Response> {
+  let pythonResponse: Response;
+  try {
+    pythonResponse = await fetch(url, init);
+  } catch (networkError: unknown) {
+    console.error("extract-exam: OCR service fetch failed:", networkError);
+    return corsResponse(
+      JSON.stringify({
+        error: "OCR service unreachable",
+        detail: networkError instanceof Error ? networkError.message : "Check OCR_SERVICE_URL.",
+      }),
+      503,
+      { headers: { "Content-Type": "application/json" } }
+    );
+  }
+
+  const text = await pythonResponse.text();
+  let data: unknown;
+  try {
+    data = text ? JSON.parse(text) : {};
+  } catch {
+    return corsResponse(
+      JSON.stringify({ error: "OCR service returned invalid response" }),
+      502,
+      { headers: { "Content-Type": "application/json" } }
+    );
+  }
+
+  if (!pythonResponse.ok) {
+    return corsResponse(
+      JSON.stringify(typeof data === "object" && data !== null ? data : { error: "OCR error" }),
+      pythonResponse.status,
+      { headers: { "Content-Type": "application/json" } }
+    );
+  }
+
+  return corsResponse(JSON.stringify(data), 200, {
+    headers: { "Content-Type": "application/json" },
+  });
+}
+
 const handler = async (req: Request): Promise<Response> => {
   if (req.method === "OPTIONS") {
     return corsResponse(null, 204);
@@ -46,6 +96,25 @@ const handler = async (req: Request): Promise<Response> => {
       );
     }
 
+    // Binary upload (application/octet-stream, image/*, application/dicom): stream the bytes through to
+    // /ocr/extract-exam-raw without base64 re-encoding.
+    const contentType = req.headers.get("content-type") ?? "";
+    if (isBinaryUpload(contentType)) {
+      const length = Number(req.headers.get("content-length") ?? "0");
+      if (length > 10 * 1024 * 1024) {
+        return corsResponse(
+          JSON.stringify({ error: "Image too large", detail: "Use an image under ~10MB." }),
+          413,
+          { headers: { "Content-Type": "application/json" } }
+        );
+      }
+      return await forwardToOcr(`${ocrServiceUrl}/ocr/extract-exam-raw`, {
+        method: "POST",
+        headers: { "Content-Type": contentType },
+        body: req.body,
+      });
+    }
+
     let body: ExtractExamRequest;
     try {
       body = (await req.json()) as ExtractExamRequest;
@@ -73,47 +142,10 @@ const handler = async (req: Request): Promise<Response> => {
       );
     }
 
-    let pythonResponse: Response;
-    try {
-      pythonResponse = await fetch(`${ocrServiceUrl}/ocr/extract-exam`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ image_base64 }),
-      });
-    } catch (networkError: unknown) {
-      console.error("extract-exam: OCR service fetch failed:", networkError);
-      return corsResponse(
-        JSON.stringify({
-          error: "OCR service unreachable",
-          detail: networkError instanceof Error ? networkError.message : "Check OCR_SERVICE_URL.",
-        }),
-        503,
-        { headers: { "Content-Type": "application/json" } }
-      );
-    }
-
-    const text = await pythonResponse.text();
-    let data: unknown;
-    try {
-      data = text ? JSON.parse(text) : {};
-    } catch {
-      return corsResponse(
-        JSON.stringify({ error: "OCR service returned invalid response" }),
-        502,
-        { headers: { "Content-Type": "application/json" } }
-      );
-    }
-
-    if (!pythonResponse.ok) {
-      return corsResponse(
-        JSON.stringify(typeof data === "object" && data !== null ? data : { error: "OCR error" }),
-        pythonResponse.status,
-        { headers: { "Content-Type": "application/json" } }
-      );
-    }
-
-    return corsResponse(JSON.stringify(data), 200, {
+    return await forwardToOcr(`${ocrServiceUrl}/ocr/extract-exam`, {
+      method: "POST",
       headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ image_base64 }),
     });
   } catch (error: unknown) {
     console.error("Error in extract-exam:", error);
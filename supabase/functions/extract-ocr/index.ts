@@ -13,6 +13,14 @@ interface ExtractOcrRequest {
   image_base64: string;
 }
 
+/** True for explicit binary uploads (image/*, application/dicom, application/octet-stream); anything else,
+ * including a missing or empty Content-Type, takes the JSON path. */
+function isBinaryUpload(contentType: string): boolean {
+  const mediaType = contentType.split(";")[0].trim().toLowerCase();
+  return mediaType.startsWith("image/") || mediaType === "application/dicom" ||
+    mediaType === "application/octet-stream";
+}
+
 function jsonResponse(body: Record<string, unknown>, status: number) {
   return new Response(JSON.stringify(body), {
     status,
@@ -31,6 +39,43 @@ const safeJsonResponse = (body: Record<string, unknown>, status: number): Respon
   }
 };
 
+/** POST to the OCR service and relay its JSON answer (network failure -> 503, non-JSON -> 502). */
+async function forwardToOcr(url: string, init: RequestInit): Promise<Response> {
+  let pythonResponse: Response;
+  try {
+    pythonResponse = await fetch(url, init);
+  } catch (networkError: unknown) {
+    console.error("OCR service fetch failed:", networkError);
+    return safeJsonResponse({
+      error: "OCR service unreachable",
+      detail: networkError instanceof Error ? networkError.message : "Check OCR_SERVICE_URL and that the service is running.",
+    }, 503);
+  }
+
+  let data: unknown;
+  try {
+    const text = await pythonResponse.text();
+    data = text ? (JSON.parse(text) as unknown) : {};
+  } catch {
+    console.error("OCR service returned non-JSON");
+    return safeJsonResponse({
+      error: "OCR service returned invalid response",
+      detail: "The OCR service did not return valid JSON.",
+    }, 502);
+  }
+
+  if (!pythonResponse.ok) {
+    return safeJsonResponse(
+      typeof data === "object" && data !== null && "error" in (data as object)
+        ? (data as { error: string })
+        : { error: "OCR service error", detail: data },
+      pythonResponse.status
+    );
+  }
+
+  return safeJsonResponse(data as Record<string, unknown>, 200);
+}
+
 const handler = async (req: Request): Promise<Response> => {
   if (req.method === "OPTIONS") {
     return new Response(null, { headers: corsHeaders });
@@ -49,6 +94,24 @@ const handler = async (req: Request): Promise<Response> => {
       }, 503);
     }
 
+    // Binary upload (application/octet-stream, image/*, application/dicom): stream the bytes through to
+    // /ocr/extract-raw without base64 re-encoding.
+    const contentType = req.headers.get("content-type") ?? "";
+    if (isBinaryUpload(contentType)) {
+      const length = Number(req.headers.get("content-length") ?? "0");
+      if (length > 10 * 1024 * 1024) {
+        return safeJsonResponse({
+          error: "Image too large",
+          detail: "Use an image under ~10MB for OCR.",
+        }, 413);
+      }
+      return await forwardToOcr(`${OCR_SERVICE_URL}/ocr/extract-raw`, {
+        method: "POST",
+        headers: { "Content-Type": contentType },
+        body: req.body,
+      });
+    }
+
     let body: ExtractOcrRequest;
     try {
       body = (await req.json()) as ExtractOcrRequest;
@@ -74,43 +137,11 @@ const handler = async (req: Request): Promise<Response> => {
       }, 413);
     }
 
-    let pythonResponse: Response;
-    try {
-      pythonResponse = await fetch(`${OCR_SERVICE_URL}/ocr/extract-json`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ image_base64 }),
-      });
-    } catch (networkError: unknown) {
-      console.error("OCR service fetch failed:", networkError);
-      return safeJsonResponse({
-        error: "OCR service unreachable",
-        detail: networkError instanceof Error ? networkError.message : "Check OCR_SERVICE_URL and that the service is running.",
-      }, 503);
-    }
-
-    let data: unknown;
-    try {
-      const text = await pythonResponse.text();
-      data = text ? (JSON.parse(text) as unknown) : {};
-    } catch {
-      console.error("OCR service returned non-JSON");
-      return safeJsonResponse({
-        error: "OCR service returned invalid response",
-        detail: "The OCR service did not return valid JSON.",
-      }, 502);
-    }
-
-    if (!pythonResponse.ok) {
-      return safeJsonResponse(
-        typeof data === "object" && data !== null && "error" in (data as object)
-          ? (data as { error: string })
-          : { error: "OCR service error", detail: data },
-        pythonResponse.status
-      );
-    }
-
-    return safeJsonResponse(data as Record<string, unknown>, 200);
+    return await forwardToOcr(`${OCR_SERVICE_URL}/ocr/extract-json`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ image_base64 }),
+    });
   } catch (error: unknown) {
     console.error("Error in extract-ocr function:", error);
     return safeJsonResponse({